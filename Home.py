@@ -1,4 +1,12 @@
+import time
+page_started = time.perf_counter()
 import streamlit as st
+from smart_review.frames import format_bytes
+from smart_review.metrics import serve_from_env
+from smart_review.state import session_memory
+from smart_review.services import record_page_time
+
+record_page_time('Home', 'imports', page_started)
 
 st.set_page_config(
     page_title="Smart Review",
@@ -14,10 +22,11 @@ Welcome to Smart Review! This application helps you analyze and evaluate convers
 
 ### Features:
 1. **Get Transcripts**: Import conversation transcripts from Snowflake
-2. **Upload Transcripts**: Upload local transcript files (CSV/JSON)
+2. **Upload Transcripts**: Upload local transcript files (CSV, JSON, JSON Lines, Parquet or Arrow)
 3. **Score Transcripts**: Analyze conversations using AI
 4. **Dashboard**: View detailed analytics and metrics
 5. **Export**: Save results to AWS S3
+6. **Metrics**: Monitor latency, tokens, throttles and parse failures of every Bedrock, Snowflake and S3 call
 
 ### Getting Started:
 Select a feature from the sidebar to begin analyzing your conversation transcripts.
@@ -26,5 +35,22 @@ Select a feature from the sidebar to begin analyzing your conversation transcrip
 # Initialize session state variables if they don't exist
 if 'transcripts_df' not in st.session_state:
     st.session_state.transcripts_df = None
+if 'transcripts_query' not in st.session_state:
+    st.session_state.transcripts_query = None
 if 'scores_df' not in st.session_state:
-    st.session_state.scores_df = None 
\ No newline at end of file
+    st.session_state.scores_df = None
+
+# Memory held by the DataFrames of this session. Sessions that load the
+# same data share one copy, so this is an upper bound on what they add.
+memory = session_memory()
+if memory:
+    st.subheader("Session Memory")
+    columns = st.columns(len(memory) + 1)
+    for column, frame in zip(columns, memory):
+        column.metric(frame['frame'], format_bytes(frame['bytes']), f"{frame['rows']:,} rows", delta_color="off")
+    columns[-1].metric("Total", format_bytes(sum(frame['bytes'] for frame in memory)))
+
+# Expose Prometheus metrics when SMART_REVIEW_METRICS_PORT is set
+serve_from_env()
+
+record_page_time('Home', 'script', page_started)
@@ -0,0 +1 @@
+"""Offline benchmarks for Smart Review, runnable without AWS or Snowflake."""
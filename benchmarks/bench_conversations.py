@@ -0,0 +1,54 @@
+"""Micro-benchmark of conversation assembly.
+
+Compares smart_review.conversations.build_conversations with the original
+groupby/lambda/iterrows implementation from process_transcripts.
+
+    python benchmarks/bench_conversations.py [rows ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic import make_transcripts  # noqa: E402
+from smart_review.conversations import build_conversations  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def legacy_build_conversations(df):
+    """The original implementation, kept here as the baseline"""
+    conversations = df.groupby('conversation_id').agg({
+        'utterance': lambda x: '\n'.join(x),
+        'response': lambda x: '\n'.join(x),
+        'bot_name': 'first',
+        'datetime': 'first'
+    }).reset_index()
+
+    for _, conv in conversations.iterrows():
+        yield {
+            'conversation_id': conv['conversation_id'],
+            'bot_name': conv['bot_name'],
+            'datetime': conv['datetime'],
+            'text': f"Bot: {conv['bot_name']}\nUser: {conv['utterance']}\nBot: {conv['response']}"
+        }
+
+
+def time_builder(builder, df):
+    start = time.perf_counter()
+    count = sum(1 for _ in builder(df))
+    return time.perf_counter() - start, count
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'conversations':>14} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}")
+    for rows in sizes:
+        df = make_transcripts(rows)
+        legacy_time, count = time_builder(legacy_build_conversations, df)
+        new_time, _ = time_builder(build_conversations, df)
+        print(f"{rows:>10} {count:>14} {legacy_time:>11.3f} {new_time:>15.3f} {legacy_time / new_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,64 @@
+"""Startup time of Home.py and each page.
+
+Every script is run in a fresh interpreter with Streamlit's AppTest, the
+way a page's first visit after a server start loads it, and then once
+more to show the cost of a warm rerun. Streamlit itself is imported before
+timing starts, as a running server has it loaded already.
+
+    python benchmarks/bench_startup.py [script ...]
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Run in the child interpreter; prints the timings as JSON
+CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+from smart_review.metrics import REGISTRY
+
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+for key in ('transcripts_df', 'transcripts_query', 'scores_df'):
+    at.session_state[key] = None
+start = time.perf_counter()
+at.run()
+cold = time.perf_counter() - start
+imports = REGISTRY.page_seconds.values
+start = time.perf_counter()
+at.run()
+warm = time.perf_counter() - start
+first_imports = [series['sum'] / series['count'] for key, series in imports.items() if ('phase', 'imports') in key]
+print(json.dumps({'cold': cold, 'warm': warm, 'imports': first_imports[0] if first_imports else None,
+                  'modules': len(sys.modules), 'errors': [str(e.value) for e in at.exception]}))
+"""
+
+
+def app_scripts():
+    return [os.path.join(ROOT, 'Home.py')] + sorted(glob.glob(os.path.join(ROOT, 'pages', '*.py')))
+
+
+def time_script(path):
+    """Cold and warm run times of one script in a fresh interpreter"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD, path], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(scripts):
+    print(f"{'script':<32} {'cold (s)':>9} {'imports (s)':>12} {'warm (s)':>9} {'modules':>8}")
+    for path in scripts:
+        timing = time_script(path)
+        imports = f"{timing['imports']:.3f}" if timing['imports'] is not None else 'n/a'
+        print(f"{os.path.relpath(path, ROOT):<32} {timing['cold']:>9.3f} {imports:>12} {timing['warm']:>9.3f} {timing['modules']:>8}")
+        for error in timing['errors']:
+            print(f"  error: {error}")
+
+
+if __name__ == '__main__':
+    main([os.path.abspath(arg) for arg in sys.argv[1:]] or app_scripts())
@@ -0,0 +1,212 @@
+"""Local stand-ins for Bedrock, Snowflake and S3 with configurable behaviour."""
+import io
+import json
+import random
+import re
+import threading
+import time
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+PACKED_ID_PATTERN = re.compile(r'^Conversation (\S+):$', re.MULTILINE)
+
+
+def request_prompt(body):
+    """Text of the user message in a Messages API request body"""
+    message = json.loads(body)['messages'][0]
+    return ''.join(block['text'] for block in message['content'])
+
+
+def messages_response(body, text, usage=None):
+    """Messages API response body for a reply, continuing any assistant prefill"""
+    messages = json.loads(body)['messages']
+    if messages[-1]['role'] == 'assistant':
+        prefill = ''.join(block['text'] for block in messages[-1]['content'])
+        if text.startswith(prefill):
+            text = text[len(prefill):]
+    payload = {'type': 'message', 'role': 'assistant', 'content': [{'type': 'text', 'text': text}]}
+    if usage is not None:
+        payload['usage'] = usage
+    return json.dumps(payload).encode('utf-8')
+
+
+class FakeBedrock:
+    """Bedrock runtime stand-in.
+
+    Each call sleeps for latency seconds (plus up to jitter), fails with a
+    ThrottlingException with probability throttle_rate, and returns
+    non-JSON text with probability malformed_rate. Packed prompts get a
+    JSON array answer. Call latencies are recorded in call_latencies.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.02, throttle_rate=0.0, malformed_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self.throttles = 0
+        self.malformed = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.call_latencies = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _analysis(self):
+        return {
+            'summary': 'Customer asked for help and the bot resolved it.',
+            'satisfaction_score': self._random.randint(1, 5),
+            'accuracy_score': self._random.randint(1, 5),
+            'relevancy_score': self._random.randint(1, 5),
+            'containment_score': self._random.randint(1, 5)
+        }
+
+    def invoke_model(self, modelId, body, **kwargs):
+        start = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += len(body)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            throttled = self._random.random() < self.throttle_rate
+            malformed = not throttled and self._random.random() < self.malformed_rate
+        time.sleep(delay)
+
+        if throttled:
+            with self._lock:
+                self.throttles += 1
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+        prompt = request_prompt(body)
+        with self._lock:
+            ids = PACKED_ID_PATTERN.findall(prompt)
+            if malformed:
+                self.malformed += 1
+                completion = "Sure! Here is my analysis of the conversation."
+            elif ids:
+                completion = json.dumps([dict(self._analysis(), conversation_id=i) for i in ids])
+            else:
+                completion = json.dumps(self._analysis())
+            payload = messages_response(body, completion)
+            self.bytes_received += len(payload)
+            self.call_latencies.append(time.perf_counter() - start)
+        return {'body': io.BytesIO(payload)}
+
+
+class FakeSnowflakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        self.query = query
+        self.params = params
+        self.connection.queries.append(params)
+
+    def _rows(self):
+        """Rows of the bot and date range the query asked for, or all rows without one"""
+        df = self.connection.df
+        if not self.params or self.params.get('start_date') is None:
+            return df
+        start, end = pd.Timestamp(self.params['start_date']), pd.Timestamp(self.params['end_date'])
+        in_range = (df['datetime'] >= start) & (
+            (df['datetime'] < end) if 'datetime <' in self.query else (df['datetime'] <= end)
+        )
+        return df[(df['bot_name'] == self.params['bot_name']) & in_range]
+
+    def fetch_pandas_batches(self):
+        df = self._rows()
+        for start in range(0, len(df), self.connection.batch_rows):
+            time.sleep(self.connection.batch_latency)
+            batch = df.iloc[start:start + self.connection.batch_rows].rename(columns=str.upper)
+            self.connection.bytes_received += int(batch.memory_usage(deep=True).sum())
+            yield batch
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeConnection:
+    """Snowflake connection stand-in serving a DataFrame in Arrow-sized batches.
+
+    df must already be ordered by conversation_id and datetime, as the real
+    query returns it.
+    """
+
+    def __init__(self, df, batch_rows=50_000, batch_latency=0.0):
+        self.df = df
+        self.batch_rows = batch_rows
+        self.batch_latency = batch_latency
+        self.bytes_received = 0
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return FakeSnowflakeCursor(self)
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class FakeS3:
+    """S3 stand-in that counts bytes instead of keeping object bodies.
+
+    Every request sleeps for latency seconds; manifests and other small
+    objects under keep_bodies_under bytes are kept for inspection.
+    """
+
+    def __init__(self, latency=0.0, keep_bodies_under=1024 * 1024):
+        self.latency = latency
+        self.keep_bodies_under = keep_bodies_under
+        self.objects = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.latencies = []
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _request(self, body=b''):
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body)
+            self.latencies.append(time.perf_counter() - start)
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        body = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        self._request(body)
+        self.objects[Key] = body if len(body) < self.keep_bodies_under else len(body)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._request()
+        body = self.objects[Key]
+        if isinstance(body, int):
+            raise ValueError(f"Body of {Key} was not kept")
+        return {'Body': io.BytesIO(body)}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, **kwargs):
+        self._request()
+        with self._lock:
+            upload_id = f'upload-{len(self._uploads)}-{Key}'
+            self._uploads[upload_id] = 0
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._request(Body)
+        with self._lock:
+            self._uploads[UploadId] += len(Body)
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._request()
+        with self._lock:
+            self.objects[Key] = self._uploads.pop(UploadId)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._request()
+        with self._lock:
+            self._uploads.pop(UploadId, None)
@@ -0,0 +1,202 @@
+"""Offline throughput benchmark of the fetch → score → export pipeline.
+
+Runs the real ingest, scoring and export code against the local fakes in
+benchmarks.fakes, so throughput regressions can be caught without spending
+money on Bedrock:
+
+    python -m benchmarks.run_benchmarks --rows 1000000 --latency 0.05 --throttle-rate 0.02
+
+Reports conversations (or rows) per second, p50/p95 call latency, the
+process's peak RSS so far at the end of each stage and the bytes moved by
+each stage. ru_maxrss is a high-water mark for the whole process, so a
+stage's figure is the largest footprint reached by it or any stage before
+it, not its own; fetch and score run interleaved and cannot be told apart
+anyway.
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fakes import FakeBedrock, FakeS3, FakeSnowflakeConnection
+from benchmarks.synthetic import make_transcripts
+from smart_review.conversations import build_conversations
+from smart_review.export import export_partitioned
+from smart_review.pipeline import StageStats, timed
+from smart_review.scoring import score_conversations, score_row
+from smart_review.transcripts import complete_conversations, iter_transcript_batches
+
+
+@dataclass
+class StageReport:
+    stage: str
+    seconds: float
+    items: int
+    items_per_second: float
+    p50_ms: float
+    p95_ms: float
+    process_peak_rss_mb: float
+    bytes_moved: int
+
+    def __str__(self):
+        return (
+            f"{self.stage:<7} {self.seconds:9.2f}s {self.items:>11,} {self.items_per_second:>11,.1f}/s "
+            f"{self.p50_ms:>9.1f} {self.p95_ms:>9.1f} {self.process_peak_rss_mb:>16.1f} {self.bytes_moved:>15,}"
+        )
+
+
+HEADER = (
+    f"{'stage':<7} {'wall':>10} {'items':>11} {'throughput':>13} "
+    f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'peak so far (MB)':>16} {'bytes moved':>15}"
+)
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size since it started"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def stage_report(stats, latencies, bytes_moved):
+    latencies_ms = np.asarray(latencies, dtype=float) * 1000
+    return StageReport(
+        stage=stats.name,
+        seconds=stats.seconds,
+        items=stats.items,
+        items_per_second=stats.throughput,
+        p50_ms=float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0,
+        p95_ms=float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else 0.0,
+        process_peak_rss_mb=peak_rss_mb(),
+        bytes_moved=bytes_moved
+    )
+
+
+def run_benchmark(rows=100_000, turns_per_conversation=4, batch_rows=50_000, max_workers=32,
+                  requests_per_second=1000.0, latency=0.02, jitter=0.01, throttle_rate=0.0,
+                  malformed_rate=0.0, pack_token_budget=None, snowflake_latency=0.0, s3_latency=0.0,
+                  export_format='parquet', seed=0):
+    """Run fetch, score and export against the fakes and report each stage"""
+    transcripts = make_transcripts(rows, turns_per_conversation, seed=seed, shuffle=False)
+    snowflake = FakeSnowflakeConnection(transcripts, batch_rows=batch_rows, batch_latency=snowflake_latency)
+    bedrock = FakeBedrock(latency=latency, jitter=jitter, throttle_rate=throttle_rate,
+                          malformed_rate=malformed_rate, seed=seed)
+    s3 = FakeS3(latency=s3_latency)
+
+    fetch = StageStats('fetch')
+    score = StageStats('score')
+    export = StageStats('export')
+    batch_latencies = []
+
+    def conversations():
+        batches = iter_transcript_batches(snowflake, 'bench', None, None, batch_rows)
+        for frame in complete_conversations(timed_batches(batches)):
+            yield from build_conversations(frame)
+
+    def timed_batches(batches):
+        iterator = iter(batches)
+        while True:
+            start = time.perf_counter()
+            batch = next(iterator, None)
+            batch_latencies.append(time.perf_counter() - start)
+            if batch is None:
+                return
+            yield batch
+
+    results = []
+    start = time.perf_counter()
+    scored = score_conversations(
+        bedrock,
+        timed(conversations(), fetch),
+        max_workers=max_workers,
+        requests_per_second=requests_per_second,
+        pack_token_budget=pack_token_budget
+    )
+    for conversation, analysis, error in scored:
+        if error is None:
+            results.append(score_row(conversation, analysis))
+    score.seconds = time.perf_counter() - start - fetch.seconds
+    score.items = len(results)
+    fetch_report = stage_report(fetch, batch_latencies, snowflake.bytes_received)
+    score_report = stage_report(score, bedrock.call_latencies, bedrock.bytes_sent + bedrock.bytes_received)
+
+    scores_df = pd.DataFrame(results)
+    start = time.perf_counter()
+    request_start = len(s3.latencies)
+    export_partitioned(s3, scores_df, 'bench-bucket', 'bench', export_format, max_workers=min(max_workers, 16))
+    export.seconds = time.perf_counter() - start
+    export.items = len(scores_df)
+    export_report = stage_report(export, s3.latencies[request_start:], s3.bytes_sent)
+
+    return {
+        'config': {
+            'rows': rows, 'conversations': fetch.items, 'max_workers': max_workers,
+            'latency': latency, 'throttle_rate': throttle_rate, 'malformed_rate': malformed_rate,
+            'pack_token_budget': pack_token_budget, 'export_format': export_format
+        },
+        'bedrock': {'calls': bedrock.calls, 'throttles': bedrock.throttles, 'malformed': bedrock.malformed,
+                    'failed_conversations': fetch.items - len(results)},
+        'stages': [fetch_report, score_report, export_report]
+    }
+
+
+def format_report(result):
+    config = result['config']
+    bedrock = result['bedrock']
+    lines = [
+        f"{config['rows']:,} rows, {config['conversations']:,} conversations, "
+        f"{config['max_workers']} workers, {config['latency'] * 1000:.0f} ms model latency",
+        f"bedrock: {bedrock['calls']:,} calls, {bedrock['throttles']:,} throttled, "
+        f"{bedrock['malformed']:,} malformed, {bedrock['failed_conversations']:,} conversations failed",
+        HEADER,
+    ]
+    lines.extend(str(stage) for stage in result['stages'])
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100_000, help="transcript rows to generate")
+    parser.add_argument('--turns', type=int, default=4, help="turns per conversation")
+    parser.add_argument('--batch-rows', type=int, default=50_000, help="rows per Snowflake batch")
+    parser.add_argument('--workers', type=int, default=32, help="concurrent Bedrock requests")
+    parser.add_argument('--rps', type=float, default=1000.0, help="Bedrock requests per second limit")
+    parser.add_argument('--latency', type=float, default=0.02, help="Bedrock latency per call in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01, help="extra random Bedrock latency in seconds")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="share of Bedrock calls throttled")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="share of Bedrock replies that are not JSON")
+    parser.add_argument('--pack-token-budget', type=int, help="enable prompt packing with this token budget")
+    parser.add_argument('--snowflake-latency', type=float, default=0.0, help="latency per Snowflake batch in seconds")
+    parser.add_argument('--s3-latency', type=float, default=0.0, help="latency per S3 request in seconds")
+    parser.add_argument('--format', dest='export_format', default='parquet', choices=['parquet', 'ndjson.gz'])
+    parser.add_argument('--json', dest='json_path', help="also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        rows=args.rows,
+        turns_per_conversation=args.turns,
+        batch_rows=args.batch_rows,
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        malformed_rate=args.malformed_rate,
+        pack_token_budget=args.pack_token_budget,
+        snowflake_latency=args.snowflake_latency,
+        s3_latency=args.s3_latency,
+        export_format=args.export_format
+    )
+    print(format_report(result))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({**result, 'stages': [asdict(stage) for stage in result['stages']]}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
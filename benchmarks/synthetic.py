@@ -0,0 +1,53 @@
+"""Synthetic transcript generator that scales to millions of rows."""
+import numpy as np
+import pandas as pd
+
+BOT_NAMES = ['SupportBot', 'SalesBot', 'BillingBot', 'ReturnsBot']
+
+UTTERANCES = np.array([
+    'I need help with my order',
+    'Where is my package?',
+    'I want to return an item',
+    'Can I change my delivery address?',
+    'How do I reset my password?',
+    'Hello, I want to buy a product',
+])
+
+RESPONSES = np.array([
+    'Could you provide your order number?',
+    'Let me check that for you.',
+    'I can help you with that.',
+    'Welcome! I can help you with your purchase.',
+    'I understand. Let me look into it.',
+])
+
+
+def make_transcripts(rows, turns_per_conversation=4, bots=BOT_NAMES, days=7, seed=0, shuffle=True):
+    """Transcript rows in the Snowflake/upload schema.
+
+    Conversations have turns_per_conversation consecutive turns spread over
+    the last days days. Rows are shuffled out of conversation order unless
+    shuffle is False, in which case they are ordered like the Snowflake
+    query returns them.
+    """
+    rng = np.random.default_rng(seed)
+    conversation_numbers = np.arange(rows) // turns_per_conversation
+    turn_numbers = np.arange(rows) % turns_per_conversation
+    conversation_count = conversation_numbers[-1] + 1 if rows else 0
+    conversation_starts = rng.integers(0, days * 86400, conversation_count)
+    conversation_bots = rng.integers(0, len(bots), conversation_count)
+
+    df = pd.DataFrame({
+        'bot_name': np.asarray(bots)[conversation_bots[conversation_numbers]],
+        'conversation_id': np.char.add('conv', conversation_numbers.astype(str)),
+        'mid': np.char.add('m', np.arange(rows).astype(str)),
+        'utterance': UTTERANCES[rng.integers(0, len(UTTERANCES), rows)],
+        'response': RESPONSES[rng.integers(0, len(RESPONSES), rows)],
+        'datetime': (
+            pd.Timestamp('2024-01-01')
+            + pd.to_timedelta(conversation_starts[conversation_numbers] + turn_numbers * 30, unit='s')
+        )
+    })
+    if shuffle:
+        return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return df
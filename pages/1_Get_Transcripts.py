@@ -1,9 +1,15 @@
+import time
+page_started = time.perf_counter()
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import snowflake.connector
-import os
 from dotenv import load_dotenv
+from smart_review.state import store_frame
+from smart_review.widgets import frame_preview
+from smart_review.sync import sync_transcripts
+from smart_review.services import record_page_time, snowflake_pool
+
+record_page_time('Get Transcripts', 'imports', page_started)
 
 # Load environment variables
 load_dotenv()
@@ -38,42 +44,16 @@ def get_mock_data():
     }
     return pd.DataFrame(data)
 
-def connect_to_snowflake():
-    """Establish connection to Snowflake"""
+def get_transcripts_from_snowflake(bot_name, start_date, end_date):
+    """Fetch the ranges missing from the local transcript cache and read it"""
     try:
-        conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=os.getenv('SNOWFLAKE_SCHEMA')
-        )
-        return conn
+        df, stats = sync_transcripts(bot_name, start_date, end_date, pool=snowflake_pool())
+        st.info(str(stats))
+        return df
     except Exception as e:
-        st.error(f"Error connecting to Snowflake: {str(e)}")
+        st.error(f"Error fetching data: {str(e)}")
         return None
 
-def get_transcripts_from_snowflake(bot_name, start_date, end_date):
-    """Fetch transcripts from Snowflake"""
-    conn = connect_to_snowflake()
-    if conn:
-        try:
-            query = f"""
-            SELECT bot_name, conversation_id, mid, utterance, response, datetime
-            FROM transcripts
-            WHERE bot_name = '{bot_name}'
-            AND datetime BETWEEN '{start_date}' AND '{end_date}'
-            ORDER BY conversation_id, datetime
-            """
-            df = pd.read_sql(query, conn)
-            conn.close()
-            return df
-        except Exception as e:
-            st.error(f"Error fetching data: {str(e)}")
-            return None
-    return None
-
 st.title("Get Transcripts from Snowflake")
 
 # Bot name input
@@ -103,16 +83,27 @@ else:
 # Fetch data button
 if st.button("Fetch Transcripts"):
     with st.spinner("Fetching transcripts..."):
-        # For demo purposes, use mock data
-        df = get_mock_data()
+        df = get_transcripts_from_snowflake(bot_name, start_date, end_date)
         if df is not None:
-            st.session_state.transcripts_df = df
+            df = store_frame('transcripts_df', df)
+            st.session_state.transcripts_query = {
+                'bot_name': bot_name,
+                'start_date': start_date,
+                'end_date': end_date
+            }
             st.success(f"Successfully loaded {len(df)} transcripts!")
-            st.dataframe(df)
         else:
             st.error("Failed to fetch transcripts")
 
+# Demo data button
+if st.button("Load Demo Data"):
+    df = store_frame('transcripts_df', get_mock_data())
+    st.session_state.transcripts_query = None
+    st.success(f"Successfully loaded {len(df)} demo transcripts!")
+
 # Display current data if available
 if st.session_state.transcripts_df is not None:
     st.subheader("Current Transcripts")
-    st.dataframe(st.session_state.transcripts_df) 
\ No newline at end of file
+    frame_preview('transcripts_df')
+
+record_page_time('Get Transcripts', 'script', page_started)
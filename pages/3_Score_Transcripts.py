@@ -1,131 +1,474 @@
-import streamlit as st
-import pandas as pd
-import boto3
-import json
 import time
-from datetime import datetime
+page_started = time.perf_counter()
+import streamlit as st
+from smart_review.cache import ScoreCache
+from smart_review.cascade import (
+    CHEAP_MODEL_ID,
+    DEFAULT_AMBIGUOUS_BAND,
+    DEFAULT_MIN_CONFIDENCE,
+    ModelCascade,
+)
+from smart_review.conversations import build_conversations
+from smart_review.dashboard import score_intervals
+from smart_review.dedup import DEFAULT_SIMILARITY_THRESHOLD, Deduplicator
+from smart_review.jobs import ScoringJob, job_id_for
+from smart_review.pipeline import score_records
+from smart_review.rollups import RollupStore
+from smart_review.sampling import DEFAULT_MIN_SAMPLES, DEFAULT_TARGET_HALF_WIDTH, resume_sample
+from smart_review.scoring import DEFAULT_INPUT_TOKEN_BUDGET, MODEL_ID, SCORE_COLUMNS, TOKEN_COLUMNS
+from smart_review.state import RUN_REFRESH_SECONDS, refresh_scores, run_status, scoring_runs, store_frame
+from smart_review.widgets import frame_preview
+from smart_review.transcripts import stream_conversations
+from smart_review.workqueue import DEFAULT_QUEUE_BATCH_SIZE, WorkQueue
+from smart_review.services import bedrock_client, record_page_time
+
+record_page_time('Score Transcripts', 'imports', page_started)
 
 st.title("Score Transcripts")
 
 def get_bedrock_client():
-    """Initialize Amazon Bedrock client"""
+    """The Amazon Bedrock client shared by every session"""
     try:
-        bedrock = boto3.client(
-            service_name='bedrock-runtime',
-            region_name='us-east-1'  # Change this to your AWS region
-        )
-        return bedrock
+        return bedrock_client()
     except Exception as e:
         st.error(f"Error connecting to Amazon Bedrock: {str(e)}")
         return None
 
-def analyze_conversation(bedrock, conversation):
-    """Analyze a single conversation using Claude"""
-    prompt = f"""Please analyze the following conversation and provide:
-1. A brief summary
-2. A satisfaction score (1-5)
-3. An accuracy score (1-5)
-4. A relevancy score (1-5)
-5. A containment score (1-5)
-
-Conversation:
-{conversation}
-
-Please provide the analysis in JSON format with the following structure:
-{{
-    "summary": "brief summary here",
-    "satisfaction_score": number,
-    "accuracy_score": number,
-    "relevancy_score": number,
-    "containment_score": number
-}}"""
+def start_scoring(job_id, max_workers=8, requests_per_second=5.0, force_rescore=False, pack_token_budget=None,
+                  stream_from_snowflake=False, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET,
+                  sampling=False, target_half_width=DEFAULT_TARGET_HALF_WIDTH, confidence=0.95,
+                  dedup_threshold=None, cascade_settings=None):
+    """Start scoring all transcripts on a background thread and return the run.
 
-    try:
-        response = bedrock.invoke_model(
-            modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-            body=json.dumps({
-                "prompt": prompt,
-                "max_tokens_to_sample": 1000,
-                "temperature": 0.5,
-            })
-        )
-        
-        response_body = json.loads(response['body'].read())
-        return json.loads(response_body['completion'])
-    except Exception as e:
-        st.error(f"Error analyzing conversation: {str(e)}")
-        return None
+    Results are checkpointed under job_id as they finish, and conversations
+    already in the checkpoint are skipped when the job is run again. The
+    run keeps going when the page is left, and the Dashboard and Export
+    pages read its finished results from the checkpoint. If the job is
+    already running, this session attaches to that run instead.
 
-def process_transcripts():
-    """Process all transcripts and generate scores"""
+    With sampling, conversations are scored in stratified random order
+    until the confidence interval of every mean score is narrower than
+    target_half_width.
+
+    With dedup_threshold, only one conversation per cluster of
+    near-duplicates is sent to Bedrock and the others share its scores.
+
+    With cascade_settings (ModelCascade keyword arguments), each
+    conversation is scored by a cheap model first and only escalated to
+    the larger one when the answer is unusable or unsure.
+    """
     if st.session_state.transcripts_df is None:
         st.error("No transcripts available. Please load transcripts first.")
         return None
 
+    runs = scoring_runs()
+    run = runs.get(job_id)
+    if run is not None and run.running:
+        st.info(f"Job {job_id} is already running; showing its progress")
+        st.session_state.scoring_run_id = job_id
+        return run
+
     bedrock = get_bedrock_client()
     if bedrock is None:
         return None
 
-    # Group transcripts by conversation_id
-    conversations = st.session_state.transcripts_df.groupby('conversation_id').agg({
-        'utterance': lambda x: '\n'.join(x),
-        'response': lambda x: '\n'.join(x),
-        'bot_name': 'first',
-        'datetime': 'first'
-    }).reset_index()
-
-    results = []
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-
-    for idx, conv in conversations.iterrows():
-        status_text.text(f"Processing conversation {idx + 1} of {len(conversations)}")
-        
-        conversation_text = f"Bot: {conv['bot_name']}\nUser: {conv['utterance']}\nBot: {conv['response']}"
-        analysis = analyze_conversation(bedrock, conversation_text)
-        
-        if analysis:
-            results.append({
-                'conversation_id': conv['conversation_id'],
-                'bot_name': conv['bot_name'],
-                'datetime': conv['datetime'],
-                'summary': analysis['summary'],
-                'satisfaction_score': analysis['satisfaction_score'],
-                'accuracy_score': analysis['accuracy_score'],
-                'relevancy_score': analysis['relevancy_score'],
-                'containment_score': analysis['containment_score']
-            })
-        
-        progress_bar.progress((idx + 1) / len(conversations))
-        time.sleep(0.1)  # Small delay to prevent rate limiting
-
-    status_text.empty()
-    progress_bar.empty()
-
-    if results:
-        scores_df = pd.DataFrame(results)
-        st.session_state.scores_df = scores_df
-        return scores_df
-    return None
+    job = ScoringJob(job_id)
+    if force_rescore:
+        job.reset()
+    already_scored = len(job.completed_ids())
+    if already_scored:
+        st.info(f"Resuming job {job_id}: skipping {already_scored} conversation(s) already scored")
+
+    estimate = None
+    if sampling:
+        records, estimate, total = resume_sample(
+            build_conversations(st.session_state.transcripts_df), job.rows(), confidence, target_half_width,
+            DEFAULT_MIN_SAMPLES
+        )
+    elif stream_from_snowflake:
+        # Conversations are scored batch by batch as Snowflake returns them
+        records = stream_conversations(**st.session_state.transcripts_query)
+        total = None
+    else:
+        records = list(job.pending(build_conversations(st.session_state.transcripts_df)))
+        total = len(records)
+
+    dedup = Deduplicator(dedup_threshold) if dedup_threshold else None
+    cascade = ModelCascade(input_token_budget=input_token_budget, **cascade_settings) if cascade_settings else None
+
+    def converged(row):
+        estimate.add(row)
+        return estimate.converged()
+
+    def score(run):
+        run.stats.update(estimate=estimate, dedup=dedup, cascade=cascade)
+        cache = ScoreCache()
+        rollups = RollupStore()
+        try:
+            run.consume(
+                score_records(
+                    bedrock,
+                    records,
+                    job,
+                    cache,
+                    refresh=force_rescore,
+                    max_workers=max_workers,
+                    requests_per_second=requests_per_second,
+                    pack_token_budget=pack_token_budget,
+                    input_token_budget=input_token_budget,
+                    dedup=dedup,
+                    cascade=cascade,
+                    rollups=rollups
+                ),
+                converged=converged if estimate is not None else None
+            )
+        finally:
+            run.stats['cache'] = cache.stats()
+            cache.close()
+            rollups.close()
+            job.close()
+
+    run, _ = runs.start(job_id, score, total)
+    st.session_state.scoring_run_id = job_id
+    st.session_state.scores_checkpoint_size = None
+    st.session_state.sample_population = estimate.population if estimate is not None else None
+    st.session_state.sample_confidence = confidence
+    return run
+
+def show_results(scores_df, sampling, confidence):
+    """Means and token usage of a finished run's scores"""
+    # Display mean scores
+    st.subheader("Mean Scores")
+    if sampling:
+        st.write(score_intervals(
+            scores_df[SCORE_COLUMNS].astype(float), confidence, st.session_state.sample_population
+        ))
+    else:
+        mean_scores = scores_df[SCORE_COLUMNS].mean()
+        st.write(mean_scores)
+
+    # Display token usage
+    if all(column in scores_df.columns for column in TOKEN_COLUMNS):
+        st.subheader("Token Usage")
+        st.write(scores_df[TOKEN_COLUMNS].sum())
+
+@st.fragment(run_every=RUN_REFRESH_SECONDS)
+def show_run_progress(run):
+    """Live progress of a running job; reruns the page once it ends"""
+    if not run.running:
+        st.rerun()
+    if run.total:
+        st.progress(min(1.0, run.done / run.total))
+    st.text(run_status(run))
+    estimate = run.stats.get('estimate')
+    if estimate is not None and estimate.count:
+        st.dataframe(estimate.to_frame())
+    if st.button("Stop Scoring", disabled=run.stopping):
+        run.stop()
+
+def show_run(run):
+    """Progress of the session's scoring run, or how it ended"""
+    st.subheader("Scoring Run")
+    if run.running:
+        show_run_progress(run)
+        return
+
+    st.text(run_status(run))
+    for conversation_id, message in run.errors:
+        st.error(f"Error analyzing conversation {conversation_id}: {message}")
+    if run.failures > len(run.errors):
+        st.caption(f"Showing the last {len(run.errors)} errors")
+    if run.status == 'failed':
+        st.error(f"Error streaming transcripts: {str(run.error)}")
+    elif run.failures:
+        st.warning(f"{run.failures} conversation(s) could not be scored")
+
+    estimate = run.stats.get('estimate')
+    if estimate is not None and estimate.converged():
+        st.info(f"Stopped after scoring {estimate.count:,} of {estimate.population:,} conversations: "
+                f"every {estimate.confidence:.0%} interval is within ±{estimate.target_half_width}")
+
+    st.session_state.score_cache_stats = run.stats.get('cache')
+    st.session_state.dedup_stats = run.stats.get('dedup').stats if run.stats.get('dedup') else None
+    st.session_state.cascade_stats = run.stats.get('cascade').stats if run.stats.get('cascade') else None
+
+    scores_df = st.session_state.scores_df
+    if run.status == 'finished' and scores_df is not None:
+        st.success("Successfully scored the sample!" if estimate is not None else "Successfully processed all transcripts!")
+        show_results(scores_df, estimate is not None, st.session_state.get('sample_confidence', 0.95))
+
+# Sampling settings
+sampling = st.checkbox(
+    "Sampling mode: score a stratified random sample until the estimates are precise enough",
+    help="Samples proportionally by bot and hour and stops once every confidence interval is narrow enough"
+)
+target_half_width = DEFAULT_TARGET_HALF_WIDTH
+confidence = 0.95
+if sampling:
+    col1, col2 = st.columns(2)
+    with col1:
+        target_half_width = st.number_input(
+            "Target Interval Half-Width (score points)", min_value=0.01, max_value=1.0,
+            value=DEFAULT_TARGET_HALF_WIDTH, step=0.01
+        )
+    with col2:
+        confidence = st.selectbox("Confidence Level", [0.90, 0.95, 0.99], index=1, format_func=lambda c: f"{c:.0%}")
+
+@st.cache_resource
+def get_work_queue():
+    """Work queue shared by every session; workers open the same database"""
+    return WorkQueue()
+
+def submit_to_queue(job_id, pack_token_budget=None, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET,
+                    stream_from_snowflake=False, batch_size=DEFAULT_QUEUE_BATCH_SIZE):
+    """Queue the loaded conversations as batches for smart-review worker processes"""
+    if stream_from_snowflake:
+        records = stream_conversations(**st.session_state.transcripts_query)
+    else:
+        records = build_conversations(st.session_state.transcripts_df)
+    try:
+        return get_work_queue().submit(
+            job_id,
+            records,
+            settings={'pack_token_budget': pack_token_budget, 'input_token_budget': input_token_budget},
+            batch_size=batch_size
+        )
+    except Exception as e:
+        st.error(f"Error queueing transcripts: {str(e)}")
+        return None
+
+def show_queue_progress(queue, job_id):
+    """Progress of a queued job across all workers"""
+    progress = queue.progress(job_id)
+    if progress is None:
+        return
+    if progress['conversations']:
+        st.progress(min(1.0, (progress['scored'] + progress['failures']) / progress['conversations']))
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Scored", f"{progress['scored']:,} / {progress['conversations']:,}")
+    with col2:
+        st.metric("Failed Conversations", progress['failures'])
+    with col3:
+        st.metric("Active Workers", progress['workers'])
+    with col4:
+        st.metric("Batches Left", progress['pending'] + progress['leased'])
+    if progress['failed']:
+        st.warning(f"{progress['failed']} batch(es) failed after repeated attempts")
+
+# Job settings
+job_id = None
+if st.session_state.transcripts_df is not None:
+    job_id = st.text_input(
+        "Job ID",
+        job_id_for(st.session_state.transcripts_df) + ('-sample' if sampling else ''),
+        help="Finished results are checkpointed under this ID; rerunning the same job resumes it"
+    )
+
+# Concurrency settings
+col1, col2 = st.columns(2)
+with col1:
+    max_workers = st.number_input("Concurrent Requests", min_value=1, max_value=64, value=8)
+with col2:
+    requests_per_second = st.number_input("Max Requests per Second", min_value=0.5, max_value=100.0, value=5.0, step=0.5)
+
+# Transcript source
+stream_from_snowflake = False
+if st.session_state.get('transcripts_query') and not sampling:
+    stream_from_snowflake = st.checkbox(
+        "Stream conversations from Snowflake instead of using the loaded transcripts",
+        help="Scores each batch as it arrives without holding the full result set in memory"
+    )
+
+# Token budget for a single request; longer conversations are split and merged
+input_token_budget = st.number_input(
+    "Input Token Budget per Request",
+    min_value=1000,
+    max_value=150000,
+    value=DEFAULT_INPUT_TOKEN_BUDGET,
+    step=1000
+)
+
+# Model cascade settings
+use_cascade = st.checkbox(
+    "Model cascade: score with a cheap model first and escalate only unsure answers",
+    help="Answers that fail to parse, have a borderline mean score or a low self-reported confidence go to the larger model"
+)
+cascade_settings = None
+if use_cascade:
+    col1, col2 = st.columns(2)
+    with col1:
+        cheap_model_id = st.text_input("Cheap Model", CHEAP_MODEL_ID)
+    with col2:
+        large_model_id = st.text_input("Large Model", MODEL_ID)
+    col1, col2 = st.columns(2)
+    with col1:
+        ambiguous_band = st.slider(
+            "Escalate Mean Scores Between", min_value=1.0, max_value=5.0, value=DEFAULT_AMBIGUOUS_BAND, step=0.25
+        )
+    with col2:
+        min_confidence = st.slider("Escalate Confidence Below", min_value=0.0, max_value=1.0, value=DEFAULT_MIN_CONFIDENCE, step=0.05)
+    cascade_settings = {
+        'models': (cheap_model_id, large_model_id),
+        'ambiguous_band': ambiguous_band,
+        'min_confidence': min_confidence,
+    }
+
+# Prompt packing settings; packed answers carry no confidence to escalate on
+pack_conversations = st.checkbox("Pack short conversations into shared requests", disabled=use_cascade)
+pack_token_budget = None
+if pack_conversations and not use_cascade:
+    pack_token_budget = st.number_input("Packing Token Budget per Request", min_value=500, max_value=50000, value=4000, step=500)
+
+# Near-duplicate settings
+dedup = st.checkbox(
+    "Score one conversation per cluster of near-duplicates",
+    help="Near-duplicate conversations of the same bot get a copy of their representative's scores and share a cluster_id"
+)
+dedup_threshold = None
+if dedup:
+    dedup_threshold = st.slider("Similarity Threshold", min_value=0.5, max_value=1.0, value=DEFAULT_SIMILARITY_THRESHOLD, step=0.05)
+
+# Score cache settings
+force_rescore = st.checkbox("Force rescore (ignore cached scores)")
+if st.button("Clear Score Cache"):
+    cache = ScoreCache()
+    cache.clear()
+    cache.close()
+    st.session_state.score_cache_stats = None
+    st.success("Score cache cleared")
 
 # Process transcripts button
 if st.button("Process Transcripts"):
     if st.session_state.transcripts_df is not None:
-        with st.spinner("Processing transcripts..."):
-            scores_df = process_transcripts()
-            if scores_df is not None:
-                st.success("Successfully processed all transcripts!")
-                st.dataframe(scores_df)
-                
-                # Display mean scores
-                st.subheader("Mean Scores")
-                mean_scores = scores_df[['satisfaction_score', 'accuracy_score', 
-                                      'relevancy_score', 'containment_score']].mean()
-                st.write(mean_scores)
+        start_scoring(
+            job_id,
+            int(max_workers),
+            float(requests_per_second),
+            force_rescore,
+            int(pack_token_budget) if pack_token_budget else None,
+            stream_from_snowflake,
+            int(input_token_budget),
+            sampling,
+            float(target_half_width),
+            confidence,
+            dedup_threshold,
+            cascade_settings
+        )
+    else:
+        st.error("Please load transcripts first using either the Get Transcripts or Upload Transcripts page.")
+
+# Scoring runs in the background, so its progress survives leaving the page
+run = refresh_scores()
+if run is not None:
+    show_run(run)
+
+# Worker queue: score on worker processes on this host
+st.subheader("Worker Queue")
+st.caption(
+    "Large jobs can be split into batches that `smart-review worker` processes score in parallel, "
+    "on the host that holds the queue database. Sampling and near-duplicate "
+    "settings only apply when scoring in this session."
+)
+queue = get_work_queue()
+queue_batch_size = st.number_input(
+    "Conversations per Queued Batch", min_value=1, max_value=10000, value=DEFAULT_QUEUE_BATCH_SIZE
+)
+if st.button("Submit to Worker Queue"):
+    if st.session_state.transcripts_df is not None:
+        with st.spinner("Queueing transcripts..."):
+            added = submit_to_queue(
+                job_id,
+                int(pack_token_budget) if pack_token_budget else None,
+                int(input_token_budget),
+                stream_from_snowflake,
+                int(queue_batch_size)
+            )
+        if added is not None:
+            st.success(f"Queued {added:,} conversation(s). Start workers with `smart-review worker --job-id {job_id}`")
     else:
         st.error("Please load transcripts first using either the Get Transcripts or Upload Transcripts page.")
 
+queued_jobs = queue.jobs()
+if queued_jobs:
+    queued_job = st.selectbox(
+        "Queued Job",
+        queued_jobs,
+        index=queued_jobs.index(job_id) if job_id in queued_jobs else 0
+    )
+    show_queue_progress(queue, queued_job)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.button("Refresh Progress")
+    with col2:
+        if st.button("Load Results"):
+            scores_df = queue.to_frame(queued_job)
+            if scores_df is None:
+                st.info("No results yet")
+            else:
+                store_frame('scores_df', scores_df)
+                st.session_state.scoring_run_id = None
+                st.session_state.sample_population = None
+                st.success(f"Loaded {len(scores_df):,} scores")
+    with col3:
+        if st.button("Retry Failed Batches"):
+            st.info(f"Requeued {queue.retry_failed(queued_job)} batch(es)")
+
+# Display score cache counters from the last run
+if st.session_state.get('score_cache_stats'):
+    stats = st.session_state.score_cache_stats
+    st.subheader("Score Cache")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cache Hits", stats['hits'])
+    with col2:
+        st.metric("Cache Misses", stats['misses'])
+    with col3:
+        st.metric("Cached Scores", stats['entries'])
+
+# Display near-duplicate counters from the last run
+if st.session_state.get('dedup_stats'):
+    stats = st.session_state.dedup_stats
+    st.subheader("Near-Duplicates")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Conversations", stats.conversations)
+    with col2:
+        st.metric("Clusters", stats.clusters)
+    with col3:
+        st.metric("Scoring Calls Saved", stats.calls_saved)
+
+# Display model cascade counters from the last run
+if st.session_state.get('cascade_stats'):
+    stats = st.session_state.cascade_stats
+    savings = stats.savings()
+    st.subheader("Model Cascade")
+    st.dataframe(stats.to_frame().style.format({
+        'share_reached': '{:.1%}', 'share_escalated': '{:.1%}', 'mean_latency_s': '{:.2f}', 'cost_usd': '${:.4f}'
+    }))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Escalated to Large Model", f"{stats.tiers[-1].calls / max(stats.conversations, 1):.1%}")
+    with col2:
+        cost_saved = savings['baseline_cost'] - savings['cost']
+        st.metric(
+            "Estimated Cost Saved", f"${cost_saved:.4f}",
+            f"{cost_saved / savings['baseline_cost']:.0%}" if savings['baseline_cost'] else None,
+            help="Compared with scoring every conversation with the large model alone"
+        )
+    with col3:
+        if savings['baseline_seconds']:
+            time_saved = savings['baseline_seconds'] - savings['seconds']
+            st.metric(
+                "Estimated Model Time Saved", f"{time_saved:,.1f}s", f"{time_saved / savings['baseline_seconds']:.0%}",
+                help="Summed request latency compared with the large model's mean latency for every conversation"
+            )
+        else:
+            st.metric("Estimated Model Time Saved", "n/a", help="No conversation reached the large model")
+
 # Display current scores if available
 if st.session_state.scores_df is not None:
     st.subheader("Current Scores")
-    st.dataframe(st.session_state.scores_df) 
\ No newline at end of file
+    frame_preview('scores_df')
+
+record_page_time('Score Transcripts', 'script', page_started)
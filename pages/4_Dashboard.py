@@ -1,113 +1,215 @@
+import time
+page_started = time.perf_counter()
+import math
+from datetime import timedelta
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
+from smart_review.dashboard import compute_dashboard, SCORE_VALUES
+from smart_review.rollups import summarize_rollups
+from smart_review.scoring import SCORE_COLUMNS
+from smart_review.state import RUN_REFRESH_SECONDS, frame_key, refresh_scores, rollup_store, run_status
+from smart_review.services import record_page_time
+
+record_page_time('Dashboard', 'imports', page_started)
+
+# Traces with more points than this are drawn with WebGL
+WEBGL_THRESHOLD = 1000
 
 st.title("Dashboard")
 
-def create_histogram(df, column, title):
-    """Create a histogram with mean line"""
-    fig = px.histogram(
-        df,
-        x=column,
-        nbins=5,
+@st.cache_data(show_spinner="Computing dashboard...", max_entries=8)
+def load_dashboard(key, max_points, confidence, population, _df):
+    """Aggregates for a scores DataFrame, memoized on its content hash"""
+    return compute_dashboard(_df, max_points, confidence, population)
+
+@st.cache_data(show_spinner="Reading score history...", max_entries=8, ttl=60)
+def load_history(start, end, bots, max_points, confidence, conversations):
+    """Aggregates of the rollup store for a date range and bots; conversations keys the cache to its size"""
+    return summarize_rollups(rollup_store().query(start, end, list(bots)), max_points, confidence)
+
+def create_histogram(value_counts, mean_value, half_width, column, title):
+    """Create a histogram with mean line and confidence band from precomputed value counts"""
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Bar(x=SCORE_VALUES, y=value_counts[column].to_numpy(), name=title))
+    fig.update_layout(
         title=title,
-        labels={column: "Score"},
-        range_x=[0, 6]
+        xaxis_title="Score",
+        yaxis_title="count",
+        xaxis_range=[0, 6],
+        bargap=0.1
     )
-    
-    # Add mean line
-    mean_value = df[column].mean()
+
+    # Add mean line with its confidence interval
+    if math.isfinite(half_width):
+        fig.add_vrect(
+            x0=mean_value - half_width,
+            x1=mean_value + half_width,
+            fillcolor="red",
+            opacity=0.15,
+            line_width=0
+        )
     fig.add_vline(
         x=mean_value,
         line_dash="dash",
         line_color="red",
-        annotation_text=f"Mean: {mean_value:.2f}",
+        annotation_text=f"Mean: {mean_value:.2f} ± {half_width:.2f}",
         annotation_position="top right"
     )
-    
+
     return fig
 
-if st.session_state.scores_df is not None:
+def show_dashboard(max_points, confidence):
+    """Charts and statistics of the scores in this session"""
+    # Set by the Score page when the scores are a sample of the loaded conversations
+    population = st.session_state.get('sample_population')
     df = st.session_state.scores_df
-    
+    render_dashboard(load_dashboard(frame_key('scores_df'), max_points, confidence, population, df), confidence, population)
+
+def show_history(max_points, confidence):
+    """Charts and statistics of every score merged into the rollup store"""
+    store = rollup_store()
+    time_range = store.time_range()
+    if time_range is None:
+        st.warning("No score history yet. Scores are added to it as they are scored, or with `smart-review rollup`.")
+        return
+    first, last = time_range[0].date(), (time_range[1] - timedelta(microseconds=1)).date()
+    dates = st.sidebar.date_input("Date range", value=(first, last), min_value=first, max_value=last)
+    if len(dates) != 2:
+        st.info("Select the last day of the range.")
+        return
+    bots = st.sidebar.multiselect("Bots", store.bots(), help="All bots when empty")
+    start, end = dates[0], dates[1] + timedelta(days=1)
+    dashboard = load_history(start, end, tuple(bots), max_points, confidence, len(store))
+    if dashboard is None:
+        st.warning("No scores in the selected range.")
+        return
+    st.caption(f"Score history from {dates[0]} to {dates[1]}, read from hourly rollups")
+    render_dashboard(dashboard, confidence)
+
+def render_dashboard(dashboard, confidence, population=None):
+    """Draw the Dashboard from compute_dashboard or summarize_rollups aggregates"""
+    # Plotly is loaded on the first render rather than on every visit to the page
+    import plotly.express as px
+    import plotly.graph_objects as go
+    means = dashboard['means']
+    half_widths = dashboard['intervals']['half_width']
+
     # Display overall statistics
     st.subheader("Overall Statistics")
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
-        st.metric("Total Conversations", len(df))
+        st.metric("Total Conversations", dashboard['total_conversations'])
     with col2:
-        st.metric("Unique Bots", df['bot_name'].nunique())
+        st.metric("Unique Bots", dashboard['unique_bots'])
     with col3:
-        st.metric("Average Satisfaction", f"{df['satisfaction_score'].mean():.2f}")
+        st.metric("Average Satisfaction", f"{means['satisfaction_score']:.2f} ± {half_widths['satisfaction_score']:.2f}")
     with col4:
-        st.metric("Average Accuracy", f"{df['accuracy_score'].mean():.2f}")
-    
+        st.metric("Average Accuracy", f"{means['accuracy_score']:.2f} ± {half_widths['accuracy_score']:.2f}")
+
+    # Confidence intervals of every metric
+    st.subheader(f"Mean Scores with {confidence:.0%} Confidence Intervals")
+    if population:
+        st.caption(f"Scores are a stratified sample of {population:,} conversations")
+    st.dataframe(dashboard['intervals'].style.format(precision=3))
+
     # Create histograms for each metric
     st.subheader("Score Distributions")
-    
+    value_counts = dashboard['value_counts']
+
     col1, col2 = st.columns(2)
     with col1:
-        st.plotly_chart(create_histogram(df, 'satisfaction_score', 'Satisfaction Score Distribution'), use_container_width=True)
-        st.plotly_chart(create_histogram(df, 'accuracy_score', 'Accuracy Score Distribution'), use_container_width=True)
+        st.plotly_chart(create_histogram(value_counts, means['satisfaction_score'], half_widths['satisfaction_score'], 'satisfaction_score', 'Satisfaction Score Distribution'), use_container_width=True)
+        st.plotly_chart(create_histogram(value_counts, means['accuracy_score'], half_widths['accuracy_score'], 'accuracy_score', 'Accuracy Score Distribution'), use_container_width=True)
     with col2:
-        st.plotly_chart(create_histogram(df, 'relevancy_score', 'Relevancy Score Distribution'), use_container_width=True)
-        st.plotly_chart(create_histogram(df, 'containment_score', 'Containment Score Distribution'), use_container_width=True)
-    
+        st.plotly_chart(create_histogram(value_counts, means['relevancy_score'], half_widths['relevancy_score'], 'relevancy_score', 'Relevancy Score Distribution'), use_container_width=True)
+        st.plotly_chart(create_histogram(value_counts, means['containment_score'], half_widths['containment_score'], 'containment_score', 'Containment Score Distribution'), use_container_width=True)
+
     # Correlation heatmap
     st.subheader("Score Correlations")
-    correlation_matrix = df[['satisfaction_score', 'accuracy_score', 'relevancy_score', 'containment_score']].corr()
     fig = px.imshow(
-        correlation_matrix,
+        dashboard['correlation'],
         labels=dict(color="Correlation"),
         title="Score Correlation Matrix"
     )
     st.plotly_chart(fig, use_container_width=True)
-    
-    # Time series of scores
+
+    # Time series of scores, bucketed when there are too many points to draw
     st.subheader("Score Trends Over Time")
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    df = df.sort_values('datetime')
-    
+    trends = dashboard['trends']
+    scatter = go.Scattergl if len(trends) > WEBGL_THRESHOLD else go.Scatter
+
     fig = go.Figure()
-    for score in ['satisfaction_score', 'accuracy_score', 'relevancy_score', 'containment_score']:
-        fig.add_trace(go.Scatter(
-            x=df['datetime'],
-            y=df[score],
+    for score in SCORE_COLUMNS:
+        fig.add_trace(scatter(
+            x=trends['datetime'],
+            y=trends[score],
             name=score.replace('_', ' ').title(),
-            mode='lines+markers'
+            mode='lines+markers',
+            customdata=trends['count'],
+            hovertemplate="%{x}<br>Mean: %{y:.2f}<br>Conversations: %{customdata}"
         ))
-    
+
+    title = "Score Trends Over Time"
+    if dashboard['trend_frequency']:
+        title += f" ({dashboard['trend_frequency']} buckets)"
     fig.update_layout(
-        title="Score Trends Over Time",
+        title=title,
         xaxis_title="Date",
         yaxis_title="Score",
         yaxis_range=[0, 6]
     )
     st.plotly_chart(fig, use_container_width=True)
-    
+
     # Bot comparison
     st.subheader("Bot Performance Comparison")
-    bot_stats = df.groupby('bot_name')[['satisfaction_score', 'accuracy_score', 'relevancy_score', 'containment_score']].mean()
-    
+    bot_stats = dashboard['bot_means']
+
     fig = go.Figure()
-    for score in ['satisfaction_score', 'accuracy_score', 'relevancy_score', 'containment_score']:
+    for score in SCORE_COLUMNS:
         fig.add_trace(go.Bar(
             name=score.replace('_', ' ').title(),
             x=bot_stats.index,
-            y=bot_stats[score]
+            y=bot_stats[score],
+            error_y=dict(type='data', array=dashboard['bot_half_widths'][score])
         ))
-    
+
     fig.update_layout(
-        title="Average Scores by Bot",
+        title=f"Average Scores by Bot ({confidence:.0%} confidence intervals)",
         xaxis_title="Bot Name",
         yaxis_title="Score",
         yaxis_range=[0, 6],
         barmode='group'
     )
     st.plotly_chart(fig, use_container_width=True)
-    
+
+@st.fragment(run_every=RUN_REFRESH_SECONDS)
+def show_partial_dashboard(max_points, confidence):
+    """Dashboard of a scoring run in progress, refreshed as results arrive"""
+    run = refresh_scores()
+    if run is None or not run.running:
+        st.rerun()
+    st.info(f"{run_status(run)}. Showing partial results, refreshed every {RUN_REFRESH_SECONDS:g}s.")
+    if st.session_state.scores_df is not None:
+        show_dashboard(max_points, confidence)
+
+def chart_settings():
+    """Trend points and confidence level chosen in the sidebar"""
+    max_points = st.sidebar.slider("Trend chart points", min_value=100, max_value=2000, value=500, step=100)
+    confidence = st.sidebar.selectbox("Confidence level", [0.90, 0.95, 0.99], index=1, format_func=lambda c: f"{c:.0%}")
+    return max_points, confidence
+
+# Scores of a background run are loaded as it finishes them
+run = refresh_scores()
+source = st.sidebar.radio("Scores", ["This session", "Score history"], help="Score history covers every scoring run, aggregated by bot and hour")
+if source == "Score history":
+    show_history(*chart_settings())
+elif st.session_state.scores_df is not None or (run is not None and run.running):
+    max_points, confidence = chart_settings()
+    if run is not None and run.running:
+        show_partial_dashboard(max_points, confidence)
+    else:
+        show_dashboard(max_points, confidence)
 else:
-    st.warning("No scores available. Please process transcripts first using the Score Transcripts page.") 
\ No newline at end of file
+    st.warning("No scores available. Please process transcripts first using the Score Transcripts page.")
+
+record_page_time('Dashboard', 'script', page_started)
@@ -1,10 +1,16 @@
+import time
+page_started = time.perf_counter()
 import streamlit as st
-import pandas as pd
-import boto3
-import json
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from smart_review.export import export_partitioned, export_to_s3, MANIFEST_NAME
+from smart_review.incremental import compact_export, export_incremental, DEFAULT_INCREMENTAL_PREFIX
+from smart_review.state import refresh_scores, run_status
+from smart_review.widgets import frame_preview
+from smart_review.services import record_page_time, s3_client
+
+record_page_time('Export', 'imports', page_started)
 
 # Load environment variables
 load_dotenv()
@@ -12,40 +18,47 @@ load_dotenv()
 st.title("Export Results")
 
 def get_s3_client():
-    """Initialize AWS S3 client"""
+    """The AWS S3 client shared by every session"""
     try:
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
-        return s3
+        return s3_client()
     except Exception as e:
         st.error(f"Error connecting to AWS S3: {str(e)}")
         return None
 
-def export_to_s3(data, bucket_name, file_name):
-    """Export data to S3 bucket"""
+def export_scores(data, bucket_name, file_name, export_format, incremental=False):
+    """Export data to an S3 bucket as JSON, as a partitioned dataset or as a delta of one"""
     s3 = get_s3_client()
     if s3 is None:
-        return False
-    
+        return None
+
     try:
-        # Convert DataFrame to JSON
-        json_data = data.to_json(orient='records', date_format='iso')
-        
-        # Upload to S3
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=file_name,
-            Body=json_data,
-            ContentType='application/json'
-        )
-        return True
+        if export_format == 'json':
+            export_to_s3(s3, data, bucket_name, file_name)
+            return {'key': file_name}
+        if incremental:
+            return export_incremental(s3, data, bucket_name, file_name, export_format)
+        return export_partitioned(s3, data, bucket_name, file_name, export_format)
     except Exception as e:
         st.error(f"Error exporting to S3: {str(e)}")
-        return False
+        return None
+
+def compact_deltas(bucket_name, prefix):
+    """Merge the deltas of an incremental export into one"""
+    s3 = get_s3_client()
+    if s3 is None:
+        return None
+
+    try:
+        return compact_export(s3, bucket_name, prefix)
+    except Exception as e:
+        st.error(f"Error compacting s3://{bucket_name}/{prefix}: {str(e)}")
+        return None
+
+# Scores of a background run are loaded as it finishes them
+run = refresh_scores()
+if run is not None and run.running:
+    st.info(f"{run_status(run)}. Exports include the conversations scored so far.")
+    st.button("Refresh Scores")
 
 if st.session_state.scores_df is not None:
     st.subheader("Export Scores to S3")
@@ -53,25 +66,65 @@ if st.session_state.scores_df is not None:
     # S3 bucket configuration
     bucket_name = st.text_input("S3 Bucket Name", os.getenv('AWS_S3_BUCKET', ''))
     
-    # Generate default file name
-    default_file_name = f"conversation_scores_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    file_name = st.text_input("File Name", default_file_name)
-    
+    # Export format
+    format_labels = {
+        'json': "JSON (single file)",
+        'parquet': "Parquet (partitioned by bot and date)",
+        'ndjson.gz': "Gzip JSON Lines (partitioned by bot and date)"
+    }
+    export_format = st.selectbox("Export Format", list(format_labels), format_func=format_labels.get)
+
+    incremental = export_format != 'json' and st.checkbox(
+        "Upload only new or changed rows",
+        value=True,
+        help="Keeps a manifest of exported conversations and their content hashes under the prefix, "
+             "and uploads each export as a delta of the rows that changed since the last one"
+    )
+
+    # Generate default file name or prefix
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if export_format == 'json':
+        file_name = st.text_input("File Name", f"conversation_scores_{timestamp}.json")
+    elif incremental:
+        file_name = st.text_input("Prefix", DEFAULT_INCREMENTAL_PREFIX)
+    else:
+        file_name = st.text_input("Prefix", f"conversation_scores/{timestamp}")
+
     if st.button("Export to S3"):
         if not bucket_name:
             st.error("Please enter an S3 bucket name")
         else:
             with st.spinner("Exporting to S3..."):
-                if export_to_s3(st.session_state.scores_df, bucket_name, file_name):
-                    st.success(f"Successfully exported scores to s3://{bucket_name}/{file_name}")
-                    
+                result = export_scores(st.session_state.scores_df, bucket_name, file_name, export_format, incremental)
+                if result is not None:
+                    if export_format == 'json':
+                        object_key = file_name
+                    elif incremental:
+                        object_key = f"{file_name.rstrip('/')}/{MANIFEST_NAME}"
+                        st.write(f"{str(result).capitalize()}. The export holds {result.manifest['rows']:,} conversations in {len(result.manifest['deltas'])} delta(s).")
+                    else:
+                        object_key = f"{file_name.rstrip('/')}/{MANIFEST_NAME}"
+                        st.write(f"Wrote {len(result['partitions'])} partition(s) with {result['rows']} rows")
+                    st.success(f"Successfully exported scores to s3://{bucket_name}/{object_key}")
+
                     # Display S3 URL
-                    s3_url = f"https://{bucket_name}.s3.amazonaws.com/{file_name}"
+                    s3_url = f"https://{bucket_name}.s3.amazonaws.com/{object_key}"
                     st.markdown(f"**S3 URL:** [{s3_url}]({s3_url})")
     
+    if incremental and st.button("Compact Deltas", help="Merge every delta under the prefix into one, keeping the latest row of each conversation"):
+        if not bucket_name:
+            st.error("Please enter an S3 bucket name")
+        else:
+            with st.spinner("Compacting deltas..."):
+                manifest = compact_deltas(bucket_name, file_name)
+                if manifest is not None:
+                    st.success(f"s3://{bucket_name}/{file_name.rstrip('/')} holds {manifest['rows']:,} conversations in {len(manifest['deltas'])} delta(s)")
+
     # Preview data to be exported
     st.subheader("Preview Data to Export")
-    st.dataframe(st.session_state.scores_df)
+    frame_preview('scores_df')
     
 else:
-    st.warning("No scores available. Please process transcripts first using the Score Transcripts page.") 
\ No newline at end of file
+    st.warning("No scores available. Please process transcripts first using the Score Transcripts page.")
+
+record_page_time('Export', 'script', page_started)
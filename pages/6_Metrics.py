@@ -0,0 +1,102 @@
+import time
+page_started = time.perf_counter()
+import streamlit as st
+import pandas as pd
+from smart_review.metrics import REGISTRY, serve_from_env
+from smart_review.services import record_page_time
+
+record_page_time('Metrics', 'imports', page_started)
+
+st.title("Metrics")
+
+serve_from_env()
+
+def labels_frame(series, value_name):
+    """Turn {label key: value} series into a DataFrame with one column per label"""
+    rows = [{**dict(key), value_name: value} for key, value in series.items()]
+    return pd.DataFrame(rows)
+
+def call_latency_frame(snapshot):
+    """Call counts and latency percentiles per service, operation, model and bot"""
+    rows = []
+    histogram = REGISTRY.call_seconds
+    for key, series in snapshot['smart_review_call_duration_seconds'].items():
+        labels = dict(key)
+        rows.append({
+            **labels,
+            'calls': series['count'],
+            'mean_ms': 1000 * series['sum'] / series['count'],
+            'p50_ms': 1000 * histogram.quantile(0.5, **labels),
+            'p95_ms': 1000 * histogram.quantile(0.95, **labels),
+            'total_s': series['sum']
+        })
+    return pd.DataFrame(rows)
+
+def page_time_frame(snapshot):
+    """Script runs and wall time per page and phase"""
+    rows = []
+    histogram = REGISTRY.page_seconds
+    for key, series in snapshot['smart_review_page_duration_seconds'].items():
+        labels = dict(key)
+        rows.append({
+            **labels,
+            'runs': series['count'],
+            'mean_ms': 1000 * series['sum'] / series['count'],
+            'p95_ms': 1000 * histogram.quantile(0.95, **labels),
+        })
+    return pd.DataFrame(rows).sort_values(['page', 'phase']) if rows else pd.DataFrame(rows)
+
+snapshot = REGISTRY.snapshot()
+
+if not any(series for name, series in snapshot.items() if name != 'smart_review_page_duration_seconds'):
+    st.info("No calls recorded yet in this process. Metrics appear here once transcripts are fetched, scored or exported.")
+else:
+    st.subheader("Call Latency")
+    st.dataframe(call_latency_frame(snapshot))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Calls by Outcome")
+        st.dataframe(labels_frame(snapshot['smart_review_calls_total'], 'calls'))
+    with col2:
+        st.subheader("Tokens")
+        tokens = labels_frame(snapshot['smart_review_tokens_total'], 'tokens')
+        if not tokens.empty:
+            st.dataframe(tokens.pivot_table(
+                index=[column for column in ('model', 'bot') if column in tokens.columns],
+                columns='direction',
+                values='tokens',
+                aggfunc='sum'
+            ))
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Throttled Calls", int(sum(snapshot['smart_review_throttles_total'].values())))
+    with col2:
+        st.metric("Retries", int(sum(snapshot['smart_review_retries_total'].values())))
+    with col3:
+        st.metric("JSON Parse Failures", int(sum(snapshot['smart_review_parse_failures_total'].values())))
+    with col4:
+        repairs = snapshot['smart_review_repairs_total']
+        st.metric("Repaired Replies", int(sum(value for key, value in repairs.items() if ('outcome', 'ok') in key)),
+                  help="Unparseable replies rewritten as JSON by the repair model instead of being rescored")
+
+    if snapshot['smart_review_parse_failures_total']:
+        st.subheader("Parse Failures by Model and Bot")
+        st.dataframe(labels_frame(snapshot['smart_review_parse_failures_total'], 'failures'))
+
+st.subheader("Page Load Times")
+st.caption("'imports' is the time to load a page's modules, which is only slow on its first run in this process; "
+           "'script' is the whole run")
+st.dataframe(page_time_frame(snapshot))
+
+prometheus_text = REGISTRY.render()
+st.download_button("Download Prometheus Metrics", prometheus_text, file_name="smart_review.prom", mime="text/plain")
+with st.expander("Prometheus Text Format"):
+    st.code(prometheus_text)
+
+if st.button("Reset Metrics"):
+    REGISTRY.reset()
+    st.rerun()
+
+record_page_time('Metrics', 'script', page_started)
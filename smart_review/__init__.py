@@ -0,0 +1,5 @@
+"""Building blocks for Smart Review.
+
+Everything here runs without Streamlit except state, services and widgets,
+which hold the app's session state, server-wide clients and shared components.
+"""
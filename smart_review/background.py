@@ -0,0 +1,131 @@
+"""Scoring runs on background threads that outlive the script run that started them."""
+import threading
+import time
+from collections import deque
+
+# Error messages kept per run for display; the failure count is exact
+MAX_RECENT_ERRORS = 20
+
+
+class ScoringRun:
+    """Progress of a scoring job running on a background thread.
+
+    The thread's results go to the job's checkpoint as they finish, which
+    is the store other readers load partial results from. The run itself
+    only keeps counters, recent errors and whatever its target puts in
+    stats, so it is cheap to poll.
+    """
+
+    def __init__(self, job_id, total=None):
+        self.job_id = job_id
+        self.total = total
+        self.done = 0
+        self.failures = 0
+        self.errors = deque(maxlen=MAX_RECENT_ERRORS)
+        self.stats = {}
+        self.status = 'pending'
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, target):
+        """Run target(self) on a daemon thread"""
+        self.status = 'running'
+        self.started_at = time.time()
+        self._thread = threading.Thread(
+            target=self._run, args=(target,), name=f"scoring-{self.job_id}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _run(self, target):
+        try:
+            target(self)
+            self.status = 'stopped' if self._stop.is_set() else 'finished'
+        except Exception as e:
+            self.error = e
+            self.status = 'failed'
+        finally:
+            self.finished_at = time.time()
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def stop(self):
+        """Ask the run to stop after the conversations already in flight"""
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        """Block until the thread ends; returns False on timeout"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def record(self, conversation, row, error):
+        """Count one finished conversation"""
+        self.done += 1
+        if error is not None:
+            self.failures += 1
+            self.errors.append((conversation['conversation_id'], str(error)))
+
+    def consume(self, scored, converged=None):
+        """Drain scored (conversation, row, error) results into the counters.
+
+        Stops early once stop() is called or converged(row) returns True
+        for a scored row, and closes scored either way so that queued
+        requests are cancelled.
+        """
+        try:
+            for conversation, row, error in scored:
+                self.record(conversation, row, error)
+                if self.stopping or (error is None and converged is not None and converged(row)):
+                    break
+        finally:
+            scored.close()
+
+
+class RunRegistry:
+    """The scoring runs of this process by job ID.
+
+    A job has at most one run at a time, so sessions that start the same
+    job attach to the run already in progress instead of scoring twice.
+    """
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._runs.get(job_id)
+
+    def start(self, job_id, target, total=None):
+        """Start target(run) for job_id, or return the run already in progress.
+
+        Returns (run, started).
+        """
+        with self._lock:
+            run = self._runs.get(job_id)
+            if run is not None and run.running:
+                return run, False
+            run = ScoringRun(job_id, total)
+            self._runs[job_id] = run
+            return run.start(target), True
+
+    def active(self):
+        """Runs that are still scoring"""
+        with self._lock:
+            return [run for run in self._runs.values() if run.running]
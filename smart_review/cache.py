@@ -0,0 +1,109 @@
+"""Persistent, content-addressed cache of LLM scores."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from smart_review.scoring import MODEL_ID, PROMPT_TEMPLATE, SYSTEM_PROMPT
+
+DEFAULT_CACHE_PATH = os.getenv('SMART_REVIEW_CACHE_PATH', os.path.join('.smart_review', 'score_cache.sqlite'))
+
+
+def cache_key(conversation, model_id=MODEL_ID, template=SYSTEM_PROMPT + PROMPT_TEMPLATE, mode='single'):
+    """Hash of everything that determines a score: text, prompt, model and scoring mode.
+
+    mode is how the conversation is sent, as given by
+    smart_review.scoring.scoring_mode, so that packed and map-reduce
+    analyses are not served for a plain request or the other way round.
+    """
+    digest = hashlib.sha256()
+    for part in (model_id, template, mode, conversation):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """SQLite-backed cache of analyses keyed by cache_key.
+
+    Entries older than max_age_days are ignored and evicted, and only the
+    newest max_entries are kept.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=200_000, max_age_days=30):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key TEXT PRIMARY KEY, analysis TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS scores_created_at ON scores (created_at)")
+        self._conn.commit()
+        self.evict()
+
+    def key(self, conversation, model_id=MODEL_ID, mode='single'):
+        """Cache key for a rendered conversation scored with model_id in mode"""
+        return cache_key(conversation, model_id=model_id, mode=mode)
+
+    def get(self, key):
+        """Return the cached analysis for key, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT analysis FROM scores WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.max_age_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, analysis):
+        """Store an analysis, replacing any previous entry for key"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scores (key, analysis, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(analysis), time.time())
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries and trim the cache to max_entries"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM scores WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,)
+            )
+            self._conn.execute(
+                "DELETE FROM scores WHERE key IN ("
+                "SELECT key FROM scores ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached analysis"""
+        with self._lock:
+            self._conn.execute("DELETE FROM scores")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def stats(self):
+        """Hit/miss counters for this cache instance"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,246 @@
+"""Model cascade: score with a cheap model first and escalate when it is unsure."""
+import hashlib
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from smart_review.metrics import REGISTRY
+from smart_review.scoring import (
+    CONFIDENCE_SYSTEM_PROMPT,
+    DEFAULT_INPUT_TOKEN_BUDGET,
+    MODEL_ID,
+    SCORE_COLUMNS,
+    SYSTEM_PROMPT,
+    analyze_conversation,
+    is_throttling_error,
+)
+from smart_review.tokens import estimate_tokens
+
+CHEAP_MODEL_ID = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+DEFAULT_CASCADE_MODELS = (CHEAP_MODEL_ID, MODEL_ID)
+
+# On-demand Bedrock prices in USD per 1,000 input and output tokens
+MODEL_PRICES = {
+    'anthropic.claude-3-haiku-20240307-v1:0': (0.00025, 0.00125),
+    'anthropic.claude-3-sonnet-20240229-v1:0': (0.003, 0.015),
+    'anthropic.claude-3-5-sonnet-20240620-v1:0': (0.003, 0.015),
+    'anthropic.claude-3-opus-20240229-v1:0': (0.015, 0.075),
+}
+
+# A mean score in this band is a borderline call a small model often gets wrong
+DEFAULT_AMBIGUOUS_BAND = (2.5, 3.5)
+
+# Answers with a self-reported confidence below this are escalated
+DEFAULT_MIN_CONFIDENCE = 0.7
+
+ESCALATION_REASONS = ('parse_failure', 'ambiguous', 'low_confidence')
+
+
+def call_cost(model_id, usage):
+    """Estimated USD cost of token usage on model_id, 0 for unknown models"""
+    input_price, output_price = MODEL_PRICES.get(model_id, (0.0, 0.0))
+    return (usage.get('input_tokens', 0) * input_price + usage.get('output_tokens', 0) * output_price) / 1000
+
+
+def escalation_reason(analysis, ambiguous_band=DEFAULT_AMBIGUOUS_BAND, min_confidence=DEFAULT_MIN_CONFIDENCE):
+    """Why an analysis should go to the next tier, or None to accept it.
+
+    A missing or non-numeric confidence is not held against the answer, as
+    map-reduce analyses of long conversations do not report one.
+    """
+    if ambiguous_band is not None:
+        low, high = ambiguous_band
+        mean_score = sum(analysis[column] for column in SCORE_COLUMNS) / len(SCORE_COLUMNS)
+        if low <= mean_score <= high:
+            return 'ambiguous'
+    confidence = analysis.get('confidence')
+    if (min_confidence is not None and isinstance(confidence, (int, float)) and not isinstance(confidence, bool)
+            and confidence < min_confidence):
+        return 'low_confidence'
+    return None
+
+
+@dataclass
+class TierStats:
+    """Requests one tier of a cascade answered or passed on"""
+    model_id: str
+    calls: int = 0
+    escalated: int = 0
+    reasons: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+
+class CascadeStats:
+    """Thread-safe per-tier counters of a cascade, with savings estimates.
+
+    The baseline is every conversation scored by the last model alone: its
+    cost prices each conversation's first-tier tokens at the last model's
+    rates, and its latency is the last tier's mean latency per conversation.
+    """
+
+    def __init__(self, models):
+        self.tiers = [TierStats(model_id) for model_id in models]
+        self.conversations = 0
+        self.baseline_cost = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, tier, seconds, usage, reason=None):
+        """Count one request answered by tier, or escalated for reason"""
+        with self._lock:
+            stats = self.tiers[tier]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.input_tokens += usage.get('input_tokens', 0)
+            stats.output_tokens += usage.get('output_tokens', 0)
+            stats.cost += call_cost(stats.model_id, usage)
+            if tier == 0:
+                self.conversations += 1
+                self.baseline_cost += call_cost(self.tiers[-1].model_id, usage)
+            if reason is not None:
+                stats.escalated += 1
+                stats.reasons[reason] += 1
+
+    @property
+    def cost(self):
+        return sum(stats.cost for stats in self.tiers)
+
+    @property
+    def seconds(self):
+        return sum(stats.seconds for stats in self.tiers)
+
+    def baseline_seconds(self):
+        """Estimated model time had the last model scored everything, or None"""
+        last = self.tiers[-1]
+        if not last.calls:
+            return None
+        return last.seconds / last.calls * self.conversations
+
+    def savings(self):
+        """Actual and baseline cost and model time"""
+        return {
+            'conversations': self.conversations,
+            'cost': self.cost,
+            'baseline_cost': self.baseline_cost,
+            'seconds': self.seconds,
+            'baseline_seconds': self.baseline_seconds(),
+        }
+
+    def to_frame(self):
+        """One row per tier: share of conversations reaching and leaving it"""
+        rows = []
+        for tier, stats in enumerate(self.tiers):
+            rows.append({
+                'tier': tier,
+                'model_id': stats.model_id,
+                'conversations': stats.calls,
+                'share_reached': stats.calls / self.conversations if self.conversations else 0.0,
+                'escalated': stats.escalated,
+                'share_escalated': stats.escalated / stats.calls if stats.calls else 0.0,
+                **{reason: stats.reasons[reason] for reason in ESCALATION_REASONS},
+                'mean_latency_s': stats.seconds / stats.calls if stats.calls else 0.0,
+                'cost_usd': stats.cost,
+            })
+        return pd.DataFrame(rows).set_index('tier')
+
+    def __str__(self):
+        lines = [
+            f"tier {tier} {stats.model_id}: {stats.calls:,} conversations, {stats.escalated:,} escalated"
+            for tier, stats in enumerate(self.tiers)
+        ]
+        savings = self.savings()
+        if savings['baseline_cost']:
+            lines.append(f"cost ${savings['cost']:.4f} vs ${savings['baseline_cost']:.4f} with {self.tiers[-1].model_id} alone")
+        return '\n'.join(lines)
+
+
+class ModelCascade:
+    """Analyze function that tries models from cheapest to largest.
+
+    Every tier but the last is asked for a self-reported confidence. Its
+    answer is accepted unless it fails to parse, its mean score falls in
+    ambiguous_band, or its confidence is below min_confidence; then the
+    conversation goes to the next tier, which is cheaper than repairing
+    the answer. The last tier uses the standard prompt, repairs answers
+    that do not parse, and its answer or error is final. The returned analysis
+    carries the model_id that produced it and the tokens of every tier.
+
+    Throttling and other request errors are raised as they are, so the
+    caller's retry reruns the whole cascade. Only the attempt that is not
+    retried is counted in stats, so a retried conversation is counted once.
+    """
+
+    def __init__(self, models=DEFAULT_CASCADE_MODELS, ambiguous_band=DEFAULT_AMBIGUOUS_BAND,
+                 min_confidence=DEFAULT_MIN_CONFIDENCE, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET):
+        if not models:
+            raise ValueError("A cascade needs at least one model")
+        self.models = tuple(models)
+        self.ambiguous_band = tuple(ambiguous_band) if ambiguous_band is not None else None
+        self.min_confidence = min_confidence
+        self.input_token_budget = input_token_budget
+        self.stats = CascadeStats(self.models)
+
+    @property
+    def cache_id(self):
+        """Identifies the cascade's settings in score cache keys"""
+        # The early tiers' prompt is not part of the cache key's template
+        prompt = hashlib.sha256(CONFIDENCE_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:16]
+        return f"cascade:{'>'.join(self.models)}:{self.ambiguous_band}:{self.min_confidence}:{prompt}"
+
+    def __call__(self, bedrock, conversation):
+        attempt = []
+        try:
+            analysis = self._analyze(bedrock, conversation, attempt)
+        except Exception as e:
+            # A throttled cascade is run again by the caller, which counts instead
+            if not is_throttling_error(e):
+                self._record(attempt)
+            raise
+        self._record(attempt)
+        return analysis
+
+    def _record(self, attempt):
+        """Count the tier calls of a finished cascade in stats and metrics"""
+        for tier, seconds, usage, reason in attempt:
+            self.stats.record(tier, seconds, usage, reason)
+            if reason is not None:
+                REGISTRY.inc('escalations', model=self.models[tier], reason=reason)
+
+    def _analyze(self, bedrock, conversation, attempt):
+        """Run the tiers, appending (tier, seconds, usage, reason) of each call to attempt"""
+        usage = {'input_tokens': 0, 'output_tokens': 0}
+        for tier, model_id in enumerate(self.models):
+            last = tier == len(self.models) - 1
+            start = time.perf_counter()
+            try:
+                analysis = analyze_conversation(
+                    bedrock,
+                    conversation,
+                    model_id=model_id,
+                    input_token_budget=self.input_token_budget,
+                    system=SYSTEM_PROMPT if last else CONFIDENCE_SYSTEM_PROMPT,
+                    repair=last
+                )
+            except ValueError:
+                # The tokens of an unparseable answer are not returned, so
+                # charge the prompt's estimated size
+                call_usage = {'input_tokens': estimate_tokens(conversation), 'output_tokens': 0}
+                attempt.append((tier, time.perf_counter() - start, call_usage, None if last else 'parse_failure'))
+                if last:
+                    raise
+                for key in usage:
+                    usage[key] += call_usage[key]
+                continue
+            call_usage = {key: analysis.get(key, 0) for key in usage}
+            reason = None if last else escalation_reason(analysis, self.ambiguous_band, self.min_confidence)
+            attempt.append((tier, time.perf_counter() - start, call_usage, reason))
+            for key in usage:
+                usage[key] += call_usage[key]
+            if reason is None:
+                return {**analysis, **usage, 'model_id': model_id}
@@ -0,0 +1,250 @@
+"""Command-line entry point: smart-review run --bot X --since ... --until ..."""
+import argparse
+import multiprocessing
+import os
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from smart_review.cache import ScoreCache
+from smart_review.cascade import DEFAULT_CASCADE_MODELS
+from smart_review.clients import get_bedrock_client, get_s3_client
+from smart_review.dedup import DEFAULT_SIMILARITY_THRESHOLD
+from smart_review.export import EXPORT_FORMATS
+from smart_review.incremental import DEFAULT_EXPORT_STATE_DIR, DEFAULT_INCREMENTAL_PREFIX, compact_export
+from smart_review.jobs import DEFAULT_JOBS_DIR, ScoringJob
+from smart_review.metrics import REGISTRY
+from smart_review.pipeline import pipeline_job_id, run_pipeline
+from smart_review.rollups import DEFAULT_ROLLUP_PATH, RollupStore
+from smart_review.scoring import DEFAULT_INPUT_TOKEN_BUDGET
+from smart_review.transcripts import DEFAULT_BATCH_SIZE, stream_conversations
+from smart_review.workqueue import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_POLL_SECONDS,
+    DEFAULT_QUEUE_BATCH_SIZE,
+    DEFAULT_QUEUE_PATH,
+    WorkQueue,
+    run_worker,
+)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='smart-review', description="Score conversation transcripts with an LLM.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help="fetch transcripts from Snowflake, score them and export to S3")
+    run.add_argument('--bot', required=True, help="bot name to fetch transcripts for")
+    run.add_argument('--since', type=datetime.fromisoformat, help="start of the time range (ISO format, default: 24 hours before --until)")
+    run.add_argument('--until', type=datetime.fromisoformat, help="end of the time range (ISO format, default: the start of the current hour)")
+    run.add_argument('--bucket', default=os.getenv('AWS_S3_BUCKET'), help="S3 bucket to export to (default: $AWS_S3_BUCKET; omit to skip export)")
+    run.add_argument('--prefix', help=f"S3 prefix for the export (default: conversation_scores/<job id>, or {DEFAULT_INCREMENTAL_PREFIX} with --incremental)")
+    run.add_argument('--incremental', action='store_true', help="upload only rows that are new or changed since the last export to the prefix")
+    run.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='parquet', help="export format")
+    run.add_argument('--job-id', help="checkpoint job ID (default: derived from bot and time range)")
+    run.add_argument('--force-rescore', action='store_true', help="ignore cached scores and the job checkpoint")
+    run.add_argument('--workers', type=int, default=8, help="concurrent Bedrock requests")
+    run.add_argument('--rps', type=float, default=5.0, help="maximum Bedrock requests per second")
+    run.add_argument('--pack-token-budget', type=int, help="pack short conversations into requests of this many tokens")
+    run.add_argument('--input-token-budget', type=int, default=DEFAULT_INPUT_TOKEN_BUDGET, help="input tokens per request before map-reduce scoring")
+    run.add_argument('--dedup', type=float, nargs='?', const=DEFAULT_SIMILARITY_THRESHOLD, metavar='THRESHOLD',
+                     help=f"score one conversation per cluster of near-duplicates (similarity threshold, default {DEFAULT_SIMILARITY_THRESHOLD})")
+    run.add_argument('--cascade', type=lambda value: value.split(','), nargs='?', const=list(DEFAULT_CASCADE_MODELS), metavar='MODELS',
+                     help=f"score with a cheap model first and escalate unsure answers (comma-separated model IDs, cheapest first; default {','.join(DEFAULT_CASCADE_MODELS)})")
+    run.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Snowflake rows per batch")
+    run.add_argument('--metrics-file', default=os.getenv('SMART_REVIEW_METRICS_FILE'), help="write Prometheus metrics to this file when the run ends")
+    run.add_argument('--rollups', default=DEFAULT_ROLLUP_PATH, help="rollup database to merge scores into (default: $SMART_REVIEW_ROLLUP_PATH)")
+    run.add_argument('--no-rollups', dest='rollups', action='store_const', const=None, help="do not merge scores into the rollup database")
+
+    submit = subparsers.add_parser('submit', help="queue a bot's transcripts for scoring by worker processes")
+    submit.add_argument('--bot', required=True, help="bot name to fetch transcripts for")
+    submit.add_argument('--since', type=datetime.fromisoformat, help="start of the time range (ISO format, default: 24 hours before --until)")
+    submit.add_argument('--until', type=datetime.fromisoformat, help="end of the time range (ISO format, default: the start of the current hour)")
+    submit.add_argument('--job-id', help="queue job ID (default: derived from bot and time range)")
+    submit.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="work queue database (default: $SMART_REVIEW_QUEUE_PATH)")
+    submit.add_argument('--queue-batch-size', type=int, default=DEFAULT_QUEUE_BATCH_SIZE, help="conversations per queued batch")
+    submit.add_argument('--pack-token-budget', type=int, help="pack short conversations into requests of this many tokens")
+    submit.add_argument('--input-token-budget', type=int, default=DEFAULT_INPUT_TOKEN_BUDGET, help="input tokens per request before map-reduce scoring")
+    submit.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Snowflake rows per batch")
+
+    worker = subparsers.add_parser('worker', help="score batches from the work queue")
+    worker.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="work queue database (default: $SMART_REVIEW_QUEUE_PATH)")
+    worker.add_argument('--job-id', help="only take batches of this job")
+    worker.add_argument('--processes', type=int, default=1, help="worker processes to start on this host (the queue is not shared across hosts)")
+    worker.add_argument('--workers', type=int, default=8, help="concurrent Bedrock requests per process")
+    worker.add_argument('--rps', type=float, default=5.0, help="maximum Bedrock requests per second per process")
+    worker.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS, help="time after which a silent worker's batch is reclaimed")
+    worker.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS, help="wait between checks of an empty queue")
+    worker.add_argument('--exit-when-empty', action='store_true', help="exit once no batch is left instead of waiting for more")
+    worker.add_argument('--rollups', default=DEFAULT_ROLLUP_PATH, help="rollup database to merge scores into (default: $SMART_REVIEW_ROLLUP_PATH)")
+    worker.add_argument('--no-rollups', dest='rollups', action='store_const', const=None, help="do not merge scores into the rollup database")
+
+    rollup = subparsers.add_parser('rollup', help="merge checkpointed job scores into the rollup database")
+    rollup.add_argument('job_ids', nargs='*', metavar='JOB_ID', help="jobs to merge (default: every job in --jobs-dir)")
+    rollup.add_argument('--jobs-dir', default=DEFAULT_JOBS_DIR, help="job checkpoint directory (default: $SMART_REVIEW_JOBS_DIR)")
+    rollup.add_argument('--rollups', default=DEFAULT_ROLLUP_PATH, help="rollup database (default: $SMART_REVIEW_ROLLUP_PATH)")
+
+    compact = subparsers.add_parser('compact', help="merge the deltas of an incremental export into one")
+    compact.add_argument('--bucket', default=os.getenv('AWS_S3_BUCKET'), help="S3 bucket of the export (default: $AWS_S3_BUCKET)")
+    compact.add_argument('--prefix', default=DEFAULT_INCREMENTAL_PREFIX, help=f"S3 prefix of the export (default: {DEFAULT_INCREMENTAL_PREFIX})")
+    compact.add_argument('--state-dir', default=DEFAULT_EXPORT_STATE_DIR, help="local cache of exported row hashes (default: $SMART_REVIEW_EXPORT_STATE_DIR)")
+    compact.add_argument('--workers', type=int, default=8, help="concurrent S3 uploads")
+    return parser
+
+
+def default_until():
+    """Start of the current hour, so reruns within the hour share a job ID and resume its checkpoints"""
+    return datetime.now().replace(minute=0, second=0, microsecond=0)
+
+
+def run_command(args):
+    until = args.until or default_until()
+    since = args.since or until - timedelta(days=1)
+
+    def report_error(conversation, error):
+        print(f"error scoring {conversation['conversation_id']}: {error}", file=sys.stderr)
+
+    result = run_pipeline(
+        args.bot,
+        since,
+        until,
+        bucket=args.bucket,
+        prefix=args.prefix,
+        export_format=args.export_format,
+        job_id=args.job_id,
+        force_rescore=args.force_rescore,
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        pack_token_budget=args.pack_token_budget,
+        input_token_budget=args.input_token_budget,
+        batch_size=args.batch_size,
+        on_error=report_error,
+        dedup_threshold=args.dedup,
+        cascade_models=args.cascade,
+        rollup_path=args.rollups,
+        incremental=args.incremental
+    )
+    print(result.report())
+    if args.metrics_file:
+        REGISTRY.write_textfile(args.metrics_file)
+    return 1 if result.failures else 0
+
+
+def submit_command(args):
+    until = args.until or default_until()
+    since = args.since or until - timedelta(days=1)
+    job_id = args.job_id or pipeline_job_id(args.bot, since, until)
+    queue = WorkQueue(args.queue)
+    try:
+        added = queue.submit(
+            job_id,
+            stream_conversations(args.bot, since, until, args.batch_size),
+            settings={'pack_token_budget': args.pack_token_budget, 'input_token_budget': args.input_token_budget},
+            batch_size=args.queue_batch_size
+        )
+        print(f"job {job_id}: queued {added:,} conversations")
+        print(format_progress(queue.progress(job_id)))
+    finally:
+        queue.close()
+    return 0
+
+
+def format_progress(progress):
+    return (f"{progress['scored']:,} of {progress['conversations']:,} conversations scored, "
+            f"{progress['failures']:,} failed; batches: {progress['done']:,} done, {progress['leased']:,} in progress, "
+            f"{progress['pending']:,} pending, {progress['failed']:,} failed")
+
+
+def worker_process(args):
+    """Body of one worker process"""
+    load_dotenv()
+    queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds)
+    cache = ScoreCache()
+    rollups = RollupStore(args.rollups) if args.rollups else None
+
+    def report_batch(lease, scored, failed):
+        print(f"{lease.job_id} batch {lease.batch_no}: {scored} scored, {failed} failed", flush=True)
+
+    try:
+        stats = run_worker(
+            queue,
+            get_bedrock_client(),
+            job_id=args.job_id,
+            max_workers=args.workers,
+            requests_per_second=args.rps,
+            cache=cache,
+            poll_seconds=args.poll_seconds,
+            exit_when_empty=args.exit_when_empty,
+            on_batch=report_batch,
+            rollups=rollups
+        )
+        print(f"worker done: {stats}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cache.close()
+        queue.close()
+        if rollups is not None:
+            rollups.close()
+
+
+def worker_command(args):
+    if args.processes <= 1:
+        worker_process(args)
+        return 0
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=worker_process, args=(args,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+    return 0 if all(process.exitcode == 0 for process in processes) else 1
+
+
+def rollup_command(args):
+    job_ids = args.job_ids
+    if not job_ids and os.path.isdir(args.jobs_dir):
+        job_ids = sorted(name[:-len('.jsonl')] for name in os.listdir(args.jobs_dir) if name.endswith('.jsonl'))
+    store = RollupStore(args.rollups)
+    try:
+        for job_id in job_ids:
+            job = ScoringJob(job_id, jobs_dir=args.jobs_dir)
+            merged = sum(store.merge(frame) for frame in job.iter_frames())
+            print(f"{job_id}: merged {merged:,} rows")
+        print(f"{len(store):,} conversations in {args.rollups}")
+    finally:
+        store.close()
+    return 0
+
+
+def compact_command(args):
+    if not args.bucket:
+        print("error: --bucket is required when $AWS_S3_BUCKET is not set", file=sys.stderr)
+        return 2
+    manifest = compact_export(get_s3_client(), args.bucket, args.prefix, args.state_dir, max_workers=args.workers)
+    print(f"s3://{args.bucket}/{args.prefix}: {manifest['rows']:,} rows in {len(manifest['deltas'])} delta(s), version {manifest['version']}")
+    return 0
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    if args.command == 'run':
+        return run_command(args)
+    if args.command == 'submit':
+        return submit_command(args)
+    if args.command == 'worker':
+        return worker_command(args)
+    if args.command == 'rollup':
+        return rollup_command(args)
+    if args.command == 'compact':
+        return compact_command(args)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
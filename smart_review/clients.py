@@ -0,0 +1,42 @@
+"""Clients for the AWS services Smart Review talks to.
+
+boto3 is imported on first use rather than with this module, so code that
+only passes clients around does not pay for loading it.
+"""
+import os
+
+# Connections each client keeps open; scoring and exports run this many requests at once at most
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.getenv('SMART_REVIEW_MAX_POOL_CONNECTIONS', '64'))
+
+
+def client_config(max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+    """botocore settings shared by every client.
+
+    The connection pool is sized for concurrent requests from many threads,
+    and TCP keep-alive keeps idle pooled connections from being dropped
+    between bursts, so requests reuse a warm TLS connection.
+    """
+    from botocore.config import Config
+    return Config(max_pool_connections=max_pool_connections, tcp_keepalive=True)
+
+
+def get_bedrock_client(max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+    """Initialize Amazon Bedrock runtime client"""
+    import boto3
+    return boto3.client(
+        service_name='bedrock-runtime',
+        region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        config=client_config(max_pool_connections)
+    )
+
+
+def get_s3_client(max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+    """Initialize AWS S3 client"""
+    import boto3
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+        region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        config=client_config(max_pool_connections)
+    )
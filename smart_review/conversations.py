@@ -0,0 +1,63 @@
+"""Assembly of transcript rows into conversations ready for scoring."""
+import numpy as np
+import pandas as pd
+
+
+def _sort_codes(values):
+    """Integer codes that order like values, for use as a lexsort key"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy().view('i8')
+    return pd.factorize(values, sort=True)[0]
+
+
+def build_conversations(df):
+    """Yield one record per conversation with the text to score.
+
+    Rows are ordered once by conversation and then by datetime and mid, so
+    turns are interleaved in the order they happened:
+
+        Bot: <bot_name>
+        User: <utterance>
+        Bot: <response>
+        ...
+
+    Each turn is rendered with vectorized string operations and each
+    conversation is joined from a contiguous slice of one NumPy array.
+    Conversations are yielded in order of first appearance in df.
+    """
+    if df.empty:
+        return
+
+    conversation_codes = pd.factorize(df['conversation_id'])[0]
+    order = np.lexsort((
+        _sort_codes(df['mid']),
+        _sort_codes(df['datetime']),
+        conversation_codes
+    ))
+    df = df[['conversation_id', 'bot_name', 'datetime', 'utterance', 'response']].take(order)
+    conversation_codes = conversation_codes[order]
+
+    turns = (
+        'User: ' + df['utterance'].fillna('').astype(str)
+        + '\nBot: ' + df['response'].fillna('').astype(str)
+    ).to_numpy(dtype=object)
+
+    # Start offset of each conversation within the sorted rows
+    starts = np.flatnonzero(np.r_[True, conversation_codes[1:] != conversation_codes[:-1]])
+    ends = np.r_[starts[1:], len(turns)]
+
+    first_rows = df.iloc[starts]
+    records = zip(
+        first_rows['conversation_id'].tolist(),
+        first_rows['bot_name'].tolist(),
+        first_rows['datetime'].tolist(),
+        starts.tolist(),
+        ends.tolist()
+    )
+    for conversation_id, bot_name, first_datetime, start, end in records:
+        yield {
+            'conversation_id': conversation_id,
+            'bot_name': bot_name,
+            'datetime': first_datetime,
+            'text': f"Bot: {bot_name}\n" + '\n'.join(turns[start:end])
+        }
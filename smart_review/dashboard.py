@@ -0,0 +1,91 @@
+"""Aggregates behind the Dashboard page, cheap to cache and to render."""
+import numpy as np
+import pandas as pd
+
+from smart_review.sampling import DEFAULT_CONFIDENCE, z_value
+from smart_review.scoring import SCORE_COLUMNS
+
+SCORE_VALUES = [1, 2, 3, 4, 5]
+
+# Candidate trend bucket widths, smallest first
+BUCKET_FREQUENCIES = ['1min', '5min', '15min', '30min', '1h', '3h', '6h', '12h', '1D', '7D', '30D']
+
+
+def score_value_counts(df):
+    """Count of each score value per metric, as a DataFrame indexed by value"""
+    return pd.DataFrame({
+        column: df[column].round().value_counts().reindex(SCORE_VALUES, fill_value=0)
+        for column in SCORE_COLUMNS
+    })
+
+
+def bucket_frequency(start, end, max_points):
+    """Smallest bucket width that keeps a time range within max_points"""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for frequency in BUCKET_FREQUENCIES:
+        if span / pd.Timedelta(frequency) <= max_points:
+            return frequency
+    return BUCKET_FREQUENCIES[-1]
+
+
+def score_trends(df, max_points=500):
+    """Mean score and conversation count per adaptive time bucket.
+
+    With at most max_points conversations the raw points are returned,
+    each with a count of one.
+    """
+    trends = df[['datetime', *SCORE_COLUMNS]].dropna(subset=['datetime']).sort_values('datetime')
+    if len(trends) <= max_points:
+        return trends.assign(count=1).reset_index(drop=True), None
+
+    frequency = bucket_frequency(trends['datetime'].iloc[0], trends['datetime'].iloc[-1], max_points)
+    grouped = trends.groupby(pd.Grouper(key='datetime', freq=frequency))
+    buckets = grouped[SCORE_COLUMNS].mean()
+    buckets['count'] = grouped.size()
+    return buckets[buckets['count'] > 0].reset_index(), frequency
+
+
+def interval_half_widths(variance, count, confidence=DEFAULT_CONFIDENCE, population=None):
+    """Vectorized smart_review.sampling.half_width over aligned Series or frames"""
+    correction = 1.0
+    if population:
+        correction = ((population - count) / max(population - 1, 1)).clip(lower=0)
+    widths = z_value(confidence) * np.sqrt(variance / count * correction)
+    return widths.where(count >= 2, np.inf)
+
+
+def score_intervals(scores, confidence=DEFAULT_CONFIDENCE, population=None):
+    """Mean, confidence interval and sample size of each score column.
+
+    population is the number of conversations the scores were sampled
+    from, if they are a sample; it narrows the intervals accordingly.
+    """
+    means = scores.mean()
+    widths = interval_half_widths(scores.var(), scores.count(), confidence, population)
+    return pd.DataFrame({
+        'mean': means,
+        'low': means - widths,
+        'high': means + widths,
+        'half_width': widths,
+        'samples': scores.count(),
+    }).rename_axis('metric')
+
+
+def compute_dashboard(df, max_points=500, confidence=DEFAULT_CONFIDENCE, population=None):
+    """All aggregates the Dashboard renders, computed in one pass over df"""
+    df = df.assign(datetime=pd.to_datetime(df['datetime']))
+    scores = df[SCORE_COLUMNS].astype(np.float64)
+    trends, frequency = score_trends(df, max_points)
+    by_bot = scores.groupby(df['bot_name'], observed=True)
+    return {
+        'total_conversations': len(df),
+        'unique_bots': df['bot_name'].nunique(),
+        'means': scores.mean(),
+        'intervals': score_intervals(scores, confidence, population),
+        'value_counts': score_value_counts(scores),
+        'correlation': scores.corr(),
+        'trends': trends,
+        'trend_frequency': frequency,
+        'bot_means': by_bot.mean(),
+        'bot_half_widths': interval_half_widths(by_bot.var(), by_bot.count(), confidence),
+    }
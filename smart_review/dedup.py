@@ -0,0 +1,153 @@
+"""Near-duplicate detection so repetitive conversations are scored once."""
+import hashlib
+import math
+import re
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+
+# 64 hash functions in 16 bands of 4 rows: pairs with Jaccard similarity
+# around 0.5 or more usually share a band and are compared
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+
+SHINGLE_SIZE = 3
+
+_DIGITS = re.compile(r'\d+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Lowercase, collapse whitespace and mask numbers, so trivial variants match"""
+    return _WHITESPACE.sub(' ', _DIGITS.sub('0', text.lower())).strip()
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """32-bit hashes of the distinct word size-grams of normalized text"""
+    words = text.split(' ')
+    if len(words) <= size:
+        shingles = {text}
+    else:
+        shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures from num_perm multiply-shift hash functions"""
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, seed=0):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        with np.errstate(over='ignore'):
+            permuted = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+@dataclass
+class DedupStats:
+    """How many conversations were folded into another one's score"""
+    conversations: int = 0
+    clusters: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def calls_saved(self):
+        """Conversations that did not need a request of their own"""
+        return self.exact_duplicates + self.near_duplicates
+
+    def __str__(self):
+        return (f"{self.conversations:,} conversations in {self.clusters:,} clusters, "
+                f"{self.calls_saved:,} scoring calls saved "
+                f"({self.exact_duplicates:,} exact, {self.near_duplicates:,} near duplicates)")
+
+
+class Deduplicator:
+    """Assign conversations to clusters of near-duplicates as they stream in.
+
+    An exact hash of the normalized text catches identical conversations
+    cheaply. Otherwise the MinHash signature is looked up in LSH bands and
+    compared with the representatives found there; the first one whose
+    estimated Jaccard similarity reaches threshold becomes the cluster. A
+    conversation that matches none starts a new cluster and represents it.
+    Only representatives are indexed, so every member is within threshold
+    of its own representative and clusters cannot chain.
+
+    Conversations are only clustered with others of the same bot.
+    """
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, seed=0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        self.stats = DedupStats()
+        # A candidate sharing k bands agrees on at most rows * k positions in
+        # those bands and rows - 1 in each other band, so candidates sharing
+        # fewer than min_bands bands cannot reach the threshold
+        needed = math.ceil(threshold * num_perm)
+        self.min_bands = max(1, needed - (self.rows - 1) * bands)
+        self._exact = {}
+        self._buckets = {}
+        self._ids = []
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+
+    def assign(self, conversation):
+        """Return (cluster_id, is_representative) for a conversation.
+
+        cluster_id is the conversation_id of the cluster's representative.
+        """
+        self.stats.conversations += 1
+        conversation_id = str(conversation['conversation_id'])
+        bot_name = str(conversation.get('bot_name'))
+        text = normalize_text(conversation['text'])
+
+        exact_key = (bot_name, hashlib.sha1(text.encode('utf-8')).digest())
+        cluster_id = self._exact.get(exact_key)
+        if cluster_id is not None:
+            self.stats.exact_duplicates += 1
+            return cluster_id, False
+
+        signature = self.hasher.signature(shingle_hashes(text))
+        band_keys = [
+            (bot_name, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+        match = self._best_match(signature, band_keys)
+        if match is not None:
+            self._exact[exact_key] = match
+            self.stats.near_duplicates += 1
+            return match, False
+
+        index = len(self._ids)
+        if index == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[index] = signature
+        self._ids.append(conversation_id)
+        self._exact[exact_key] = conversation_id
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(index)
+        self.stats.clusters += 1
+        return conversation_id, True
+
+    def _best_match(self, signature, band_keys):
+        """ID of the earliest representative within threshold, or None"""
+        buckets = [self._buckets[key] for key in band_keys if key in self._buckets]
+        if not buckets:
+            return None
+        candidates, shared_bands = np.unique(np.concatenate(buckets), return_counts=True)
+        candidates = candidates[shared_bands >= self.min_bands]
+        if not len(candidates):
+            return None
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        matches = candidates[similarity >= self.threshold]
+        return self._ids[matches[0]] if len(matches) else None
@@ -0,0 +1,270 @@
+"""Export of scores to S3, as one JSON file or as partitioned datasets."""
+import gzip
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from smart_review.metrics import REGISTRY
+
+# S3 requires every part except the last to be at least 5 MiB
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    'parquet': {'extension': 'parquet', 'content_type': 'application/vnd.apache.parquet'},
+    'ndjson.gz': {'extension': 'ndjson.gz', 'content_type': 'application/x-ndjson'},
+}
+
+MANIFEST_NAME = '_manifest.json'
+
+NDJSON_ROWS_PER_WRITE = 10_000
+
+# delete_objects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def export_to_s3(s3, data, bucket_name, file_name):
+    """Export data to S3 as a single JSON document"""
+    json_data = data.to_json(orient='records', date_format='iso')
+    put_object(s3, bucket_name, file_name, json_data, 'application/json')
+
+
+def put_object(s3, bucket, key, body, content_type):
+    """Upload a small object in one request, recording its latency and size"""
+    with REGISTRY.timed_call('s3', 'put_object'):
+        s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type)
+    REGISTRY.inc('bytes', len(body.encode('utf-8') if isinstance(body, str) else body), service='s3')
+
+
+def get_object(s3, bucket, key):
+    """Body of an object as bytes, or None when it does not exist"""
+    from botocore.exceptions import ClientError
+    try:
+        with REGISTRY.timed_call('s3', 'get_object'):
+            response = s3.get_object(Bucket=bucket, Key=key)
+            body = response['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    REGISTRY.inc('bytes', len(body), service='s3')
+    return body
+
+
+def list_keys(s3, bucket, prefix):
+    """Keys of every object whose key starts with prefix"""
+    keys = []
+    request = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        with REGISTRY.timed_call('s3', 'list_objects_v2'):
+            response = s3.list_objects_v2(**request)
+        keys.extend(entry['Key'] for entry in response.get('Contents', []))
+        if not response.get('IsTruncated'):
+            return keys
+        request['ContinuationToken'] = response['NextContinuationToken']
+
+
+def delete_objects(s3, bucket, keys):
+    """Delete objects in batches, raising if any of them could not be deleted"""
+    keys = list(keys)
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        with REGISTRY.timed_call('s3', 'delete_objects'):
+            response = s3.delete_objects(
+                Bucket=bucket, Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        if response.get('Errors'):
+            error = response['Errors'][0]
+            raise RuntimeError(f"Could not delete s3://{bucket}/{error['Key']}: {error.get('Message', error.get('Code'))}")
+
+
+class MultipartWriter(io.RawIOBase):
+    """Writable file object that streams to S3 with a multipart upload.
+
+    Parts of part_size bytes are uploaded on the shared executor as soon as
+    they fill, with at most max_pending parts buffered in memory. Objects
+    smaller than one part are sent with a single put_object instead.
+    """
+
+    def __init__(self, s3, bucket, key, executor, content_type, part_size=DEFAULT_PART_SIZE, max_pending=4):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.executor = executor
+        self.content_type = content_type
+        self.part_size = part_size
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._slots = threading.Semaphore(max_pending)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _submit_part(self, body):
+        if self._upload_id is None:
+            with REGISTRY.timed_call('s3', 'create_multipart_upload'):
+                response = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        self._slots.acquire()
+        future = self.executor.submit(self._upload_part, part_number, body)
+        self._parts.append(future)
+
+    def _upload_part(self, part_number, body):
+        try:
+            with REGISTRY.timed_call('s3', 'upload_part'):
+                response = self.s3.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+            REGISTRY.inc('bytes', len(body), service='s3')
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                put_object(self.s3, self.bucket, self.key, bytes(self._buffer), self.content_type)
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._parts]
+                with REGISTRY.timed_call('s3', 'complete_multipart_upload'):
+                    self.s3.complete_multipart_upload(
+                        Bucket=self.bucket,
+                        Key=self.key,
+                        UploadId=self._upload_id,
+                        MultipartUpload={'Parts': parts}
+                    )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def abort(self):
+        """Abandon the multipart upload so S3 discards its parts"""
+        if self._upload_id is not None:
+            for future in self._parts:
+                future.cancel()
+            with REGISTRY.timed_call('s3', 'abort_multipart_upload'):
+                self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+
+
+def iter_partitions(df):
+    """Yield (bot_name, date, frame) for each bot and calendar day"""
+    dates = pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d')
+    for (bot_name, date), frame in df.groupby([df['bot_name'], dates], observed=True, sort=True):
+        yield bot_name, date, frame
+
+
+def partition_key(prefix, bot_name, date, export_format, part=0):
+    """Hive-style object key, so Athena can prune by bot_name and date"""
+    extension = EXPORT_FORMATS[export_format]['extension']
+    return f"{prefix.rstrip('/')}/bot_name={bot_name}/date={date}/part-{part:05d}.{extension}"
+
+
+def write_partition(frame, sink, export_format):
+    """Serialize one partition into a writable binary sink"""
+    frame = frame.drop(columns=['bot_name'])
+    if export_format == 'parquet':
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pq.ParquetWriter(sink, table.schema, compression='zstd') as writer:
+            writer.write_table(table)
+    else:
+        with gzip.GzipFile(fileobj=sink, mode='wb') as gz:
+            for start in range(0, len(frame), NDJSON_ROWS_PER_WRITE):
+                chunk = frame.iloc[start:start + NDJSON_ROWS_PER_WRITE]
+                gz.write(chunk.to_json(orient='records', lines=True, date_format='iso').encode('utf-8'))
+                gz.write(b'\n')
+
+
+def read_partition(body, export_format):
+    """Rows of a part file written by write_partition, without bot_name"""
+    if export_format == 'parquet':
+        return pq.read_table(io.BytesIO(body)).to_pandas()
+    frame = pd.read_json(io.BytesIO(gzip.decompress(body)), lines=True, dtype={'conversation_id': str})
+    frame['datetime'] = pd.to_datetime(frame['datetime'], format='ISO8601')
+    return frame
+
+
+def upload_partitions(s3, frames, bucket, prefix, export_format='parquet', max_workers=8,
+                      part_size=DEFAULT_PART_SIZE):
+    """Upload scores partitioned by bot_name and date; returns the partitions.
+
+    frames is a DataFrame or an iterable of DataFrame chunks; every chunk
+    adds one part file to each partition it touches, so callers can export
+    more rows than fit in memory. Each part is streamed to S3 through a
+    multipart upload whose parts are uploaded in parallel, so only a few
+    parts are held in memory at any time.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    partitions = []
+    part_numbers = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for bot_name, date, frame in (partition for df in frames for partition in iter_partitions(df)):
+            part = part_numbers.get((bot_name, date), 0)
+            part_numbers[(bot_name, date)] = part + 1
+            key = partition_key(prefix, bot_name, date, export_format, part)
+            writer = MultipartWriter(
+                s3, bucket, key, executor,
+                content_type=EXPORT_FORMATS[export_format]['content_type'],
+                part_size=part_size,
+                max_pending=max_workers * 2
+            )
+            try:
+                write_partition(frame, writer, export_format)
+            except Exception:
+                writer.abort()
+                raise
+            writer.close()
+            partitions.append({
+                'key': key,
+                'bot_name': bot_name,
+                'date': date,
+                'rows': len(frame),
+                'bytes': writer.bytes_written
+            })
+    return partitions
+
+
+def export_partitioned(s3, frames, bucket, prefix, export_format='parquet', max_workers=8,
+                       part_size=DEFAULT_PART_SIZE):
+    """Export scores partitioned by bot_name and date, plus a manifest.
+
+    See upload_partitions for frames. Returns the manifest, which is also
+    written to <prefix>/_manifest.json.
+    """
+    partitions = upload_partitions(s3, frames, bucket, prefix, export_format, max_workers, part_size)
+    manifest = {
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+        'format': export_format,
+        'rows': sum(partition['rows'] for partition in partitions),
+        'partitions': partitions
+    }
+    put_object(s3, bucket, f"{prefix.rstrip('/')}/{MANIFEST_NAME}", json.dumps(manifest, indent=2), 'application/json')
+    return manifest
@@ -0,0 +1,95 @@
+"""Compact in-memory representation of the transcripts and scores frames."""
+import hashlib
+
+import pandas as pd
+
+from smart_review.scoring import SCORE_COLUMNS, TOKEN_COLUMNS
+
+ARROW_STRING = 'string[pyarrow]'
+
+# Identifiers repeated across rows are stored once per distinct value
+CATEGORICAL_COLUMNS = ['bot_name', 'conversation_id', 'cluster_id', 'model_id']
+
+# Free text is stored in Arrow buffers instead of one Python object per cell
+TEXT_COLUMNS = ['mid', 'utterance', 'response', 'summary']
+
+
+def _compact_integers(values, dtype, nullable_dtype):
+    """Downcast whole-number values, using a nullable dtype only when needed"""
+    values = pd.to_numeric(values)
+    if values.isna().any():
+        return values.astype(nullable_dtype)
+    return values.astype(dtype)
+
+
+def compact_frame(df):
+    """Return a copy of df using the smallest dtypes that hold its values.
+
+    bot_name and conversation_id become categoricals, free text becomes
+    Arrow-backed strings, datetime becomes datetime64 and scores become
+    int8 (Int8 when some are missing). Token counts become int32. Columns
+    that are absent are skipped and other columns are left as they are.
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column in CATEGORICAL_COLUMNS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(str).astype('category')
+        elif column in TEXT_COLUMNS:
+            values = values.astype(ARROW_STRING)
+        elif column == 'datetime':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values, format='ISO8601')
+        elif column in SCORE_COLUMNS:
+            values = _compact_integers(values, 'int8', 'Int8')
+        elif column in TOKEN_COLUMNS:
+            values = _compact_integers(values, 'int32', 'Int32')
+        columns[column] = values
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+
+def _hashable(values):
+    """values with categorical, string and numeric dtypes reduced to one per kind"""
+    if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values):
+        return values.astype(object)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype('float64')
+    return values
+
+
+def content_hash(df):
+    """SHA-256 of a frame's column names and values.
+
+    Categorical, string and numeric columns hash by value rather than by
+    storage dtype, so a frame and its compact_frame copy hash the same.
+    """
+    digest = hashlib.sha256('\0'.join(map(str, df.columns)).encode('utf-8'))
+    for column in df.columns:
+        digest.update(pd.util.hash_pandas_object(_hashable(df[column]), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """64-bit hash of each row's values, independent of column order and dtypes like content_hash"""
+    columns = sorted(df.columns)
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({column: _hashable(df[column]) for column in columns}), index=False
+    ).to_numpy()
+
+
+def memory_bytes(df):
+    """Bytes held by a frame, including the contents of its strings"""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def format_bytes(size):
+    """Human-readable size, e.g. 12.3 MB"""
+    if size < 1024:
+        return f"{size} B"
+    for unit in ['KB', 'MB', 'GB']:
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
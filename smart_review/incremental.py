@@ -0,0 +1,300 @@
+"""Incremental S3 exports that upload only new or changed score rows."""
+import hashlib
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from smart_review.export import (
+    DEFAULT_PART_SIZE,
+    MANIFEST_NAME,
+    delete_objects,
+    get_object,
+    list_keys,
+    put_object,
+    read_partition,
+    upload_partitions,
+)
+from smart_review.frames import row_hashes
+
+DEFAULT_EXPORT_STATE_DIR = os.getenv('SMART_REVIEW_EXPORT_STATE_DIR', os.path.join('.smart_review', 'exports'))
+
+# Incremental exports accumulate across runs, so they share one prefix by default
+DEFAULT_INCREMENTAL_PREFIX = 'conversation_scores/incremental'
+
+CONTENT_COLUMNS = ['conversation_id', 'content_hash', 'delta']
+
+
+def delta_prefix(prefix, version):
+    """Prefix of one delta's partitions; delta=N is a Hive column readers can order by"""
+    return f"{prefix}/delta={version:06d}"
+
+
+def clear_delta(s3, bucket, prefix, version):
+    """Delete whatever an uncommitted upload left under a delta's prefix"""
+    delete_objects(s3, bucket, list_keys(s3, bucket, delta_prefix(prefix, version) + '/'))
+
+
+def content_key(prefix, version):
+    """Key of the content manifest of the rows one delta added or replaced"""
+    return f"{prefix}/_content/delta={version:06d}.parquet"
+
+
+def _empty_content():
+    return pd.DataFrame({
+        'conversation_id': pd.Series(dtype=object),
+        'content_hash': pd.Series(dtype='uint64'),
+        'delta': pd.Series(dtype='int64'),
+    })
+
+
+def _merge_content(content, newer):
+    """content with the rows of newer added or replacing those of the same conversation"""
+    if newer.empty:
+        return content
+    kept = content[~content['conversation_id'].isin(newer['conversation_id'])]
+    return pd.concat([kept, newer[CONTENT_COLUMNS]], ignore_index=True)
+
+
+def _parquet_bytes(frame):
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False, compression='zstd')
+    return buffer.getvalue()
+
+
+@dataclass
+class IncrementalExport:
+    """Outcome of one incremental export"""
+    manifest: dict
+    uploaded: int = 0
+    unchanged: int = 0
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    def __str__(self):
+        if not self.uploaded:
+            return f"nothing new: all {self.unchanged:,} rows were already exported"
+        return (f"delta {self.version}: uploaded {self.uploaded:,} new or changed rows, "
+                f"skipped {self.unchanged:,} unchanged")
+
+
+class ExportState:
+    """What an incremental export prefix holds, as recorded in S3.
+
+    <prefix>/_manifest.json lists the deltas written so far, each with its
+    partitions under <prefix>/delta=NNNNNN/ and a content manifest of the
+    conversation IDs and row hashes it added. Merged in delta order, the
+    content manifests give the current hash and delta of every exported
+    conversation. The merged content is cached under state_dir, so an
+    export only downloads the content manifests of deltas it has not seen.
+
+    Writing _manifest.json is the commit point of an export. An export
+    that fails before writing it deletes the partitions it uploaded, and
+    every export first clears its delta's prefix of anything left by one
+    that crashed, so readers listing the prefix do not see rows twice.
+    """
+
+    def __init__(self, s3, bucket, prefix, state_dir=DEFAULT_EXPORT_STATE_DIR):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+        self.state_dir = state_dir
+        digest = hashlib.sha256(f"{bucket}/{self.prefix}".encode('utf-8')).hexdigest()[:16]
+        self._cache_path = os.path.join(state_dir, f"{digest}.parquet")
+        self.manifest = None
+        self.content = None
+
+    @property
+    def manifest_key(self):
+        return f"{self.prefix}/{MANIFEST_NAME}"
+
+    def load(self):
+        """Read the manifest and bring the cached content up to its version"""
+        body = get_object(self.s3, self.bucket, self.manifest_key)
+        self.manifest = json.loads(body) if body is not None else {'version': 0, 'rows': 0, 'deltas': []}
+        if 'deltas' not in self.manifest:
+            raise ValueError(
+                f"s3://{self.bucket}/{self.prefix} holds a full export, not an incremental one; choose another prefix"
+            )
+
+        content, cached_version = _empty_content(), 0
+        if os.path.exists(self._cache_path):
+            cached = pd.read_parquet(self._cache_path)
+            cached_version = int(cached['delta'].max()) if len(cached) else 0
+            cached_deltas = {delta['version'] for delta in self.manifest['deltas']}
+            # A cache from before a compaction, or of another bucket's history, is rebuilt
+            if cached_version <= self.manifest['version'] and set(cached['delta'].unique()) <= cached_deltas:
+                content = cached
+            else:
+                cached_version = 0
+        for delta in self.manifest['deltas']:
+            if delta['version'] > cached_version:
+                newer = pd.read_parquet(io.BytesIO(get_object(self.s3, self.bucket, delta['content'])))
+                content = _merge_content(content, newer.assign(delta=delta['version']))
+        self.content = content.reset_index(drop=True)
+        self._save_cache()
+        return self
+
+    def _save_cache(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.content.to_parquet(self._cache_path + '.tmp', index=False)
+        os.replace(self._cache_path + '.tmp', self._cache_path)
+
+    def changed(self, df):
+        """Rows of df whose conversation is new or whose content differs, with their hashes"""
+        df = df.drop_duplicates('conversation_id', keep='last')
+        hashes = pd.DataFrame({
+            'conversation_id': df['conversation_id'].astype(str).to_numpy(),
+            'content_hash': row_hashes(df),
+        })
+        known = hashes.merge(
+            self.content[['conversation_id', 'content_hash']], on=['conversation_id', 'content_hash'],
+            how='left', indicator=True
+        )['_merge'].to_numpy() == 'both'
+        return df[~known], hashes[~known]
+
+    def commit(self, version, export_format, partitions, content, rows, compacted=False):
+        """Upload a delta's content manifest and record it in _manifest.json"""
+        key = content_key(self.prefix, version)
+        put_object(self.s3, self.bucket, key, _parquet_bytes(content[['conversation_id', 'content_hash']]),
+                   'application/vnd.apache.parquet')
+        delta = {
+            'version': version,
+            'exported_at': datetime.now(timezone.utc).isoformat(),
+            'rows': rows,
+            'content': key,
+            'partitions': partitions,
+        }
+        if compacted:
+            delta['compacted'] = True
+        merged = content.assign(delta=version)
+        merged = (merged if compacted else _merge_content(self.content, merged)).reset_index(drop=True)
+        manifest = {
+            'format': export_format,
+            'version': version,
+            'rows': len(merged),
+            'deltas': [delta] if compacted else [*self.manifest['deltas'], delta],
+        }
+        put_object(self.s3, self.bucket, self.manifest_key, json.dumps(manifest, indent=2), 'application/json')
+        # Only a written manifest advances the state, so a failed commit can be cleaned up
+        self.manifest, self.content = manifest, merged
+        self._save_cache()
+
+
+def publish_delta(state, version, upload):
+    """Run upload, which writes and commits delta version, leaving nothing behind if it fails.
+
+    Anything under the delta's prefix is deleted first, as only an export
+    that crashed before committing can have left it there.
+    """
+    clear_delta(state.s3, state.bucket, state.prefix, version)
+    try:
+        upload()
+    except Exception:
+        if state.manifest['version'] < version:
+            clear_delta(state.s3, state.bucket, state.prefix, version)
+        raise
+
+
+def export_incremental(s3, frames, bucket, prefix, export_format='parquet', state_dir=DEFAULT_EXPORT_STATE_DIR,
+                       max_workers=8, part_size=DEFAULT_PART_SIZE):
+    """Export only the score rows that are new or changed since the last export.
+
+    frames is a DataFrame or an iterable of DataFrame chunks. The rows
+    whose conversation was not exported before, or whose content hash
+    differs from what was exported, are uploaded as a new delta under
+    <prefix>/delta=NNNNNN/, partitioned by bot and date like
+    export_partitioned. A conversation's current row is the one in the
+    highest delta that holds it. Exporting the same scores again uploads
+    nothing, and rows missing from frames are left as they are. A
+    conversation that appears in several chunks is exported once, from
+    the first chunk that holds it, since that row may already be uploaded
+    when a later chunk is read.
+    """
+    state = ExportState(s3, bucket, prefix, state_dir).load()
+    existing_format = state.manifest.get('format')
+    if existing_format is not None and existing_format != export_format:
+        raise ValueError(f"s3://{bucket}/{state.prefix} holds {existing_format} files, not {export_format}")
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+
+    version = state.manifest['version'] + 1
+    result = IncrementalExport(state.manifest)
+    hashes = []
+    emitted = set()
+
+    def deltas():
+        for df in frames:
+            changed, changed_hashes = state.changed(df)
+            repeated = changed_hashes['conversation_id'].isin(emitted).to_numpy()
+            changed, changed_hashes = changed[~repeated], changed_hashes[~repeated]
+            emitted.update(changed_hashes['conversation_id'])
+            result.unchanged += len(df) - len(changed)
+            result.uploaded += len(changed)
+            hashes.append(changed_hashes)
+            if len(changed):
+                yield changed
+
+    def upload():
+        partitions = upload_partitions(
+            s3, deltas(), bucket, delta_prefix(state.prefix, version), export_format, max_workers, part_size
+        )
+        if result.uploaded:
+            state.commit(version, export_format, partitions, pd.concat(hashes, ignore_index=True), result.uploaded)
+
+    publish_delta(state, version, upload)
+    result.manifest = state.manifest
+    return result
+
+
+def compact_export(s3, bucket, prefix, state_dir=DEFAULT_EXPORT_STATE_DIR, max_workers=8,
+                   part_size=DEFAULT_PART_SIZE):
+    """Merge every delta of an incremental export into one.
+
+    Each bot and date partition is read from all deltas, only the current
+    row of every conversation is kept, and the result is written as a new
+    delta that replaces the others in the manifest. The old deltas are
+    deleted once the manifest is written. Returns the new manifest, or the
+    current one when there is nothing to compact.
+    """
+    state = ExportState(s3, bucket, prefix, state_dir).load()
+    if len(state.manifest['deltas']) <= 1:
+        return state.manifest
+    export_format = state.manifest['format']
+    current = pd.MultiIndex.from_frame(state.content[['conversation_id', 'delta']].astype({'delta': 'int64'}))
+
+    by_partition = {}
+    for delta in state.manifest['deltas']:
+        for partition in delta['partitions']:
+            by_partition.setdefault((partition['bot_name'], partition['date']), []).append((delta['version'], partition))
+
+    def partitions():
+        for (bot_name, date), parts in sorted(by_partition.items()):
+            frames = []
+            for version, partition in parts:
+                frame = read_partition(get_object(s3, bucket, partition['key']), export_format)
+                frame = frame.assign(conversation_id=frame['conversation_id'].astype(str))
+                keep = pd.MultiIndex.from_arrays([frame['conversation_id'], [version] * len(frame)]).isin(current)
+                frames.append(frame[keep])
+            merged = pd.concat(frames, ignore_index=True)
+            if len(merged):
+                merged.insert(1, 'bot_name', bot_name)
+                yield merged
+
+    version = state.manifest['version'] + 1
+    old_keys = [partition['key'] for delta in state.manifest['deltas'] for partition in delta['partitions']]
+    old_keys += [delta['content'] for delta in state.manifest['deltas']]
+
+    def upload():
+        written = upload_partitions(s3, partitions(), bucket, delta_prefix(state.prefix, version), export_format,
+                                    max_workers, part_size)
+        state.commit(version, export_format, written, state.content, len(state.content), compacted=True)
+
+    publish_delta(state, version, upload)
+    delete_objects(s3, bucket, old_keys)
+    return state.manifest
@@ -0,0 +1,116 @@
+"""Checkpointed, resumable scoring jobs."""
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_JOBS_DIR = os.getenv('SMART_REVIEW_JOBS_DIR', os.path.join('.smart_review', 'jobs'))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def rows_to_frame(rows):
+    """Score rows decoded from JSON as a scores DataFrame"""
+    df = pd.DataFrame(rows)
+    df['datetime'] = pd.to_datetime(df['datetime'], format='ISO8601')
+    return df
+
+
+def job_id_for(transcripts_df):
+    """Deterministic job ID for a set of transcripts.
+
+    Loading the same transcripts again yields the same ID, so a job
+    interrupted by a rerun or restart is picked up where it stopped.
+    """
+    conversation_ids = pd.Series(transcripts_df['conversation_id'].astype(str).unique())
+    digest = hashlib.sha256(pd.util.hash_pandas_object(conversation_ids.sort_values(), index=False).to_numpy().tobytes())
+    return f"job-{digest.hexdigest()[:16]}"
+
+
+class ScoringJob:
+    """A scoring run whose finished results are checkpointed to disk.
+
+    Every scored row is appended to <jobs_dir>/<job_id>.jsonl as soon as it
+    completes. Reopening a job with the same ID skips conversations that are
+    already in the checkpoint.
+    """
+
+    def __init__(self, job_id, jobs_dir=DEFAULT_JOBS_DIR):
+        self.job_id = job_id
+        self.path = os.path.join(jobs_dir, f"{job_id}.jsonl")
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._file = None
+
+    def _iter_rows(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def rows(self):
+        """All rows recorded so far, ignoring a torn final line"""
+        return list(self._iter_rows())
+
+    def completed_ids(self):
+        """IDs of conversations already scored by this job"""
+        return {str(row['conversation_id']) for row in self._iter_rows()}
+
+    def pending(self, conversations):
+        """Filter out conversations that are already checkpointed"""
+        done = self.completed_ids()
+        return (conversation for conversation in conversations if str(conversation['conversation_id']) not in done)
+
+    def record(self, row):
+        """Append a finished score row to the checkpoint"""
+        if self._file is None:
+            self._file = open(self.path, 'ab+')
+            # Terminate a line torn by a crash so it cannot swallow this row
+            if self._file.seek(0, os.SEEK_END) > 0:
+                self._file.seek(-1, os.SEEK_END)
+                if self._file.read(1) != b'\n':
+                    self._file.write(b'\n')
+        self._file.write((json.dumps(row, default=_json_default) + '\n').encode('utf-8'))
+        self._file.flush()
+
+    def reset(self):
+        """Discard the checkpoint so the job starts from scratch"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def to_frame(self):
+        """Checkpointed rows as a scores DataFrame, one row per conversation"""
+        rows = self.rows()
+        if not rows:
+            return None
+        df = rows_to_frame(rows).drop_duplicates('conversation_id', keep='last')
+        return df.reset_index(drop=True)
+
+    def iter_frames(self, chunk_size=50_000):
+        """Checkpointed rows as a sequence of DataFrames of at most chunk_size rows"""
+        rows = []
+        for row in self._iter_rows():
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield rows_to_frame(rows)
+                rows = []
+        if rows:
+            yield rows_to_frame(rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,216 @@
+"""Process-wide call metrics, exposed in the Prometheus text format."""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from fast S3 parts to slow map-reduce scoring
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile from the buckets, as histogram_quantile does"""
+        series = self.values.get(_label_key(labels))
+        if not series or not series['count']:
+            return None
+        rank = q * series['count']
+        cumulative = 0
+        lower = 0.0
+        for upper, count in zip(self.buckets + (float('inf'),), series['buckets']):
+            if count and cumulative + count >= rank:
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return lower
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.values.items()):
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float('inf'),), series['buckets']):
+                cumulative += count
+                le = '+Inf' if upper == float('inf') else repr(upper)
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Thread-safe set of counters and histograms for external calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.call_seconds = Histogram('smart_review_call_duration_seconds', "Latency of calls to Bedrock, Snowflake and S3.")
+        self.calls = Counter('smart_review_calls_total', "Calls to Bedrock, Snowflake and S3 by outcome.")
+        self.tokens = Counter('smart_review_tokens_total', "LLM tokens by model, bot and direction.")
+        self.throttles = Counter('smart_review_throttles_total', "Throttled calls.")
+        self.retries = Counter('smart_review_retries_total', "Retried calls.")
+        self.parse_failures = Counter('smart_review_parse_failures_total', "Model replies that were not valid analysis JSON.")
+        self.repairs = Counter('smart_review_repairs_total', "Unparseable replies sent to the repair model, by outcome.")
+        self.escalations = Counter('smart_review_cascade_escalations_total', "Conversations passed to the next model of a cascade.")
+        self.rows = Counter('smart_review_rows_total', "Rows read from Snowflake.")
+        self.bytes = Counter('smart_review_bytes_total', "Bytes sent to S3.")
+        self.page_seconds = Histogram('smart_review_page_duration_seconds', "Wall time of app script runs by page and phase.")
+
+    def _labels(self, labels):
+        return {**getattr(self._local, 'labels', {}), **labels}
+
+    @contextmanager
+    def context(self, **labels):
+        """Attach labels (such as bot) to every metric recorded in this thread"""
+        previous = getattr(self._local, 'labels', {})
+        self._local.labels = {**previous, **labels}
+        try:
+            yield
+        finally:
+            self._local.labels = previous
+
+    @contextmanager
+    def timed_call(self, service, operation, **labels):
+        """Record the latency and outcome of one external call"""
+        labels = self._labels({'service': service, 'operation': operation, **labels})
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.call_seconds.observe(elapsed, **labels)
+                self.calls.inc(status=status, **labels)
+
+    def inc(self, counter, amount=1, **labels):
+        with self._lock:
+            getattr(self, counter).inc(amount, **self._labels(labels))
+
+    def observe(self, histogram, value, **labels):
+        with self._lock:
+            getattr(self, histogram).observe(value, **self._labels(labels))
+
+    def metrics(self):
+        return [self.call_seconds, self.calls, self.tokens, self.throttles, self.retries,
+                self.parse_failures, self.repairs, self.escalations, self.rows, self.bytes, self.page_seconds]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = []
+            for metric in self.metrics():
+                lines.extend(metric.render())
+            return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomically write the metrics for a node_exporter textfile collector"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+    def snapshot(self):
+        """Copy of the raw series, for display"""
+        with self._lock:
+            return {
+                metric.name: {key: (dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value)
+                              for key, value in metric.values.items()}
+                for metric in self.metrics()
+            }
+
+    def reset(self):
+        with self._lock:
+            for metric in self.metrics():
+                metric.values.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port, registry=REGISTRY):
+    """Serve /metrics over HTTP from a daemon thread; safe to call repeatedly"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _server = ThreadingHTTPServer(('', port), Handler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def serve_from_env(registry=REGISTRY):
+    """Start the /metrics server when SMART_REVIEW_METRICS_PORT is set"""
+    port = os.getenv('SMART_REVIEW_METRICS_PORT')
+    if port:
+        return serve(int(port), registry)
+    return None
@@ -0,0 +1,273 @@
+"""Headless fetch → score → export pipeline shared by the CLI and the pages."""
+import hashlib
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from functools import partial
+
+from smart_review.cache import ScoreCache
+from smart_review.cascade import ModelCascade
+from smart_review.clients import get_bedrock_client, get_s3_client
+from smart_review.dedup import Deduplicator
+from smart_review.export import export_partitioned
+from smart_review.incremental import DEFAULT_INCREMENTAL_PREFIX, export_incremental
+from smart_review.jobs import ScoringJob
+from smart_review.rollups import RollupStore, RollupWriter
+from smart_review.scoring import (
+    DEFAULT_INPUT_TOKEN_BUDGET,
+    MODEL_ID,
+    analyze_conversation,
+    duplicate_row,
+    score_conversations,
+    score_row,
+)
+from smart_review.transcripts import DEFAULT_BATCH_SIZE, stream_conversations
+
+
+@dataclass
+class StageStats:
+    """Wall time and volume of one pipeline stage"""
+    name: str
+    seconds: float = 0.0
+    items: int = 0
+    bytes: int = 0
+
+    @property
+    def throughput(self):
+        return self.items / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        line = f"{self.name:<7} {self.seconds:10.2f}s {self.items:>12,} items {self.throughput:>12,.1f}/s"
+        if self.bytes:
+            line += f" {self.bytes:>14,} bytes"
+        return line
+
+
+@dataclass
+class PipelineResult:
+    job_id: str
+    stages: dict
+    failures: int = 0
+    cache_stats: dict = field(default_factory=dict)
+    manifest: dict = None
+    dedup_stats: object = None
+    cascade_stats: object = None
+
+    def report(self):
+        """Per-stage wall time and throughput, one line per stage"""
+        lines = [f"job {self.job_id}"]
+        lines.extend(str(stage) for stage in self.stages.values())
+        lines.append(f"failed  {self.failures:,} conversations")
+        if self.cache_stats:
+            lines.append(f"cache   {self.cache_stats['hits']:,} hits, {self.cache_stats['misses']:,} misses")
+        if self.dedup_stats is not None:
+            lines.append(f"dedup   {self.dedup_stats}")
+        if self.cascade_stats is not None:
+            lines.extend(f"cascade {line}" for line in str(self.cascade_stats).splitlines())
+        return '\n'.join(lines)
+
+
+def timed(iterable, stats):
+    """Yield from iterable, charging the time spent producing items to stats"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stats.seconds += time.perf_counter() - start
+            return
+        stats.seconds += time.perf_counter() - start
+        stats.items += 1
+        yield item
+
+
+def pipeline_job_id(bot_name, since, until):
+    """Deterministic job ID for a bot and time range"""
+    digest = hashlib.sha256(f"{bot_name}|{since}|{until}".encode('utf-8')).hexdigest()
+    return f"job-{digest[:16]}"
+
+
+def score_records(bedrock, records, job, cache=None, refresh=False, max_workers=8, requests_per_second=5.0,
+                  pack_token_budget=None, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET, dedup=None, cascade=None, rollups=None):
+    """Score conversation records, checkpointing every result into job.
+
+    Conversations already in the job's checkpoint are skipped. Yields
+    (conversation, row, error) as each conversation finishes; row is the
+    recorded score row, and exactly one of row and error is None.
+
+    With dedup (a smart_review.dedup.Deduplicator), only the representative
+    of each cluster of near-duplicates is sent to Bedrock. The other members
+    get a copy of its scores as soon as it finishes, or its error if it
+    fails, and every row carries a cluster_id.
+
+    With cascade (a smart_review.cascade.ModelCascade), conversations are
+    scored by its tiers instead of the default model, its own
+    input_token_budget applies and every row carries the model_id that
+    scored it. Packing is not used with a cascade, as a packed response
+    has no per-conversation confidence to escalate on.
+
+    With rollups (a smart_review.rollups.RollupStore), recorded rows are
+    also merged into its aggregates, in batches and once more when the
+    generator is closed.
+    """
+    writer = RollupWriter(rollups) if rollups is not None else None
+
+    def record(row):
+        job.record(row)
+        if writer is not None:
+            writer.add(row)
+
+    representative_rows = {}
+    waiting = defaultdict(list)
+    copied = deque()
+
+    def copy_result(conversation, result):
+        if isinstance(result, Exception):
+            copied.append((conversation, None, result))
+        else:
+            row = duplicate_row(conversation, result)
+            record(row)
+            copied.append((conversation, row, None))
+
+    def representatives(conversations):
+        for conversation in conversations:
+            cluster_id, is_representative = dedup.assign(conversation)
+            if is_representative:
+                yield conversation
+            elif cluster_id in representative_rows:
+                copy_result(conversation, representative_rows[cluster_id])
+            else:
+                waiting[cluster_id].append(conversation)
+
+    if cascade is not None:
+        analyze, cache_model_id, pack_token_budget = cascade, cascade.cache_id, None
+        input_token_budget = cascade.input_token_budget
+    else:
+        analyze, cache_model_id = partial(analyze_conversation, input_token_budget=input_token_budget), MODEL_ID
+
+    pending = job.pending(records)
+    scored = score_conversations(
+        bedrock,
+        representatives(pending) if dedup is not None else pending,
+        max_workers=max_workers,
+        requests_per_second=requests_per_second,
+        cache=cache,
+        refresh=refresh,
+        pack_token_budget=pack_token_budget,
+        analyze=analyze,
+        cache_model_id=cache_model_id,
+        input_token_budget=input_token_budget
+    )
+    try:
+        for conversation, analysis, error in scored:
+            row = None
+            if error is None:
+                cluster_id = str(conversation['conversation_id']) if dedup is not None else None
+                row = score_row(conversation, analysis, cluster_id)
+                record(row)
+            yield conversation, row, error
+
+            if dedup is not None:
+                cluster_id = str(conversation['conversation_id'])
+                representative_rows[cluster_id] = row if error is None else error
+                for member in waiting.pop(cluster_id, []):
+                    copy_result(member, representative_rows[cluster_id])
+            while copied:
+                yield copied.popleft()
+        while copied:
+            yield copied.popleft()
+    finally:
+        scored.close()
+        if writer is not None:
+            writer.flush()
+
+
+def run_pipeline(bot_name, since, until, bucket=None, prefix=None, export_format='parquet', job_id=None,
+                 force_rescore=False, max_workers=8, requests_per_second=5.0, pack_token_budget=None,
+                 input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET, batch_size=DEFAULT_BATCH_SIZE,
+                 export_chunk_rows=50_000, on_error=None, dedup_threshold=None, cascade_models=None, rollup_path=None, incremental=False):
+    """Stream transcripts from Snowflake through scoring into an S3 export.
+
+    Conversations are scored as Snowflake batches arrive and every result is
+    checkpointed, so memory stays bounded by the batch size and an
+    interrupted run resumes where it stopped. When bucket is given, the
+    job's checkpoint is exported in chunks of export_chunk_rows rows. With
+    dedup_threshold, near-duplicates of that similarity share one score.
+    With cascade_models, conversations are scored by a ModelCascade of
+    those models, cheapest first. With rollup_path, scores are also merged
+    into the RollupStore at that path. With incremental, only rows that are
+    new or changed since the last export to the prefix are uploaded, as a
+    delta (see smart_review.incremental).
+    """
+    job_id = job_id or pipeline_job_id(bot_name, since, until)
+    stages = {name: StageStats(name) for name in ('fetch', 'score', 'export')}
+    result = PipelineResult(job_id, stages)
+
+    job = ScoringJob(job_id)
+    if force_rescore:
+        job.reset()
+    cache = ScoreCache()
+    dedup = Deduplicator(dedup_threshold) if dedup_threshold else None
+    cascade = ModelCascade(cascade_models, input_token_budget=input_token_budget) if cascade_models else None
+    rollups = RollupStore(rollup_path) if rollup_path else None
+    try:
+        records = timed(stream_conversations(bot_name, since, until, batch_size), stages['fetch'])
+        scored = score_records(
+            get_bedrock_client(), records, job, cache,
+            refresh=force_rescore,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            pack_token_budget=pack_token_budget,
+            input_token_budget=input_token_budget,
+            dedup=dedup,
+            cascade=cascade,
+            rollups=rollups
+        )
+        start = time.perf_counter()
+        for conversation, _, error in scored:
+            if error is None:
+                stages['score'].items += 1
+            else:
+                result.failures += 1
+                if on_error is not None:
+                    on_error(conversation, error)
+        # Fetching happens on demand inside the scoring loop
+        stages['score'].seconds = time.perf_counter() - start - stages['fetch'].seconds
+        result.cache_stats = cache.stats()
+        result.dedup_stats = dedup.stats if dedup is not None else None
+        result.cascade_stats = cascade.stats if cascade is not None else None
+    finally:
+        job.close()
+        cache.close()
+        if rollups is not None:
+            rollups.close()
+
+    if bucket:
+        start = time.perf_counter()
+        if incremental:
+            export = export_incremental(
+                get_s3_client(),
+                job.iter_frames(export_chunk_rows),
+                bucket,
+                prefix or DEFAULT_INCREMENTAL_PREFIX,
+                export_format,
+                max_workers=max_workers
+            )
+            result.manifest = export.manifest
+            stages['export'].items = export.uploaded
+            partitions = export.manifest['deltas'][-1]['partitions'] if export.uploaded else []
+        else:
+            result.manifest = export_partitioned(
+                get_s3_client(),
+                job.iter_frames(export_chunk_rows),
+                bucket,
+                prefix or f"conversation_scores/{job_id}",
+                export_format,
+                max_workers=max_workers
+            )
+            stages['export'].items = result.manifest['rows']
+            partitions = result.manifest['partitions']
+        stages['export'].seconds = time.perf_counter() - start
+        stages['export'].bytes = sum(partition['bytes'] for partition in partitions)
+    return result
@@ -0,0 +1,103 @@
+"""Search, filters and paging for previews of large DataFrames, done server-side."""
+import numpy as np
+import pandas as pd
+
+PAGE_SIZES = [25, 100, 500, 1000]
+
+DEFAULT_PAGE_SIZE = 100
+
+# Columns with at most this many distinct values are filtered by value
+MAX_FILTER_VALUES = 100
+
+
+def _is_text(values):
+    return isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values)
+
+
+def search_mask(df, text):
+    """Rows where any text column contains text, ignoring case.
+
+    Categorical columns are matched on their categories and then by code,
+    so the strings of every row are not compared.
+    """
+    mask = np.zeros(len(df), dtype=bool)
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories.astype(str)
+            matches = np.flatnonzero(categories.str.contains(text, case=False, regex=False))
+            if len(matches):
+                mask |= np.isin(values.cat.codes.to_numpy(), matches)
+        elif pd.api.types.is_string_dtype(values):
+            mask |= values.str.contains(text, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+
+def filter_mask(df, filters):
+    """Rows passing every filter.
+
+    filters is a sequence of (column, 'values', values) to keep rows whose
+    value is one of values, or (column, 'range', (low, high)) to keep rows
+    with low <= value <= high.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, kind, value in filters:
+        values = df[column]
+        if kind == 'values':
+            mask &= values.isin(value).to_numpy(dtype=bool)
+        else:
+            low, high = value
+            mask &= values.between(low, high).fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def matching_rows(df, search=None, filters=()):
+    """Positions of the rows matching search and filters, or None for all rows"""
+    if not search and not filters:
+        return None
+    mask = filter_mask(df, filters)
+    if search:
+        mask &= search_mask(df, search)
+    return np.flatnonzero(mask)
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_of(df, rows, page, page_size):
+    """Rows of one 1-based page, taken from the matching row positions when given"""
+    start = (page - 1) * page_size
+    if rows is None:
+        return df.iloc[start:start + page_size]
+    return df.iloc[rows[start:start + page_size]]
+
+
+def filter_options(df, column):
+    """How a column can be filtered: ('values', choices), ('range', (min, max)) or None"""
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        return ('values', categories.tolist()) if len(categories) <= MAX_FILTER_VALUES else None
+    if pd.api.types.is_bool_dtype(values):
+        return 'values', [False, True]
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+        low, high = values.min(), values.max()
+        if pd.isna(low):
+            return None
+        if pd.api.types.is_numeric_dtype(values) and values.nunique() <= 10:
+            return 'values', sorted(values.dropna().unique().tolist())
+        return 'range', (low, high)
+    if _is_text(values):
+        distinct = values.dropna().unique()
+        return ('values', sorted(map(str, distinct))) if len(distinct) <= MAX_FILTER_VALUES else None
+    return None
+
+
+def frame_summary(df):
+    """Type, non-null count and distinct values of every column"""
+    return pd.DataFrame({
+        'dtype': [str(df[column].dtype) for column in df.columns],
+        'non_null': [int(df[column].count()) for column in df.columns],
+        'distinct': [int(df[column].nunique()) for column in df.columns],
+    }, index=pd.Index(df.columns, name='column'))
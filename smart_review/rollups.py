@@ -0,0 +1,293 @@
+"""Persistent per-bot, per-hour score aggregates for long-range analytics."""
+import os
+import sqlite3
+import threading
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from smart_review.dashboard import SCORE_VALUES, bucket_frequency, interval_half_widths
+from smart_review.sampling import DEFAULT_CONFIDENCE
+from smart_review.scoring import SCORE_COLUMNS
+
+DEFAULT_ROLLUP_PATH = os.getenv('SMART_REVIEW_ROLLUP_PATH', os.path.join('.smart_review', 'rollups.sqlite'))
+
+# Rows buffered by a RollupWriter before they are merged in one transaction
+DEFAULT_FLUSH_ROWS = 500
+
+# Finest time resolution kept; trends are bucketed no finer than this
+HOUR = '1h'
+
+SCORE_PAIRS = list(combinations(SCORE_COLUMNS, 2))
+
+SUM_COLUMNS = [f'sum_{column}' for column in SCORE_COLUMNS]
+SQUARE_COLUMNS = [f'sq_{column}' for column in SCORE_COLUMNS]
+BIN_COLUMNS = [f'bin_{column}_{value}' for column in SCORE_COLUMNS for value in SCORE_VALUES]
+CROSS_COLUMNS = [f'x_{a}__{b}' for a, b in SCORE_PAIRS]
+
+# Everything kept per bot and hour; all of it adds up across rows
+STAT_COLUMNS = ['count', *SUM_COLUMNS, *SQUARE_COLUMNS, *BIN_COLUMNS, *CROSS_COLUMNS]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS rollups (
+    bot_name TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    {', '.join(f'{column} REAL NOT NULL DEFAULT 0' for column in STAT_COLUMNS)},
+    PRIMARY KEY (bot_name, hour)
+);
+CREATE INDEX IF NOT EXISTS rollups_hour ON rollups (hour);
+CREATE TABLE IF NOT EXISTS members (
+    bot_name TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    {', '.join(f'{column} REAL NOT NULL' for column in SCORE_COLUMNS)},
+    PRIMARY KEY (bot_name, conversation_id)
+);
+"""
+
+
+def _hours(datetimes):
+    """Start of the hour of each timestamp as epoch seconds, NaN where there is none"""
+    datetimes = pd.to_datetime(pd.Series(datetimes, dtype=object), format='ISO8601')
+    if datetimes.dt.tz is not None:
+        datetimes = datetimes.dt.tz_convert(None)
+    hours = datetimes.dt.floor('h')
+    return np.where(hours.isna(), np.nan, hours.astype('datetime64[s]').astype(np.int64).astype(np.float64))
+
+
+def row_stats(scores):
+    """Per-row contributions to every STAT_COLUMNS aggregate.
+
+    scores is an (n, 4) array of score values in SCORE_COLUMNS order.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    rounded = np.rint(scores)
+    parts = [np.ones((len(scores), 1)), scores, scores ** 2]
+    parts.append(np.concatenate([(rounded[:, [i]] == SCORE_VALUES) for i in range(len(SCORE_COLUMNS))], axis=1))
+    parts.append(np.stack([scores[:, SCORE_COLUMNS.index(a)] * scores[:, SCORE_COLUMNS.index(b)]
+                           for a, b in SCORE_PAIRS], axis=1))
+    return np.concatenate(parts, axis=1)
+
+
+class RollupStore:
+    """Score aggregates per bot and hour, stored in SQLite.
+
+    Each (bot, hour) row holds the count, sums, sums of squares, value
+    histograms and pairwise cross-products of the scores, which is enough to
+    rebuild means, confidence intervals, distributions, correlations and
+    trends for any range of hours and set of bots. Every merged
+    conversation is remembered with its scores, so merging it again, as a
+    resumed or rescored job does, replaces its contribution instead of
+    counting it twice.
+    """
+
+    def __init__(self, path=DEFAULT_ROLLUP_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, statements):
+        """Run statements(conn) inside one write transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def merge(self, rows):
+        """Add score rows (dicts or a DataFrame) to the aggregates; returns rows merged.
+
+        Rows without a datetime have no hour to go in and are skipped.
+        """
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return 0
+        df = df.drop_duplicates(['bot_name', 'conversation_id'], keep='last')
+        hours = _hours(df['datetime'])
+        df, hours = df[~np.isnan(hours)], hours[~np.isnan(hours)].astype(np.int64)
+        if df.empty:
+            return 0
+        bots = df['bot_name'].astype(str).to_numpy()
+        ids = df['conversation_id'].astype(str).to_numpy()
+        scores = df[SCORE_COLUMNS].to_numpy(dtype=np.float64)
+
+        def apply(conn):
+            previous = self._previous(conn, bots, ids)
+            deltas = pd.DataFrame(row_stats(scores), columns=STAT_COLUMNS).assign(bot_name=bots, hour=hours)
+            if not previous.empty:
+                # Take back what the earlier scores of these conversations added
+                removed = pd.DataFrame(-row_stats(previous[SCORE_COLUMNS].to_numpy()), columns=STAT_COLUMNS)
+                removed = removed.assign(bot_name=previous['bot_name'].to_numpy(), hour=previous['hour'].to_numpy())
+                deltas = pd.concat([deltas, removed], ignore_index=True)
+            totals = deltas.groupby(['bot_name', 'hour'], sort=False)[STAT_COLUMNS].sum().reset_index()
+
+            placeholders = ', '.join('?' * (len(STAT_COLUMNS) + 2))
+            updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in STAT_COLUMNS)
+            conn.executemany(
+                f"INSERT INTO rollups (bot_name, hour, {', '.join(STAT_COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (bot_name, hour) DO UPDATE SET {updates}",
+                totals[['bot_name', 'hour', *STAT_COLUMNS]].itertuples(index=False, name=None)
+            )
+            conn.execute("DELETE FROM rollups WHERE count <= 0")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO members (bot_name, conversation_id, hour, {', '.join(SCORE_COLUMNS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(SCORE_COLUMNS))})",
+                zip(bots, ids, hours.tolist(), *scores.T.tolist())
+            )
+
+        self._transaction(apply)
+        return len(df)
+
+    def _previous(self, conn, bots, ids):
+        """Stored hour and scores of the conversations already merged"""
+        found = []
+        keys = list(zip(bots.tolist(), ids.tolist()))
+        for start in range(0, len(keys), 400):
+            chunk = keys[start:start + 400]
+            found.extend(conn.execute(
+                f"SELECT bot_name, hour, {', '.join(SCORE_COLUMNS)} FROM members "
+                f"WHERE (bot_name, conversation_id) IN (VALUES {', '.join(['(?, ?)'] * len(chunk))})",
+                [value for key in chunk for value in key]
+            ).fetchall())
+        return pd.DataFrame(found, columns=['bot_name', 'hour', *SCORE_COLUMNS])
+
+    def query(self, start=None, end=None, bots=None):
+        """Rollup rows for hours in [start, end) of the given bots (all by default)"""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("hour >= ?")
+            params.append(int(pd.Timestamp(start).floor('h').timestamp()))
+        if end is not None:
+            clauses.append("hour < ?")
+            params.append(int(pd.Timestamp(end).timestamp()))
+        if bots:
+            clauses.append(f"bot_name IN ({', '.join('?' * len(bots))})")
+            params.extend(bots)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT bot_name, hour, {', '.join(STAT_COLUMNS)} FROM rollups {where} ORDER BY hour", params
+            ).fetchall()
+        df = pd.DataFrame(rows, columns=['bot_name', 'hour', *STAT_COLUMNS])
+        df['hour'] = pd.to_datetime(df['hour'], unit='s')
+        return df
+
+    def bots(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT bot_name FROM rollups ORDER BY bot_name")]
+
+    def time_range(self):
+        """(first hour, end of last hour) covered, or None when empty"""
+        with self._lock:
+            first, last = self._conn.execute("SELECT MIN(hour), MAX(hour) FROM rollups").fetchone()
+        if first is None:
+            return None
+        return pd.Timestamp(first, unit='s'), pd.Timestamp(last, unit='s') + pd.Timedelta(hours=1)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RollupWriter:
+    """Buffer score rows and merge them into a RollupStore in batches"""
+
+    def __init__(self, store, flush_rows=DEFAULT_FLUSH_ROWS):
+        self.store = store
+        self.flush_rows = flush_rows
+        self._rows = []
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        rows, self._rows = self._rows, []
+        self.store.merge(rows)
+
+
+def _moments(totals):
+    """Means and unbiased variances per score column from summed stats"""
+    count = totals['count']
+    means = pd.DataFrame({column: totals[f'sum_{column}'] / count for column in SCORE_COLUMNS})
+    variances = pd.DataFrame({
+        column: (totals[f'sq_{column}'] - totals[f'sum_{column}'] ** 2 / count) / (count - 1)
+        for column in SCORE_COLUMNS
+    }).clip(lower=0)
+    return means, variances
+
+
+def _correlation(totals):
+    """Pearson correlation matrix of the scores from summed stats"""
+    count = totals['count']
+    means, variances = _moments(totals.to_frame().T)
+    std = np.sqrt(variances.iloc[0])
+    correlation = pd.DataFrame(np.eye(len(SCORE_COLUMNS)), index=SCORE_COLUMNS, columns=SCORE_COLUMNS)
+    for a, b in SCORE_PAIRS:
+        covariance = (totals[f'x_{a}__{b}'] - totals[f'sum_{a}'] * totals[f'sum_{b}'] / count) / (count - 1)
+        value = covariance / (std[a] * std[b]) if std[a] and std[b] else np.nan
+        correlation.loc[a, b] = correlation.loc[b, a] = value
+    return correlation
+
+
+def summarize_rollups(rollups, max_points=500, confidence=DEFAULT_CONFIDENCE):
+    """The Dashboard's aggregates (see compute_dashboard) from rollup rows.
+
+    Trends are drawn from hourly buckets, widened as needed to stay within
+    max_points. Returns None when rollups is empty.
+    """
+    rollups = rollups[rollups['count'] > 0]
+    if rollups.empty:
+        return None
+    totals = rollups[STAT_COLUMNS].sum()
+    overall_means, overall_variances = _moments(totals.to_frame().T)
+    means, variances = overall_means.iloc[0].rename(None), overall_variances.iloc[0].rename(None)
+    counts = pd.Series(totals['count'], index=SCORE_COLUMNS)
+    widths = interval_half_widths(variances, counts, confidence)
+
+    by_bot = rollups.groupby('bot_name')[STAT_COLUMNS].sum()
+    bot_means, bot_variances = _moments(by_bot)
+    bot_counts = pd.DataFrame({column: by_bot['count'] for column in SCORE_COLUMNS})
+
+    hourly = rollups.groupby('hour')[STAT_COLUMNS].sum()
+    frequency = bucket_frequency(hourly.index.min(), hourly.index.max(), max_points)
+    if pd.Timedelta(frequency) < pd.Timedelta(HOUR):
+        frequency = HOUR
+    buckets = hourly.groupby(hourly.index.floor(frequency))[STAT_COLUMNS].sum()
+    trend_means, _ = _moments(buckets)
+    trends = trend_means.assign(count=buckets['count'].astype(np.int64)).rename_axis('datetime').reset_index()
+
+    return {
+        'total_conversations': int(totals['count']),
+        'unique_bots': len(by_bot),
+        'means': means,
+        'intervals': pd.DataFrame({
+            'mean': means,
+            'low': means - widths,
+            'high': means + widths,
+            'half_width': widths,
+            'samples': counts.astype(np.int64),
+        }).rename_axis('metric'),
+        'value_counts': pd.DataFrame({
+            column: [int(totals[f'bin_{column}_{value}']) for value in SCORE_VALUES] for column in SCORE_COLUMNS
+        }, index=SCORE_VALUES),
+        'correlation': _correlation(totals),
+        'trends': trends,
+        'trend_frequency': frequency,
+        'bot_means': bot_means,
+        'bot_half_widths': interval_half_widths(bot_variances, bot_counts, confidence),
+    }
@@ -0,0 +1,160 @@
+"""Stratified sampling of conversations with running confidence intervals."""
+import math
+import random
+from collections import defaultdict
+from statistics import NormalDist
+
+import pandas as pd
+
+from smart_review.scoring import SCORE_COLUMNS
+
+DEFAULT_CONFIDENCE = 0.95
+
+# Half-width, in score points, at which an estimate is precise enough
+DEFAULT_TARGET_HALF_WIDTH = 0.1
+
+# Intervals from fewer scores than this are too unreliable to stop on
+DEFAULT_MIN_SAMPLES = 30
+
+
+def z_value(confidence=DEFAULT_CONFIDENCE):
+    """Two-sided normal quantile for a confidence level, e.g. 1.96 for 0.95"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def half_width(count, variance, confidence=DEFAULT_CONFIDENCE, population=None):
+    """Half-width of the normal confidence interval of a sample mean.
+
+    With population, the finite population correction narrows the interval
+    as the sample approaches the whole population.
+    """
+    if count < 2:
+        return math.inf
+    correction = 1.0
+    if population:
+        correction = max(0.0, (population - count) / max(population - 1, 1))
+    return z_value(confidence) * math.sqrt(variance / count * correction)
+
+
+def stratum_key(conversation):
+    """Stratum of a conversation: its bot and the hour it started in"""
+    return conversation['bot_name'], pd.Timestamp(conversation['datetime']).floor('h')
+
+
+def stratified_order(conversations, seed=0):
+    """Order conversations so every prefix is a proportional stratified sample.
+
+    Conversations are shuffled within each bot and hour, and the i-th of n
+    in a stratum is placed at position (i + u) / n with u uniform in [0, 1).
+    Any prefix therefore takes about the same share of every stratum, and
+    scoring can stop after any number of conversations.
+    """
+    rng = random.Random(seed)
+    strata = defaultdict(list)
+    for conversation in conversations:
+        strata[stratum_key(conversation)].append(conversation)
+
+    keyed = []
+    for members in strata.values():
+        rng.shuffle(members)
+        for i, conversation in enumerate(members):
+            keyed.append(((i + rng.random()) / len(members), rng.random(), conversation))
+    keyed.sort(key=lambda item: item[:2])
+    return [conversation for _, _, conversation in keyed]
+
+
+class RunningMean:
+    """Mean and variance of a stream of values (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """Unbiased sample variance"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class SampleEstimate:
+    """Running means and confidence intervals of the score columns.
+
+    The sample is proportionally stratified, so the plain sample mean
+    estimates the population mean, and the simple random sampling interval
+    used here is conservative.
+    """
+
+    def __init__(self, population, confidence=DEFAULT_CONFIDENCE, target_half_width=DEFAULT_TARGET_HALF_WIDTH,
+                 min_samples=DEFAULT_MIN_SAMPLES):
+        self.population = population
+        self.confidence = confidence
+        self.target_half_width = target_half_width
+        self.min_samples = min_samples
+        self.metrics = {column: RunningMean() for column in SCORE_COLUMNS}
+
+    @property
+    def count(self):
+        return min(metric.count for metric in self.metrics.values())
+
+    def add(self, row):
+        """Add the scores of one score row"""
+        for column, metric in self.metrics.items():
+            value = row.get(column)
+            if value is not None and not pd.isna(value):
+                metric.add(float(value))
+
+    def half_widths(self):
+        return {
+            column: half_width(metric.count, metric.variance, self.confidence, self.population)
+            for column, metric in self.metrics.items()
+        }
+
+    def converged(self):
+        """True once every interval is narrower than the target"""
+        if self.count >= self.population:
+            return True
+        if self.count < self.min_samples:
+            return False
+        return all(width <= self.target_half_width for width in self.half_widths().values())
+
+    def to_frame(self):
+        """Mean, interval bounds and sample size per metric"""
+        widths = self.half_widths()
+        return pd.DataFrame([
+            {
+                'metric': column,
+                'mean': metric.mean,
+                'low': metric.mean - widths[column],
+                'high': metric.mean + widths[column],
+                'half_width': widths[column],
+                'samples': metric.count,
+            }
+            for column, metric in self.metrics.items()
+        ]).set_index('metric')
+
+
+def resume_sample(conversations, scored_rows, confidence=DEFAULT_CONFIDENCE,
+                  target_half_width=DEFAULT_TARGET_HALF_WIDTH, min_samples=DEFAULT_MIN_SAMPLES):
+    """Stratified order of conversations to sample, resuming from rows already scored.
+
+    Returns (order, estimate, remaining): the conversations in stratified
+    order, a SampleEstimate holding scored_rows, and how many conversations
+    are left to score at most. A sample that has already converged has an
+    empty order and nothing remaining.
+    """
+    order = stratified_order(conversations)
+    estimate = SampleEstimate(len(order), confidence, target_half_width, min_samples)
+    scored = set()
+    for row in scored_rows:
+        estimate.add(row)
+        scored.add(row['conversation_id'])
+    if estimate.converged():
+        return [], estimate, 0
+    return order, estimate, max(0, len(order) - len(scored))
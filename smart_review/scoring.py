@@ -0,0 +1,632 @@
+"""Concurrent, rate-limit-aware scoring of conversations with Amazon Bedrock."""
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from smart_review.metrics import REGISTRY
+from smart_review.tokens import estimate_tokens, split_by_tokens
+
+MODEL_ID = 'anthropic.claude-3-sonnet-20240229-v1:0'
+
+SCORE_COLUMNS = ['satisfaction_score', 'accuracy_score', 'relevancy_score', 'containment_score']
+
+TOKEN_COLUMNS = ['input_tokens', 'output_tokens']
+
+# Error codes Bedrock uses when a request should be retried after slowing down
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException'}
+
+ANALYSIS_REQUEST = """Please analyze the following conversation and provide:
+1. A brief summary
+2. A satisfaction score (1-5)
+3. An accuracy score (1-5)
+4. A relevancy score (1-5)
+5. A containment score (1-5)"""
+
+ANALYSIS_FORMAT = """Please provide the analysis in JSON format with the following structure:
+{
+    "summary": "brief summary here",
+    "satisfaction_score": number,
+    "accuracy_score": number,
+    "relevancy_score": number,
+    "containment_score": number
+}"""
+
+# The instructions are the same for every request, so they go in the system
+# prompt and the user message holds only the conversation
+SYSTEM_PROMPT = f"{ANALYSIS_REQUEST}\n\n{ANALYSIS_FORMAT}"
+
+# System prompt for the early tiers of a model cascade, which also asks the
+# model how sure it is so that unsure answers can be escalated
+CONFIDENCE_SYSTEM_PROMPT = f"""{ANALYSIS_REQUEST}
+6. Your confidence that these scores are right (0-1)
+
+Please provide the analysis in JSON format with the following structure:
+{{
+    "summary": "brief summary here",
+    "satisfaction_score": number,
+    "accuracy_score": number,
+    "relevancy_score": number,
+    "containment_score": number,
+    "confidence": number
+}}"""
+
+PACKED_SYSTEM_PROMPT = """Please analyze each of the following conversations and provide for each one:
+1. A brief summary
+2. A satisfaction score (1-5)
+3. An accuracy score (1-5)
+4. A relevancy score (1-5)
+5. A containment score (1-5)
+
+Please provide the analysis as a JSON array with exactly one object per conversation, using this structure:
+[
+    {
+        "conversation_id": "id of the conversation",
+        "summary": "brief summary here",
+        "satisfaction_score": number,
+        "accuracy_score": number,
+        "relevancy_score": number,
+        "containment_score": number
+    }
+]"""
+
+# A reply missing a score is repaired to {}, which fails validation, so the
+# conversation fails instead of getting a made-up score
+REPAIR_SYSTEM_PROMPT = f"""You fix malformed replies. The reply you are given was meant to be a JSON conversation analysis but could not be parsed. Rewrite it as valid JSON, copying its summary and scores exactly. Never add a score the reply does not give: if any of the four scores is missing, reply with {{}} instead.
+
+{ANALYSIS_FORMAT}"""
+
+PROMPT_TEMPLATE = """Conversation:
+{conversation}"""
+
+SEGMENT_PROMPT_TEMPLATE = """The following is part {part} of {parts} of a long conversation.
+Please analyze this part only.
+
+Conversation part {part} of {parts}:
+{conversation}"""
+
+REDUCE_PROMPT_TEMPLATE = """A long conversation was analyzed in {parts} consecutive parts.
+The analyses of the parts, in order, are:
+
+{analyses}
+
+Please combine them into one analysis of the whole conversation."""
+
+REPAIR_PROMPT_TEMPLATE = """Malformed reply:
+{completion}"""
+
+# Bedrock Messages API version for Anthropic models
+ANTHROPIC_VERSION = 'bedrock-2023-05-31'
+
+# Models that accept cache points; others are sent the same request without them
+PROMPT_CACHING_MODELS = {
+    'anthropic.claude-3-5-haiku-20241022-v1:0',
+    'anthropic.claude-3-7-sonnet-20250219-v1:0',
+    'anthropic.claude-sonnet-4-20250514-v1:0',
+    'anthropic.claude-opus-4-20250514-v1:0',
+}
+
+# Shortest prefix Bedrock will cache, in tokens; shorter ones are billed in full
+MIN_CACHE_TOKENS = 1024
+MIN_CACHE_TOKENS_HAIKU = 2048
+
+# Small, fast model that rewrites unparseable replies as JSON
+REPAIR_MODEL_ID = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+# Conversations estimated above this many tokens are scored map-reduce style
+DEFAULT_INPUT_TOKEN_BUDGET = 8000
+
+# Output tokens for one analysis: a brief summary plus four scores in JSON
+ANALYSIS_MAX_TOKENS = 400
+
+# Output tokens reserved for each analysis in a packed response
+PACKED_TOKENS_PER_CONVERSATION = 300
+
+# Response headers in which Bedrock reports token usage
+INPUT_TOKENS_HEADER = 'x-amzn-bedrock-input-token-count'
+OUTPUT_TOKENS_HEADER = 'x-amzn-bedrock-output-token-count'
+
+
+def build_prompt(conversation, template=PROMPT_TEMPLATE):
+    """Render the user message for a single conversation"""
+    return template.format(conversation=conversation)
+
+
+def build_packed_prompt(conversations):
+    """Render one user message covering several conversations"""
+    return '\n\n'.join(
+        f"Conversation {conversation['conversation_id']}:\n{conversation['text']}"
+        for conversation in conversations
+    )
+
+
+def supports_prompt_caching(model_id):
+    """True if model_id, or the model behind an inference profile ID, takes cache points"""
+    return model_id in PROMPT_CACHING_MODELS or model_id.split('.', 1)[-1] in PROMPT_CACHING_MODELS
+
+
+def min_cache_tokens(model_id):
+    """Shortest prefix, in tokens, that model_id will cache"""
+    return MIN_CACHE_TOKENS_HAIKU if 'haiku' in model_id else MIN_CACHE_TOKENS
+
+
+def build_request(prompt, system=SYSTEM_PROMPT, prefill=None, max_tokens=ANALYSIS_MAX_TOKENS, model_id=MODEL_ID):
+    """Messages API request body.
+
+    The system prompt is marked as a cache point when model_id supports
+    prompt caching and the prompt is long enough to be cached; a shorter
+    one would be billed in full anyway. prefill starts the assistant's
+    reply, so the model can only continue it.
+    """
+    system_block = {'type': 'text', 'text': system}
+    if supports_prompt_caching(model_id) and estimate_tokens(system) >= min_cache_tokens(model_id):
+        system_block['cache_control'] = {'type': 'ephemeral'}
+    messages = [{'role': 'user', 'content': [{'type': 'text', 'text': prompt}]}]
+    if prefill:
+        messages.append({'role': 'assistant', 'content': [{'type': 'text', 'text': prefill}]})
+    return {
+        'anthropic_version': ANTHROPIC_VERSION,
+        'max_tokens': max_tokens,
+        'temperature': 0.5,
+        'system': [system_block],
+        'messages': messages,
+    }
+
+
+def invoke_claude(bedrock, prompt, max_tokens=ANALYSIS_MAX_TOKENS, model_id=MODEL_ID, system=SYSTEM_PROMPT,
+                  prefill=None):
+    """Send a message to Claude and return the reply text and token usage.
+
+    The reply text starts with prefill. Usage comes from the response body,
+    then Bedrock's token-count headers, falling back to local estimates.
+    Input tokens read from or written to the prompt cache are counted
+    separately in the metrics.
+    """
+    try:
+        with REGISTRY.timed_call('bedrock', 'invoke_model', model=model_id):
+            response = bedrock.invoke_model(
+                modelId=model_id,
+                body=json.dumps(build_request(prompt, system, prefill, max_tokens, model_id))
+            )
+            response_body = json.loads(response['body'].read())
+    except Exception as e:
+        if is_throttling_error(e):
+            REGISTRY.inc('throttles', service='bedrock', model=model_id)
+        raise
+    completion = (prefill or '') + ''.join(
+        block.get('text', '') for block in response_body.get('content', []) if block.get('type') == 'text'
+    )
+
+    body_usage = response_body.get('usage') or {}
+    headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    usage = {
+        'input_tokens': int(body_usage.get('input_tokens') or headers.get(INPUT_TOKENS_HEADER)
+                            or estimate_tokens(system) + estimate_tokens(prompt)),
+        'output_tokens': int(body_usage.get('output_tokens') or headers.get(OUTPUT_TOKENS_HEADER)
+                             or estimate_tokens(completion)),
+    }
+    REGISTRY.inc('tokens', usage['input_tokens'], model=model_id, direction='input')
+    REGISTRY.inc('tokens', usage['output_tokens'], model=model_id, direction='output')
+    for key, direction in (('cache_read_input_tokens', 'cache_read'), ('cache_creation_input_tokens', 'cache_write')):
+        if body_usage.get(key):
+            REGISTRY.inc('tokens', body_usage[key], model=model_id, direction=direction)
+    return completion, usage
+
+
+def add_usage(total, usage):
+    """Accumulate token usage from one call into a running total"""
+    for key, value in usage.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def is_valid_analysis(analysis):
+    """Check that an analysis has a summary and numeric 1-5 scores"""
+    if not isinstance(analysis, dict) or not isinstance(analysis.get('summary'), str):
+        return False
+    for column in SCORE_COLUMNS:
+        score = analysis.get(column)
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 1 <= score <= 5:
+            return False
+    return True
+
+
+def extract_json(text, opening='{'):
+    """Decode the first JSON value starting with opening in text.
+
+    Prose or code fences around the value are ignored, which is how most
+    replies that are not pure JSON go wrong.
+    """
+    decoder = json.JSONDecoder()
+    start = text.find(opening)
+    while start != -1:
+        try:
+            return decoder.raw_decode(text, start)[0]
+        except ValueError:
+            start = text.find(opening, start + 1)
+    raise ValueError("No JSON found in the model's reply")
+
+
+def parse_analysis(completion, model_id=MODEL_ID):
+    """Parse and validate a single analysis from a completion"""
+    try:
+        analysis = extract_json(completion)
+    except ValueError:
+        REGISTRY.inc('parse_failures', model=model_id)
+        raise
+    if not is_valid_analysis(analysis):
+        REGISTRY.inc('parse_failures', model=model_id)
+        raise ValueError("Malformed analysis returned by the model")
+    return analysis
+
+
+def repair_analysis(bedrock, completion, model_id=REPAIR_MODEL_ID):
+    """Rewrite an unparseable reply as a valid analysis with a cheap model.
+
+    Only the broken reply is sent, not the conversation, so this costs a
+    fraction of scoring the conversation again. Returns the analysis and
+    the repair call's usage, or raises ValueError if it is still invalid.
+    """
+    repaired, usage = invoke_claude(
+        bedrock,
+        REPAIR_PROMPT_TEMPLATE.format(completion=completion),
+        model_id=model_id,
+        system=REPAIR_SYSTEM_PROMPT,
+        prefill='{'
+    )
+    try:
+        analysis = parse_analysis(repaired, model_id)
+    except ValueError:
+        REGISTRY.inc('repairs', model=model_id, outcome='failed')
+        raise
+    REGISTRY.inc('repairs', model=model_id, outcome='ok')
+    return analysis, usage
+
+
+def request_analysis(bedrock, prompt, model_id=MODEL_ID, system=SYSTEM_PROMPT, repair=True):
+    """One analysis request; an unparseable reply goes through repair_analysis.
+
+    Returns the analysis including the tokens of every call made for it.
+    """
+    completion, usage = invoke_claude(bedrock, prompt, model_id=model_id, system=system, prefill='{')
+    try:
+        analysis = parse_analysis(completion, model_id)
+    except ValueError:
+        if not repair:
+            raise
+        analysis, repair_usage = repair_analysis(bedrock, completion)
+        add_usage(usage, repair_usage)
+    return {**analysis, **usage}
+
+
+def analyze_conversation(bedrock, conversation, model_id=MODEL_ID, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET,
+                         system=SYSTEM_PROMPT, repair=True):
+    """Analyze a single conversation using Claude.
+
+    Conversations estimated over input_token_budget are split into segments
+    that are analyzed separately and merged in one reduce call; system only
+    applies to conversations that fit in one request. Replies that do not
+    parse are repaired by a cheap model unless repair is False. The
+    returned analysis includes the input and output tokens spent on it.
+    Errors are raised to the caller so that throttling can be retried.
+    """
+    if estimate_tokens(conversation) <= input_token_budget:
+        return request_analysis(bedrock, build_prompt(conversation), model_id, system, repair)
+
+    usage = {}
+    segments = split_by_tokens(conversation, input_token_budget)
+    part_analyses = []
+    for part, segment in enumerate(segments, start=1):
+        prompt = SEGMENT_PROMPT_TEMPLATE.format(part=part, parts=len(segments), conversation=segment)
+        analysis = request_analysis(bedrock, prompt, model_id, repair=repair)
+        add_usage(usage, {key: analysis.pop(key) for key in TOKEN_COLUMNS})
+        part_analyses.append(analysis)
+
+    prompt = REDUCE_PROMPT_TEMPLATE.format(
+        parts=len(segments),
+        analyses='\n'.join(json.dumps(analysis) for analysis in part_analyses)
+    )
+    analysis = request_analysis(bedrock, prompt, model_id, repair=repair)
+    add_usage(usage, {key: analysis.pop(key) for key in TOKEN_COLUMNS})
+    return {**analysis, **usage}
+
+
+def analyze_packed(bedrock, conversations, model_id=MODEL_ID):
+    """Analyze several conversations in one request.
+
+    Returns a dict of conversation_id to analysis holding only the
+    well-formed analyses for the requested IDs; callers must rescore any
+    conversation that is missing from it. The request's token usage is
+    shared out in proportion to each conversation's estimated size.
+    """
+    completion, usage = invoke_claude(
+        bedrock,
+        build_packed_prompt(conversations),
+        max_tokens=PACKED_TOKENS_PER_CONVERSATION * len(conversations),
+        model_id=model_id,
+        system=PACKED_SYSTEM_PROMPT,
+        prefill='['
+    )
+    try:
+        items = extract_json(completion, opening='[')
+    except ValueError:
+        REGISTRY.inc('parse_failures', model=model_id)
+        raise
+
+    sizes = {str(conversation['conversation_id']): estimate_tokens(conversation['text']) for conversation in conversations}
+    total_size = sum(sizes.values())
+    analyses = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        conversation_id = str(item.get('conversation_id'))
+        if conversation_id in sizes and is_valid_analysis(item):
+            analysis = {key: value for key, value in item.items() if key != 'conversation_id'}
+            analysis['input_tokens'] = round(usage['input_tokens'] * sizes[conversation_id] / total_size)
+            analysis['output_tokens'] = round(usage['output_tokens'] / len(conversations))
+            analyses[conversation_id] = analysis
+    malformed = len(conversations) - len(analyses)
+    if malformed:
+        REGISTRY.inc('parse_failures', malformed, model=model_id)
+    return analyses
+
+
+def pack_conversations(items, token_budget, text=lambda item: item['text'], alone=lambda item: False):
+    """Group items into batches whose estimated tokens fit token_budget.
+
+    Items estimated at more than half the budget are always sent on their
+    own, so long conversations are never packed. Items for which alone is
+    true are yielded on their own as soon as they are read.
+    """
+    batch = []
+    batch_tokens = 0
+    for item in items:
+        if alone(item):
+            yield [item]
+            continue
+        tokens = estimate_tokens(text(item))
+        if tokens > token_budget / 2:
+            yield [item]
+            continue
+        if batch and batch_tokens + tokens > token_budget:
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def is_throttling_error(error):
+    """Return True if a botocore error means Bedrock is throttling us"""
+    response = getattr(error, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate to Bedrock.
+
+    The refill rate is halved on every throttle and recovers gradually on
+    success, so the limiter settles just below the account's real quota.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.2):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def on_throttle(self):
+        """Cut the rate after Bedrock rejected a request"""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+
+    def on_success(self):
+        """Recover the rate a little after a successful request"""
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+def call_with_retry(fn, limiter, max_retries=6, sleep=time.sleep):
+    """Call fn under the limiter, retrying throttled calls with backoff"""
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_throttling_error(e) or attempt >= max_retries:
+                raise
+            REGISTRY.inc('retries', service='bedrock')
+            limiter.on_throttle()
+            sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        limiter.on_success()
+        return result
+
+
+def scoring_mode(text, input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET, pack_token_budget=None):
+    """How a conversation is sent for scoring: 'packed', 'single' or 'map-reduce:<budget>'.
+
+    Map-reduce analyses depend on where the conversation is split, so
+    their mode includes the budget it is split at.
+    """
+    tokens = estimate_tokens(text)
+    if pack_token_budget and tokens <= pack_token_budget / 2:
+        return 'packed'
+    if tokens <= input_token_budget:
+        return 'single'
+    return f'map-reduce:{input_token_budget}'
+
+
+def score_row(conversation, analysis, cluster_id=None):
+    """Build the scores_df row for a scored conversation"""
+    row = {
+        'conversation_id': conversation['conversation_id'],
+        'bot_name': conversation['bot_name'],
+        'datetime': conversation['datetime'],
+        'summary': analysis['summary'],
+    }
+    for column in SCORE_COLUMNS:
+        row[column] = analysis[column]
+    for column in TOKEN_COLUMNS:
+        row[column] = analysis.get(column)
+    if 'model_id' in analysis:
+        row['model_id'] = analysis['model_id']
+    if cluster_id is not None:
+        row['cluster_id'] = cluster_id
+    return row
+
+
+def duplicate_row(conversation, representative_row):
+    """Score row for a near-duplicate, copied from its representative's row"""
+    row = dict(
+        representative_row,
+        conversation_id=conversation['conversation_id'],
+        bot_name=conversation['bot_name'],
+        datetime=conversation['datetime']
+    )
+    for column in TOKEN_COLUMNS:
+        row[column] = 0
+    return row
+
+
+def score_conversations(bedrock, conversations, max_workers=8, requests_per_second=5.0,
+                        max_retries=6, analyze=analyze_conversation, cache=None, refresh=False,
+                        pack_token_budget=None, analyze_many=analyze_packed, cache_model_id=MODEL_ID,
+                        input_token_budget=DEFAULT_INPUT_TOKEN_BUDGET):
+    """Score conversations concurrently, yielding results as they complete.
+
+    conversations is an iterable of dicts with conversation_id, bot_name,
+    datetime and text. Only a bounded number of conversations is in flight at
+    once, so the iterable may be a lazy stream. Yields
+    (conversation, analysis, error) tuples in completion order; exactly one
+    of analysis and error is None.
+
+    With a cache (see smart_review.cache.ScoreCache), cached analyses are
+    yielded without calling Bedrock and new ones are stored. refresh=True
+    rescores everything and overwrites the cached entries. cache_model_id
+    names what analyze scores with in the cache key, so that analyses from
+    different models or cascades are kept apart. The key also records the
+    scoring_mode of each conversation, for which input_token_budget must be
+    the budget analyze splits long conversations at.
+
+    With pack_token_budget, short conversations are packed into shared
+    requests of at most that many estimated conversation tokens. Any
+    conversation missing or malformed in a packed response is retried on
+    its own.
+
+    Closing the generator early cancels requests that have not started.
+    """
+    limiter = TokenBucket(requests_per_second)
+    max_in_flight = max_workers * 2
+    retry_queue = deque()
+
+    def lookups():
+        for conversation in conversations:
+            key = cached = None
+            if cache is not None:
+                mode = scoring_mode(conversation['text'], input_token_budget, pack_token_budget)
+                key = cache.key(conversation['text'], model_id=cache_model_id, mode=mode)
+                cached = None if refresh else cache.get(key)
+            yield conversation, key, cached
+
+    def batches():
+        # A cache hit is its own batch, so it is yielded as soon as it is
+        # read instead of buffering a cached stream behind the next miss
+        is_hit = lambda item: item[2] is not None
+        if pack_token_budget:
+            yield from pack_conversations(lookups(), pack_token_budget, text=lambda item: item[0]['text'], alone=is_hit)
+        else:
+            for item in lookups():
+                yield [item]
+
+    def run(batch):
+        if len(batch) == 1:
+            conversation = batch[0][0]
+            call = lambda: {str(conversation['conversation_id']): analyze(bedrock, conversation['text'])}
+        else:
+            call = lambda: analyze_many(bedrock, [conversation for conversation, _, _ in batch])
+        bots = {conversation.get('bot_name') for conversation, _, _ in batch}
+        with REGISTRY.context(bot=bots.pop() if len(bots) == 1 else 'mixed'):
+            return call_with_retry(call, limiter, max_retries=max_retries)
+
+    work = batches()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        exhausted = False
+        try:
+            while True:
+                while len(pending) < max_in_flight:
+                    if retry_queue:
+                        batch = [retry_queue.popleft()]
+                    elif not exhausted:
+                        batch = next(work, None)
+                        if batch is None:
+                            exhausted = True
+                            break
+                    else:
+                        break
+                    conversation, _, cached = batch[0]
+                    if cached is not None:
+                        yield conversation, cached, None
+                        continue
+                    pending[executor.submit(run, batch)] = batch
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    try:
+                        analyses = future.result()
+                    except Exception as e:
+                        if len(batch) > 1:
+                            retry_queue.extend(batch)
+                        else:
+                            yield batch[0][0], None, e
+                        continue
+                    for conversation, key, _ in batch:
+                        analysis = analyses.get(str(conversation['conversation_id']))
+                        if analysis is None:
+                            retry_queue.append((conversation, key, None))
+                            continue
+                        if key is not None:
+                            cache.put(key, analysis)
+                        yield conversation, analysis, None
+        finally:
+            # A consumer that stops early should not wait for queued work
+            for future in pending:
+                future.cancel()
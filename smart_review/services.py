@@ -0,0 +1,43 @@
+"""Clients shared by every session of the app, and page load timing.
+
+Each client is created once per server process with st.cache_resource and
+reused by every session and rerun, so its connection pool stays warm.
+boto3 and Snowflake clients are thread-safe for this use; Snowflake
+connections are checked out of the pool one thread at a time.
+"""
+import time
+
+import streamlit as st
+
+from smart_review.clients import get_bedrock_client, get_s3_client
+from smart_review.metrics import REGISTRY
+from smart_review.transcripts import ConnectionPool
+
+# Snowflake connections shared by the app; each sync fetches over at most this many
+SNOWFLAKE_POOL_SIZE = 4
+
+
+@st.cache_resource(show_spinner="Connecting to Amazon Bedrock...")
+def bedrock_client():
+    return get_bedrock_client()
+
+
+@st.cache_resource(show_spinner="Connecting to AWS S3...")
+def s3_client():
+    return get_s3_client()
+
+
+@st.cache_resource(show_spinner=False)
+def snowflake_pool():
+    """Snowflake connections, opened on first checkout"""
+    return ConnectionPool(size=SNOWFLAKE_POOL_SIZE)
+
+
+def record_page_time(page, phase, started):
+    """Record the time since started (a time.perf_counter value) for one phase of a page's script run.
+
+    Pages record 'imports' once their imports are done and 'script' at the
+    end of the run. The first run of a page in a process includes loading
+    its modules, which is what dominates a cold start.
+    """
+    REGISTRY.observe('page_seconds', time.perf_counter() - started, page=page, phase=phase)
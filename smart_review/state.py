@@ -0,0 +1,116 @@
+"""Session state shared by the Streamlit pages."""
+import os
+
+import streamlit as st
+
+from smart_review.background import RunRegistry
+from smart_review.frames import compact_frame, content_hash, memory_bytes
+from smart_review.jobs import ScoringJob
+from smart_review.rollups import RollupStore
+
+# How often pages showing a scoring run in progress refresh
+RUN_REFRESH_SECONDS = 2.0
+
+# Session state keys that hold DataFrames, with their display names
+FRAME_KEYS = {'transcripts_df': 'Transcripts', 'scores_df': 'Scores'}
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _shared_frame(key, _df):
+    """One compact copy per distinct content, shared by every session"""
+    return compact_frame(_df)
+
+
+def share_frame(df, key=None):
+    """Compact df and return the copy shared with sessions holding the same data.
+
+    key is df's content_hash when the caller already has it. The returned
+    frame may be in use by other sessions, so callers must treat it as
+    read-only and copy it before modifying it.
+    """
+    if df is None:
+        return None
+    return _shared_frame(key or content_hash(df), df)
+
+
+def store_frame(name, df):
+    """Put the shared compact copy of df in st.session_state[name]"""
+    key = content_hash(df) if df is not None else None
+    shared = st.session_state[name] = share_frame(df, key)
+    st.session_state.setdefault('frame_keys', {})[name] = (id(shared), key)
+    return shared
+
+
+def frame_key(name):
+    """Content hash of st.session_state[name], for caching what is derived from it.
+
+    The hash is computed by store_frame, and only here for a frame that
+    was put in the session state some other way.
+    """
+    df = st.session_state.get(name)
+    if df is None:
+        return None
+    keys = st.session_state.setdefault('frame_keys', {})
+    frame_id, key = keys.get(name, (None, None))
+    if frame_id != id(df):
+        key = content_hash(df)
+        keys[name] = (id(df), key)
+    return key
+
+
+def session_memory():
+    """Rows and bytes of each DataFrame held in this session's state"""
+    return [
+        {'frame': label, 'rows': len(df), 'bytes': memory_bytes(df)}
+        for name, label in FRAME_KEYS.items()
+        if (df := st.session_state.get(name)) is not None
+    ]
+
+
+@st.cache_resource(show_spinner=False)
+def rollup_store():
+    """The rollup database of score history, opened once per server process"""
+    return RollupStore()
+
+
+@st.cache_resource(show_spinner=False)
+def scoring_runs():
+    """Background scoring runs of this server process, shared by every session"""
+    return RunRegistry()
+
+
+def current_run():
+    """The scoring run this session started or attached to, or None"""
+    job_id = st.session_state.get('scoring_run_id')
+    return scoring_runs().get(job_id) if job_id else None
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _checkpoint_frame(job_id, size):
+    """Scores checkpointed by job_id, memoized on the checkpoint's size"""
+    return ScoringJob(job_id).to_frame()
+
+
+def refresh_scores():
+    """Load what this session's scoring run has finished into scores_df.
+
+    Runs write every result to their job checkpoint, so this only rereads
+    the checkpoint when it has grown. Returns the run, or None when the
+    session has not started one.
+    """
+    run = current_run()
+    if run is None:
+        return None
+    path = ScoringJob(run.job_id).path
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size and size != st.session_state.get('scores_checkpoint_size'):
+        store_frame('scores_df', _checkpoint_frame(run.job_id, size))
+        st.session_state.scores_checkpoint_size = size
+    return run
+
+
+def run_status(run):
+    """One-line progress summary of a scoring run"""
+    total = f" of {run.total:,}" if run.total else ""
+    failed = f", {run.failures:,} failed" if run.failures else ""
+    return f"Job {run.job_id} {run.status}: {run.done:,}{total} conversations scored{failed} in {run.elapsed:,.0f}s"
@@ -0,0 +1,236 @@
+"""Incremental Snowflake sync into a local, partitioned transcript cache."""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from urllib.parse import quote
+
+import pandas as pd
+
+from smart_review.transcripts import (
+    DEFAULT_BATCH_SIZE,
+    TRANSCRIPT_COLUMNS,
+    TRANSCRIPTS_RANGE_QUERY,
+    ConnectionPool,
+    iter_transcript_batches,
+)
+from smart_review.uploads import concat_chunks, normalize_chunk
+
+DEFAULT_TRANSCRIPT_CACHE_DIR = os.getenv(
+    'SMART_REVIEW_TRANSCRIPT_CACHE_DIR', os.path.join('.smart_review', 'transcripts')
+)
+
+# Recent rows may still be arriving, so the newest part of a fetch is not
+# marked as synced and is fetched again next time
+DEFAULT_SETTLE_TIME = timedelta(hours=1)
+
+COVERAGE_FILE = '_coverage.json'
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _timestamp(value):
+    """Naive pd.Timestamp for a date, datetime or string"""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert('UTC').tz_localize(None)
+    return value
+
+
+def merge_ranges(ranges):
+    """Sort half-open (start, end) ranges and merge those that touch"""
+    merged = []
+    for start, end in sorted(ranges):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(start, end, covered):
+    """Parts of [start, end) not inside any of the covered ranges"""
+    missing = []
+    for covered_start, covered_end in merge_ranges(covered):
+        if covered_end <= start or covered_start >= end:
+            continue
+        if covered_start > start:
+            missing.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+
+def time_slices(ranges, max_slice=timedelta(days=1)):
+    """Split ranges into slices of at most max_slice that never cross midnight.
+
+    Each slice then maps to exactly one daily partition, so slices can be
+    fetched and written in parallel without touching the same file.
+    """
+    slices = []
+    for start, end in ranges:
+        while start < end:
+            next_day = start.normalize() + timedelta(days=1)
+            stop = min(end, next_day, start + max_slice)
+            slices.append((start, stop))
+            start = stop
+    return slices
+
+
+@dataclass
+class SyncStats:
+    """What one sync fetched from Snowflake and read from the cache"""
+    slices: int = 0
+    rows_fetched: int = 0
+    rows_cached: int = 0
+    missing_ranges: list = field(default_factory=list)
+
+    def __str__(self):
+        if not self.slices:
+            return f"{self.rows_cached:,} rows from the local cache, nothing to fetch"
+        return (f"{self.rows_fetched:,} new rows fetched from Snowflake in {self.slices} slice(s), "
+                f"{self.rows_cached:,} rows from the local cache")
+
+
+class TranscriptCache:
+    """Transcripts stored as one Parquet file per bot and day.
+
+    Files live at <cache_dir>/bot_name=<bot>/date=<YYYY-MM-DD>.parquet. The
+    time ranges already synced from Snowflake are kept per bot in
+    _coverage.json; its latest end is the bot's high-water mark.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_TRANSCRIPT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _bot_dir(self, bot_name):
+        return os.path.join(self.cache_dir, f"bot_name={quote(bot_name, safe='')}")
+
+    def _partition_path(self, bot_name, day):
+        return os.path.join(self._bot_dir(bot_name), f"date={day:%Y-%m-%d}.parquet")
+
+    def lock(self, bot_name):
+        """Lock serializing syncs of one bot within this process"""
+        key = (os.path.abspath(self.cache_dir), bot_name)
+        with _locks_guard:
+            return _locks.setdefault(key, threading.Lock())
+
+    def coverage(self, bot_name):
+        """Merged (start, end) ranges of bot_name that are fully cached"""
+        path = os.path.join(self._bot_dir(bot_name), COVERAGE_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            ranges = json.load(f)['ranges']
+        return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in ranges]
+
+    def watermark(self, bot_name):
+        """End of the latest synced range of bot_name, or None"""
+        ranges = self.coverage(bot_name)
+        return ranges[-1][1] if ranges else None
+
+    def mark_synced(self, bot_name, ranges):
+        """Add ranges to bot_name's coverage"""
+        merged = merge_ranges(self.coverage(bot_name) + list(ranges))
+        os.makedirs(self._bot_dir(bot_name), exist_ok=True)
+        path = os.path.join(self._bot_dir(bot_name), COVERAGE_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'ranges': [[start.isoformat(), end.isoformat()] for start, end in merged]}, f)
+        os.replace(path + '.tmp', path)
+
+    def missing_ranges(self, bot_name, start, end):
+        """Parts of [start, end) that have not been synced yet"""
+        return subtract_ranges(_timestamp(start), _timestamp(end), self.coverage(bot_name))
+
+    def write_slice(self, bot_name, start, end, frame):
+        """Replace the rows of [start, end) in its daily partition with frame.
+
+        Rows outside the slice are kept, so refetching the unsettled tail of
+        a day does not duplicate or drop anything.
+        """
+        path = self._partition_path(bot_name, start)
+        if os.path.exists(path):
+            existing = pd.read_parquet(path)
+            outside = (existing['datetime'] < start) | (existing['datetime'] >= end)
+            frame = concat_chunks([normalize_chunk(existing[outside]), frame])
+        if frame.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frame.to_parquet(path + '.tmp', index=False, compression='zstd')
+        os.replace(path + '.tmp', path)
+
+    def read(self, bot_name, start, end):
+        """Cached transcripts of bot_name in [start, end), ordered like the query"""
+        start, end = _timestamp(start), _timestamp(end)
+        frames = []
+        for day in pd.date_range(start.normalize(), end, freq='D', inclusive='left'):
+            path = self._partition_path(bot_name, day)
+            if os.path.exists(path):
+                frame = normalize_chunk(pd.read_parquet(path))
+                frames.append(frame[(frame['datetime'] >= start) & (frame['datetime'] < end)])
+        if not frames:
+            return normalize_chunk(pd.DataFrame(columns=TRANSCRIPT_COLUMNS))
+        df = concat_chunks(frames)
+        return df.sort_values(['conversation_id', 'datetime'], kind='stable', ignore_index=True)
+
+
+def fetch_slice(pool, bot_name, start, end, batch_size=DEFAULT_BATCH_SIZE):
+    """Fetch one time slice from Snowflake on a pooled connection"""
+    with pool.connection() as conn:
+        batches = [
+            normalize_chunk(batch)
+            for batch in iter_transcript_batches(
+                conn, bot_name, start.to_pydatetime(), end.to_pydatetime(), batch_size, query=TRANSCRIPTS_RANGE_QUERY
+            )
+        ]
+    if not batches:
+        return normalize_chunk(pd.DataFrame(columns=TRANSCRIPT_COLUMNS))
+    return concat_chunks(batches)
+
+
+def sync_transcripts(bot_name, start_date, end_date, cache=None, pool=None, max_workers=4,
+                     max_slice=timedelta(days=1), settle_time=DEFAULT_SETTLE_TIME, now=None,
+                     batch_size=DEFAULT_BATCH_SIZE):
+    """Bring the local cache up to date for [start_date, end_date) and read it.
+
+    Only ranges missing from the cache are requested from Snowflake, split
+    into day-aligned slices that are fetched in parallel over pool. The
+    part of a fetch newer than now - settle_time is cached but not marked
+    as synced, so it is fetched again by the next sync. Returns the
+    transcripts and a SyncStats.
+    """
+    cache = cache or TranscriptCache()
+    owns_pool = pool is None
+    pool = pool or ConnectionPool(size=max_workers)
+    settled = _timestamp(now if now is not None else pd.Timestamp.now()) - settle_time
+    stats = SyncStats()
+    try:
+        with cache.lock(bot_name):
+            missing = cache.missing_ranges(bot_name, start_date, end_date)
+            slices = time_slices(missing, max_slice)
+            stats.missing_ranges = missing
+            stats.slices = len(slices)
+
+            def sync_slice(time_slice):
+                frame = fetch_slice(pool, bot_name, *time_slice, batch_size)
+                cache.write_slice(bot_name, *time_slice, frame)
+                return len(frame)
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, pool.size))) as executor:
+                stats.rows_fetched = sum(executor.map(sync_slice, slices))
+
+            cache.mark_synced(bot_name, [(start, min(end, settled)) for start, end in missing])
+            df = cache.read(bot_name, start_date, end_date)
+    finally:
+        if owns_pool:
+            pool.close()
+    stats.rows_cached = len(df) - stats.rows_fetched
+    return df, stats
@@ -0,0 +1,43 @@
+"""Local token estimation and token-budgeted splitting of prompts."""
+import math
+import re
+
+# Claude tokenizers average roughly four characters of English per token,
+# and rarely fewer than one token per word or punctuation mark
+CHARS_PER_TOKEN = 4
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Cheap, conservative estimate of the number of tokens in text"""
+    by_chars = math.ceil(len(text) / CHARS_PER_TOKEN)
+    by_words = len(WORD_PATTERN.findall(text))
+    return max(1, by_chars, by_words)
+
+
+def split_by_tokens(text, token_budget):
+    """Split text on line boundaries into segments within token_budget.
+
+    Lines that are longer than the budget on their own are cut by
+    characters.
+    """
+    segments = []
+    lines = []
+    used = 0
+    for line in text.split('\n'):
+        tokens = estimate_tokens(line)
+        if tokens > token_budget:
+            if lines:
+                segments.append('\n'.join(lines))
+                lines, used = [], 0
+            step = token_budget * CHARS_PER_TOKEN
+            segments.extend(line[start:start + step] for start in range(0, len(line), step))
+            continue
+        if lines and used + tokens > token_budget:
+            segments.append('\n'.join(lines))
+            lines, used = [], 0
+        lines.append(line)
+        used += tokens
+    if lines:
+        segments.append('\n'.join(lines))
+    return segments
@@ -0,0 +1,199 @@
+"""Streaming transcript ingest from Snowflake."""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from smart_review.conversations import build_conversations
+from smart_review.metrics import REGISTRY
+
+TRANSCRIPT_COLUMNS = ['bot_name', 'conversation_id', 'mid', 'utterance', 'response', 'datetime']
+
+TRANSCRIPTS_QUERY = """
+SELECT bot_name, conversation_id, mid, utterance, response, datetime
+FROM transcripts
+WHERE bot_name = %(bot_name)s
+AND datetime BETWEEN %(start_date)s AND %(end_date)s
+ORDER BY conversation_id, datetime
+"""
+
+# Half-open range, so adjacent time slices never return the same row twice
+TRANSCRIPTS_RANGE_QUERY = """
+SELECT bot_name, conversation_id, mid, utterance, response, datetime
+FROM transcripts
+WHERE bot_name = %(bot_name)s
+AND datetime >= %(start_date)s AND datetime < %(end_date)s
+ORDER BY conversation_id, datetime
+"""
+
+DEFAULT_BATCH_SIZE = 50_000
+
+
+def connect_to_snowflake():
+    """Establish connection to Snowflake"""
+    # Imported here, as loading the connector takes longer than the rest of the app
+    import snowflake.connector
+    return snowflake.connector.connect(
+        user=os.getenv('SNOWFLAKE_USER'),
+        password=os.getenv('SNOWFLAKE_PASSWORD'),
+        account=os.getenv('SNOWFLAKE_ACCOUNT'),
+        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+        database=os.getenv('SNOWFLAKE_DATABASE'),
+        schema=os.getenv('SNOWFLAKE_SCHEMA')
+    )
+
+
+class ConnectionPool:
+    """A small pool of Snowflake connections reused across fetches.
+
+    Connections are opened lazily, at most size at a time, and returned to
+    the pool after use. A connection that raised or was closed is discarded
+    and replaced by a new one on the next checkout.
+    """
+
+    def __init__(self, size=4, connect=connect_to_snowflake):
+        self.size = size
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with block"""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            self._discard(conn)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._lock:
+                    self._connections.add(conn)
+                return conn
+            if not getattr(conn, 'is_closed', lambda: False)():
+                return conn
+            self._discard(conn)
+
+    def _discard(self, conn):
+        if conn is None:
+            return
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close every connection the pool has opened"""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._idle = queue.LifoQueue()
+
+
+def rebatch(frames, batch_size=DEFAULT_BATCH_SIZE):
+    """Split DataFrames so that no yielded frame exceeds batch_size rows"""
+    for frame in frames:
+        for start in range(0, len(frame), batch_size):
+            yield frame.iloc[start:start + batch_size]
+
+
+def iter_transcript_batches(conn, bot_name, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE,
+                            query=TRANSCRIPTS_QUERY):
+    """Stream transcripts for a bot and date range as DataFrame batches.
+
+    The query uses bind parameters and the connector's Arrow result
+    batches, so only about batch_size rows are held in memory at a time.
+    """
+    cursor = conn.cursor()
+    try:
+        with REGISTRY.context(bot=bot_name), REGISTRY.timed_call('snowflake', 'execute'):
+            cursor.execute(query, {
+                'bot_name': bot_name,
+                'start_date': start_date,
+                'end_date': end_date
+            })
+        for batch in rebatch(_timed_batches(cursor.fetch_pandas_batches(), bot_name), batch_size):
+            # Snowflake returns unquoted identifiers in upper case
+            yield batch.rename(columns=str.lower)
+    finally:
+        cursor.close()
+
+
+def _timed_batches(batches, bot_name):
+    """Record the latency and size of every result batch Snowflake returns"""
+    batches = iter(batches)
+    while True:
+        with REGISTRY.context(bot=bot_name), REGISTRY.timed_call('snowflake', 'fetch_batch'):
+            batch = next(batches, None)
+        if batch is None:
+            return
+        REGISTRY.inc('rows', len(batch), bot=bot_name)
+        yield batch
+
+
+def complete_conversations(batches):
+    """Regroup ordered batches so no conversation is split across two.
+
+    Batches must be ordered by conversation_id, as TRANSCRIPTS_QUERY is. The
+    rows of the last conversation in each batch are held back and prepended
+    to the next batch.
+    """
+    carry = None
+    for batch in batches:
+        if carry is not None:
+            batch = pd.concat([carry, batch], ignore_index=True)
+        if batch.empty:
+            continue
+        last_id = batch['conversation_id'].iloc[-1]
+        is_last = (batch['conversation_id'] == last_id).to_numpy()
+        carry = batch[is_last]
+        if not is_last.all():
+            yield batch[~is_last]
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+def fetch_transcripts(bot_name, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE):
+    """Fetch all transcripts for a bot and date range into one DataFrame"""
+    conn = connect_to_snowflake()
+    try:
+        frames = list(iter_transcript_batches(conn, bot_name, start_date, end_date, batch_size))
+    finally:
+        conn.close()
+    if not frames:
+        return pd.DataFrame(columns=TRANSCRIPT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def stream_conversations(bot_name, start_date, end_date, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream conversation records straight from Snowflake into scoring"""
+    conn = connect_to_snowflake()
+    try:
+        batches = iter_transcript_batches(conn, bot_name, start_date, end_date, batch_size)
+        for frame in complete_conversations(batches):
+            yield from build_conversations(frame)
+    finally:
+        conn.close()
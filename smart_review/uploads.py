@@ -0,0 +1,211 @@
+"""Chunked, typed loading of uploaded transcript files."""
+import codecs
+import json
+import re
+
+import pandas as pd
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from smart_review.transcripts import TRANSCRIPT_COLUMNS
+
+# Explicit dtypes so large files are not type-inferred column by column
+TRANSCRIPT_DTYPES = {
+    'bot_name': 'category',
+    'conversation_id': 'category',
+    'mid': 'string',
+    'utterance': 'string',
+    'response': 'string',
+}
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Bytes of a JSON array file read at a time
+JSON_BLOCK_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(r'\s*')
+
+SUPPORTED_EXTENSIONS = ['csv', 'json', 'jsonl', 'ndjson', 'parquet', 'arrow', 'feather']
+
+
+def validate_columns(columns):
+    """Raise ValueError unless all required transcript columns are present"""
+    missing = [column for column in TRANSCRIPT_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(
+            "File must contain all required columns: " + ', '.join(TRANSCRIPT_COLUMNS)
+            + f" (missing: {', '.join(missing)})"
+        )
+
+
+def normalize_chunk(chunk):
+    """Select the transcript columns, apply dtypes and parse datetime once.
+
+    Datetimes are parsed as ISO 8601, the fast path, and otherwise in
+    whatever format pandas infers, such as MM/DD/YYYY HH:MM.
+    """
+    chunk = chunk[TRANSCRIPT_COLUMNS].astype(TRANSCRIPT_DTYPES)
+    if not pd.api.types.is_datetime64_any_dtype(chunk['datetime']):
+        try:
+            chunk['datetime'] = pd.to_datetime(chunk['datetime'], format='ISO8601')
+        except (ValueError, TypeError):
+            chunk['datetime'] = pd.to_datetime(chunk['datetime'])
+    return chunk
+
+
+def concat_chunks(chunks):
+    """Concatenate normalized chunks, keeping categorical columns categorical"""
+    chunks = list(chunks)
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    columns = {}
+    for column in TRANSCRIPT_COLUMNS:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Series(union_categoricals(parts), name=column)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def iter_chunks(reader):
+    """Validate the first chunk's columns, then normalize every chunk"""
+    validated = False
+    for chunk in reader:
+        if not validated:
+            validate_columns(chunk.columns)
+            validated = True
+        yield normalize_chunk(chunk)
+    if not validated:
+        raise ValueError("File contains no transcripts")
+
+
+def read_csv_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a CSV file as typed transcript chunks"""
+    return iter_chunks(pd.read_csv(file, dtype=TRANSCRIPT_DTYPES, chunksize=chunk_size))
+
+
+def read_ndjson_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a JSON Lines file as typed transcript chunks"""
+    reader = pd.read_json(file, lines=True, chunksize=chunk_size, dtype=False, convert_dates=False)
+    return iter_chunks(reader)
+
+
+def read_parquet_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a Parquet file as typed transcript chunks.
+
+    Columns are validated against the Parquet schema before any row group
+    is read, and only the transcript columns are decoded.
+    """
+    parquet_file = pq.ParquetFile(file)
+    validate_columns(parquet_file.schema_arrow.names)
+    batches = parquet_file.iter_batches(batch_size=chunk_size, columns=TRANSCRIPT_COLUMNS)
+    return iter_chunks(batch.to_pandas() for batch in batches)
+
+
+def read_arrow_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read an Arrow IPC (Feather v2) file as typed transcript chunks"""
+    table = feather.read_table(file, memory_map=False)
+    validate_columns(table.column_names)
+    table = table.select(TRANSCRIPT_COLUMNS)
+    return iter_chunks(batch.to_pandas() for batch in table.to_batches(max_chunksize=chunk_size))
+
+
+def iter_json_array(file, block_size=JSON_BLOCK_SIZE):
+    """Objects of a top-level JSON array, decoded one at a time as the file is read.
+
+    Only the current block and the objects not yet yielded are held in
+    memory, however long the array is.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer, position, eof = '', 0, False
+
+    def read_block():
+        """Append the next block to what is left of the buffer"""
+        nonlocal buffer, position, eof
+        block = file.read(block_size)
+        eof = not block
+        if isinstance(block, bytes):
+            block = text_decoder.decode(block, final=eof)
+        buffer, position = buffer[position:] + block, 0
+
+    def next_char():
+        """First non-whitespace character from position, reading more as needed; '' at the end"""
+        nonlocal position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            read_block()
+
+    if next_char() != '[':
+        raise ValueError("JSON file must contain a list of transcript objects")
+    position += 1
+    if next_char() == ']':
+        return
+    while True:
+        if next_char() != '{':
+            raise ValueError("JSON file must contain a list of transcript objects")
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("JSON file is malformed or truncated") from None
+            # The object continues in the next block
+            read_block()
+            continue
+        position = end
+        yield record
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("JSON file is malformed or truncated")
+        position += 1
+
+
+def read_json_array(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a JSON file holding a list of transcript objects as typed transcript chunks"""
+    def chunks():
+        records = []
+        for record in iter_json_array(file):
+            records.append(record)
+            if len(records) >= chunk_size:
+                yield pd.DataFrame(records)
+                records = []
+        if records:
+            yield pd.DataFrame(records)
+    return iter_chunks(chunks())
+
+
+def is_ndjson(file):
+    """Peek at a .json upload to tell JSON Lines from a JSON array"""
+    head = file.read(4096)
+    file.seek(0)
+    if isinstance(head, bytes):
+        head = head.decode('utf-8', errors='ignore')
+    return head.lstrip()[:1] == '{'
+
+
+def load_transcripts(file, file_name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Load an uploaded transcript file of any supported format.
+
+    Raises ValueError when the file is missing required columns; this is
+    detected on the first chunk, before the rest of the file is read.
+    """
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        chunks = read_csv_chunks(file, chunk_size)
+    elif extension in ('jsonl', 'ndjson') or (extension == 'json' and is_ndjson(file)):
+        chunks = read_ndjson_chunks(file, chunk_size)
+    elif extension == 'json':
+        chunks = read_json_array(file, chunk_size)
+    elif extension == 'parquet':
+        chunks = read_parquet_chunks(file, chunk_size)
+    elif extension in ('arrow', 'feather'):
+        chunks = read_arrow_chunks(file, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file type: .{extension}")
+    return concat_chunks(chunks)
@@ -0,0 +1,106 @@
+"""Streamlit components shared by the pages."""
+import pandas as pd
+import streamlit as st
+
+from smart_review.frames import format_bytes, memory_bytes
+from smart_review.preview import (
+    DEFAULT_PAGE_SIZE,
+    PAGE_SIZES,
+    filter_options,
+    frame_summary,
+    matching_rows,
+    page_count,
+    page_of,
+)
+from smart_review.state import frame_key
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _summary(key, _df):
+    return len(_df), memory_bytes(_df), frame_summary(_df)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _filter_options(key, column, _df):
+    return filter_options(_df, column)
+
+
+@st.cache_resource(max_entries=16, show_spinner="Filtering...")
+def _matching_rows(key, search, filters, _df):
+    """Row positions shared by reference, so a rerun does not copy them"""
+    return matching_rows(_df, search, filters)
+
+
+def _column_filter(df, key, column, widget_key):
+    """Widget for one column's filter; returns the filter tuple or None"""
+    options = _filter_options(key, column, df)
+    if options is None:
+        st.caption(f"{column} cannot be filtered")
+        return None
+    kind, choices = options
+    if kind == 'values':
+        selected = st.multiselect(column, choices, key=f"{widget_key}_{column}")
+        return (column, 'values', tuple(selected)) if selected else None
+    low, high = choices
+    if isinstance(low, pd.Timestamp):
+        dates = st.date_input(column, value=(low.date(), high.date()), min_value=low.date(),
+                              max_value=high.date(), key=f"{widget_key}_{column}")
+        if len(dates) != 2 or tuple(dates) == (low.date(), high.date()):
+            return None
+        start = pd.Timestamp(dates[0], tz=low.tz)
+        end = pd.Timestamp(dates[1], tz=low.tz) + pd.Timedelta(days=1) - pd.Timedelta(1)
+        return column, 'range', (start, end)
+    selected = st.slider(column, min_value=float(low), max_value=float(high), value=(float(low), float(high)),
+                         key=f"{widget_key}_{column}")
+    if selected == (float(low), float(high)):
+        return None
+    return column, 'range', selected
+
+
+def frame_preview(name, widget_key=None):
+    """One page of st.session_state[name], with search, filters and a summary.
+
+    Only the requested page is sent to the browser. The summary, filter
+    choices and matching rows are cached on the frame's content hash, so a
+    rerun costs about one page whatever the size of the frame.
+    """
+    df = st.session_state.get(name)
+    if df is None:
+        return
+    widget_key = widget_key or f"preview_{name}"
+    key = frame_key(name)
+
+    rows, size, summary = _summary(key, df)
+    st.caption(f"{rows:,} rows, {len(df.columns)} columns, {format_bytes(size)}")
+    with st.expander("Columns"):
+        st.dataframe(summary)
+
+    search_column, filter_column = st.columns(2)
+    search = search_column.text_input("Search", key=f"{widget_key}_search", placeholder="Text in any column").strip()
+    filter_columns = filter_column.multiselect("Filter by", list(df.columns), key=f"{widget_key}_filter_columns")
+    filters = []
+    for column in filter_columns:
+        column_filter = _column_filter(df, key, column, widget_key)
+        if column_filter is not None:
+            filters.append(column_filter)
+
+    matches = _matching_rows(key, search, tuple(filters), df)
+    total = rows if matches is None else len(matches)
+
+    size_column, page_column = st.columns(2)
+    page_size = size_column.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                      key=f"{widget_key}_page_size")
+    pages = page_count(total, page_size)
+    # Narrower filters can leave the chosen page past the last one
+    if st.session_state.get(f"{widget_key}_page", 1) > pages:
+        st.session_state[f"{widget_key}_page"] = pages
+    page = page_column.number_input("Page", min_value=1, max_value=pages, key=f"{widget_key}_page",
+                                    help=f"{pages:,} page(s)")
+
+    st.dataframe(page_of(df, matches, page, page_size))
+    if total:
+        start = (page - 1) * page_size
+        note = f" matching, of {rows:,}" if matches is not None else ""
+        st.caption(f"Rows {start + 1:,}–{min(start + page_size, total):,} of {total:,}{note}, page {page:,} of {pages:,}")
+    else:
+        st.caption("No rows match")
@@ -0,0 +1,428 @@
+"""Durable SQLite work queue that lets several worker processes share a scoring job.
+
+The queue scales a job across the cores of one host only. Spreading
+workers over several machines needs a networked store behind the same
+lease, heartbeat and complete operations, and is not supported yet.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import partial
+
+from smart_review.jobs import _json_default, rows_to_frame
+from smart_review.scoring import DEFAULT_INPUT_TOKEN_BUDGET, analyze_conversation, score_conversations, score_row
+
+DEFAULT_QUEUE_PATH = os.getenv('SMART_REVIEW_QUEUE_PATH', os.path.join('.smart_review', 'queue.sqlite'))
+
+DEFAULT_QUEUE_BATCH_SIZE = 100
+
+# A batch whose worker has not renewed its lease for this long is handed to
+# another worker
+DEFAULT_LEASE_SECONDS = 300
+
+# A batch that has been claimed this many times without completing is failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+# How long an idle worker waits before looking for work again
+DEFAULT_POLL_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    conversations INTEGER NOT NULL DEFAULT 0,
+    batches INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batches (
+    job_id TEXT NOT NULL,
+    batch_no INTEGER NOT NULL,
+    conversations TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, batch_no)
+);
+CREATE INDEX IF NOT EXISTS batches_claim ON batches (status, lease_expires);
+CREATE TABLE IF NOT EXISTS queued (
+    job_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    PRIMARY KEY (job_id, conversation_id)
+);
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    row TEXT NOT NULL,
+    PRIMARY KEY (job_id, conversation_id)
+);
+"""
+
+
+def worker_name():
+    """Identifier of this worker, unique across hosts and processes"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """A batch claimed by one worker until lease_expires"""
+
+    def __init__(self, job_id, batch_no, conversations, settings, owner, attempts):
+        self.job_id = job_id
+        self.batch_no = batch_no
+        self.conversations = conversations
+        self.settings = settings
+        self.owner = owner
+        self.attempts = attempts
+
+
+class WorkQueue:
+    """Scoring jobs split into batches of conversations, stored in SQLite.
+
+    A submitter adds a job's conversations in batches. Workers claim a
+    batch with a lease, renew the lease while they score it and complete
+    it with the score rows. A batch whose lease expires, because its worker
+    died or stalled, is claimed again by the next worker; after max_attempts
+    claims it is marked failed. Every worker opens the same database file.
+
+    The database is in WAL mode, which needs memory shared between the
+    processes using it, so all workers must run on the host that holds it,
+    on a local disk. On a network file system such as NFS or SMB locking is
+    unreliable and the leases no longer keep workers apart.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, statements):
+        """Run statements(conn) inside one write transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, job_id, conversations, settings=None, batch_size=DEFAULT_QUEUE_BATCH_SIZE):
+        """Add conversations to job_id in batches of batch_size.
+
+        conversations may be a lazy iterable. Conversations already queued
+        for the job are skipped, so a submission can be repeated or
+        extended; conversations that failed to score are queued again.
+        Returns the number of conversations added.
+        """
+        settings = json.dumps(settings or {})
+        self._transaction(lambda conn: conn.execute(
+            "INSERT INTO jobs (job_id, settings, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET settings = excluded.settings",
+            (job_id, settings, time.time())
+        ))
+        added = 0
+        batch = []
+        for conversation in conversations:
+            batch.append(conversation)
+            if len(batch) >= batch_size:
+                added += self._add_batch(job_id, batch)
+                batch = []
+        if batch:
+            added += self._add_batch(job_id, batch)
+        return added
+
+    def _add_batch(self, job_id, batch):
+        def add(conn):
+            new = [
+                conversation for conversation in batch
+                if conn.execute(
+                    "INSERT OR IGNORE INTO queued (job_id, conversation_id) VALUES (?, ?)",
+                    (job_id, str(conversation['conversation_id']))
+                ).rowcount == 1
+            ]
+            if not new:
+                return 0
+            batch_no = conn.execute("SELECT batches FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+            conn.execute(
+                "INSERT INTO batches (job_id, batch_no, conversations, size, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, batch_no, json.dumps(new, default=_json_default), len(new), time.time())
+            )
+            conn.execute(
+                "UPDATE jobs SET batches = batches + 1, conversations = conversations + ? WHERE job_id = ?",
+                (len(new), job_id)
+            )
+            return len(new)
+
+        return self._transaction(add)
+
+    def claim(self, owner, job_id=None):
+        """Lease the next pending or expired batch to owner, or return None"""
+        now = time.time()
+
+        def claim_next(conn):
+            # Batches that used up their attempts are failed rather than retried forever
+            conn.execute(
+                "UPDATE batches SET status = 'failed', error = COALESCE(error, 'lease expired too many times'), "
+                "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            query = (
+                "SELECT b.job_id, b.batch_no, b.conversations, b.attempts, j.settings "
+                "FROM batches b JOIN jobs j ON j.job_id = b.job_id "
+                "WHERE (b.status = 'pending' OR (b.status = 'leased' AND b.lease_expires < ?))"
+            )
+            params = [now]
+            if job_id is not None:
+                query += " AND b.job_id = ?"
+                params.append(job_id)
+            row = conn.execute(query + " ORDER BY j.created_at, b.batch_no LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            claimed_job, batch_no, conversations, attempts, settings = row
+            conn.execute(
+                "UPDATE batches SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = ?, updated_at = ? "
+                "WHERE job_id = ? AND batch_no = ?",
+                (owner, now + self.lease_seconds, attempts + 1, now, claimed_job, batch_no)
+            )
+            return Lease(claimed_job, batch_no, json.loads(conversations), json.loads(settings), owner, attempts + 1)
+
+        return self._transaction(claim_next)
+
+    def renew(self, lease):
+        """Extend a lease; False if another worker has taken the batch over"""
+        def extend(conn):
+            cursor = conn.execute(
+                "UPDATE batches SET lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ? AND batch_no = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, time.time(), lease.job_id, lease.batch_no, lease.owner)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(extend)
+
+    def complete(self, lease, rows, failed_ids=(), error=None):
+        """Store a batch's score rows and mark it done.
+
+        failed_ids are the conversations that could not be scored; they are
+        forgotten so that submitting the job again queues them again. Rows
+        are stored even if the lease was lost, since scores do not depend on
+        which worker produced them; storing one twice is harmless.
+        """
+        now = time.time()
+        failed_ids = [str(conversation_id) for conversation_id in failed_ids]
+
+        def finish(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (job_id, conversation_id, row) VALUES (?, ?, ?)",
+                [(lease.job_id, str(row['conversation_id']), json.dumps(row, default=_json_default)) for row in rows]
+            )
+            conn.executemany(
+                "DELETE FROM queued WHERE job_id = ? AND conversation_id = ?",
+                [(lease.job_id, conversation_id) for conversation_id in failed_ids]
+            )
+            conn.execute(
+                "UPDATE batches SET status = 'done', failures = ?, error = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE job_id = ? AND batch_no = ? AND status != 'done'",
+                (len(failed_ids), error, now, lease.job_id, lease.batch_no)
+            )
+
+        self._transaction(finish)
+
+    def release(self, lease, error):
+        """Give a batch back after an error, failing it once out of attempts"""
+        status = 'failed' if lease.attempts >= self.max_attempts else 'pending'
+
+        def give_back(conn):
+            conn.execute(
+                "UPDATE batches SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE job_id = ? AND batch_no = ? AND lease_owner = ?",
+                (status, str(error), time.time(), lease.job_id, lease.batch_no, lease.owner)
+            )
+
+        self._transaction(give_back)
+
+    def retry_failed(self, job_id):
+        """Queue a job's failed batches again with fresh attempts"""
+        def retry(conn):
+            return conn.execute(
+                "UPDATE batches SET status = 'pending', attempts = 0, error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = 'failed'",
+                (time.time(), job_id)
+            ).rowcount
+
+        return self._transaction(retry)
+
+    def progress(self, job_id):
+        """Batch, conversation and worker counts of a job"""
+        now = time.time()
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT conversations, batches FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict.fromkeys(['pending', 'leased', 'done', 'failed'], 0)
+            for status, count in self._conn.execute(
+                "SELECT status, COUNT(*) FROM batches WHERE job_id = ? GROUP BY status", (job_id,)
+            ):
+                counts[status] = count
+            scored, failures = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM results WHERE job_id = ?), "
+                "COALESCE((SELECT SUM(failures) FROM batches WHERE job_id = ?), 0)",
+                (job_id, job_id)
+            ).fetchone()
+            workers = self._conn.execute(
+                "SELECT COUNT(DISTINCT lease_owner) FROM batches WHERE job_id = ? AND status = 'leased' AND lease_expires >= ?",
+                (job_id, now)
+            ).fetchone()[0]
+        return {
+            'conversations': job[0],
+            'batches': job[1],
+            'scored': scored,
+            'failures': failures,
+            'workers': workers,
+            **counts,
+        }
+
+    def jobs(self):
+        """IDs of all jobs, newest first"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT job_id FROM jobs ORDER BY created_at DESC")]
+
+    def results(self, job_id):
+        """Score rows stored for a job, as dicts"""
+        with self._lock:
+            rows = self._conn.execute("SELECT row FROM results WHERE job_id = ?", (job_id,)).fetchall()
+        return [json.loads(row) for (row,) in rows]
+
+    def to_frame(self, job_id):
+        """A job's score rows as a scores DataFrame, or None if there are none"""
+        rows = self.results(job_id)
+        return rows_to_frame(rows) if rows else None
+
+    def close(self):
+        self._conn.close()
+
+
+@dataclass
+class WorkerStats:
+    """What one worker has done since it started"""
+    batches: int = 0
+    conversations: int = 0
+    failures: int = 0
+
+    def __str__(self):
+        return f"{self.batches:,} batches, {self.conversations:,} conversations scored, {self.failures:,} failed"
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a lease every third of the lease time until stopped"""
+
+    def __init__(self, queue, lease):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.renew(self.lease):
+                    return
+            except sqlite3.Error:
+                continue
+
+
+def score_lease(queue, bedrock, lease, cache=None, max_workers=8, requests_per_second=5.0, rollups=None):
+    """Score a claimed batch and complete it; returns (scored, failed) counts.
+
+    The lease is renewed in the background while the batch is scored. A
+    batch in which nothing could be scored is released for another attempt
+    instead of completed. A completed batch's rows are merged into rollups
+    (a smart_review.rollups.RollupStore) when given.
+    """
+    settings = lease.settings
+    input_token_budget = settings.get('input_token_budget', DEFAULT_INPUT_TOKEN_BUDGET)
+    heartbeat = _Heartbeat(queue, lease)
+    heartbeat.start()
+    rows, failed_ids, error = [], [], None
+    try:
+        scored = score_conversations(
+            bedrock,
+            lease.conversations,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            cache=cache,
+            pack_token_budget=settings.get('pack_token_budget'),
+            analyze=partial(analyze_conversation, input_token_budget=input_token_budget),
+            input_token_budget=input_token_budget
+        )
+        for conversation, analysis, conversation_error in scored:
+            if conversation_error is None:
+                rows.append(score_row(conversation, analysis))
+            else:
+                failed_ids.append(conversation['conversation_id'])
+                error = str(conversation_error)
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+
+    if lease.conversations and not rows:
+        queue.release(lease, error)
+    else:
+        queue.complete(lease, rows, failed_ids, error)
+        if rollups is not None:
+            rollups.merge(rows)
+    return len(rows), len(failed_ids)
+
+
+def run_worker(queue, bedrock, job_id=None, max_workers=8, requests_per_second=5.0, cache=None,
+               poll_seconds=DEFAULT_POLL_SECONDS, exit_when_empty=False, stop=None, owner=None, on_batch=None,
+               rollups=None):
+    """Claim and score batches until stopped.
+
+    Only batches of job_id are taken when it is given. With
+    exit_when_empty the worker returns as soon as no batch is available;
+    otherwise it polls every poll_seconds until stop (a threading.Event)
+    is set. on_batch(lease, scored, failed) is called after each batch.
+    Scored rows are merged into rollups when given.
+    """
+    owner = owner or worker_name()
+    stop = stop or threading.Event()
+    stats = WorkerStats()
+    while not stop.is_set():
+        lease = queue.claim(owner, job_id)
+        if lease is None:
+            if exit_when_empty:
+                break
+            stop.wait(poll_seconds)
+            continue
+        try:
+            scored, failed = score_lease(queue, bedrock, lease, cache, max_workers, requests_per_second, rollups)
+        except BaseException as e:
+            # Hand the batch back at once instead of waiting for the lease to expire
+            queue.release(lease, repr(e))
+            raise
+        stats.batches += 1
+        stats.conversations += scored
+        stats.failures += failed
+        if on_batch is not None:
+            on_batch(lease, scored, failed)
+    return stats
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the smart_review package importable when running plain `pytest`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
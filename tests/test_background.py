@@ -0,0 +1,42 @@
+import threading
+
+from smart_review.background import RunRegistry
+
+
+def results(count, release=None):
+    for i in range(count):
+        if release is not None:
+            release.wait()
+        conversation = {'conversation_id': f'conv{i}'}
+        if i % 4 == 3:
+            yield conversation, None, ValueError('bad json')
+        else:
+            yield conversation, {'conversation_id': f'conv{i}'}, None
+
+
+def test_run_counts_results_and_stops_when_converged():
+    registry = RunRegistry()
+    run, started = registry.start('job', lambda run: run.consume(results(100), converged=lambda row: run.done >= 10), total=100)
+    assert started
+    assert run.wait(5)
+    assert run.status == 'finished'
+    assert run.done == 10
+    assert run.failures == 2
+    assert run.errors[0] == ('conv3', 'bad json')
+
+
+def test_registry_attaches_to_running_job_and_stop_ends_it():
+    registry = RunRegistry()
+    release = threading.Event()
+    run, started = registry.start('job', lambda run: run.consume(results(1000, release)))
+    again, started_again = registry.start('job', lambda run: None)
+    assert started and not started_again
+    assert again is run
+    assert registry.active() == [run]
+
+    run.stop()
+    release.set()
+    assert run.wait(5)
+    assert run.status == 'stopped'
+    assert run.done == 1
+    assert registry.active() == []
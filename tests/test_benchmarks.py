@@ -0,0 +1,14 @@
+from benchmarks.run_benchmarks import format_report, run_benchmark
+
+
+def test_offline_benchmark_runs_every_stage():
+    result = run_benchmark(rows=2000, latency=0.0, jitter=0.0, throttle_rate=0.05, malformed_rate=0.05)
+
+    fetch, score, export = result['stages']
+    assert fetch.items == result['config']['conversations'] == 500
+    assert score.items + result['bedrock']['failed_conversations'] == 500
+    # Malformed replies are repaired, so only a malformed repair fails a conversation
+    assert result['bedrock']['failed_conversations'] < result['bedrock']['malformed']
+    assert export.items == score.items
+    assert all(stage.bytes_moved > 0 and stage.process_peak_rss_mb > 0 for stage in result['stages'])
+    assert 'score' in format_report(result)
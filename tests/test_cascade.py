@@ -0,0 +1,107 @@
+import io
+import json
+
+from botocore.exceptions import ClientError
+
+from benchmarks.fakes import messages_response, request_prompt
+from smart_review.cascade import CHEAP_MODEL_ID, ModelCascade, escalation_reason
+from smart_review.jobs import ScoringJob
+from smart_review.pipeline import score_records
+from smart_review.scoring import MODEL_ID, SYSTEM_PROMPT
+
+
+class CascadeBedrock:
+    """Bedrock stand-in whose cheap model answers according to the conversation text"""
+
+    def __init__(self):
+        self.calls = []
+        self.throttled = False
+
+    def invoke_model(self, modelId, body):
+        prompt = request_prompt(body)
+        self.calls.append(modelId)
+        if modelId == MODEL_ID and 'throttled' in prompt and not self.throttled:
+            self.throttled = True
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'slow down'}}, 'InvokeModel')
+        analysis = {'summary': 'ok', 'satisfaction_score': 5, 'accuracy_score': 5,
+                    'relevancy_score': 4, 'containment_score': 5}
+        if modelId == CHEAP_MODEL_ID:
+            analysis['confidence'] = 0.3 if 'unsure' in prompt else 0.95
+            if 'borderline' in prompt:
+                analysis.update(satisfaction_score=3, accuracy_score=3, relevancy_score=3, containment_score=3)
+            if 'garbled' in prompt:
+                return {'body': io.BytesIO(messages_response(body, 'Sure! Here you go.'))}
+        return {'body': io.BytesIO(messages_response(body, json.dumps(analysis)))}
+
+
+def test_escalation_reason():
+    clear = {'satisfaction_score': 5, 'accuracy_score': 4, 'relevancy_score': 5, 'containment_score': 5}
+    assert escalation_reason(dict(clear, confidence=0.9)) is None
+    assert escalation_reason(clear) is None
+    assert escalation_reason(dict(clear, confidence=0.2)) == 'low_confidence'
+    assert escalation_reason(dict(clear, satisfaction_score=1, accuracy_score=1), min_confidence=None) == 'ambiguous'
+    assert escalation_reason(dict(clear, confidence=0.2), ambiguous_band=None, min_confidence=None) is None
+
+
+def test_cascade_escalates_only_unsure_conversations(tmp_path):
+    texts = ['User: thanks, all fixed'] * 5 + ['User: unsure', 'User: borderline', 'User: garbled']
+    records = [
+        {'conversation_id': f'conv{i}', 'bot_name': 'SupportBot', 'datetime': None, 'text': text}
+        for i, text in enumerate(texts)
+    ]
+    bedrock = CascadeBedrock()
+    cascade = ModelCascade((CHEAP_MODEL_ID, MODEL_ID))
+    job = ScoringJob('cascade', jobs_dir=str(tmp_path))
+
+    results = list(score_records(bedrock, records, job, max_workers=2, requests_per_second=1000, cascade=cascade))
+
+    assert all(error is None for _, _, error in results)
+    models = {conversation['text']: row['model_id'] for conversation, row, _ in results}
+    assert models['User: thanks, all fixed'] == CHEAP_MODEL_ID
+    assert models['User: unsure'] == models['User: borderline'] == models['User: garbled'] == MODEL_ID
+    assert bedrock.calls.count(MODEL_ID) == 3
+
+    frame = cascade.stats.to_frame()
+    assert frame.loc[0, 'conversations'] == 8
+    assert frame.loc[0, 'escalated'] == 3
+    assert frame.loc[0, ['parse_failure', 'ambiguous', 'low_confidence']].tolist() == [1, 1, 1]
+    assert frame.loc[1, 'share_reached'] == 3 / 8
+    savings = cascade.stats.savings()
+    assert 0 < savings['cost'] < savings['baseline_cost']
+    job.close()
+
+
+def test_parse_failures_are_charged_to_the_escalated_answer():
+    from smart_review.scoring import analyze_conversation
+    from smart_review.tokens import estimate_tokens
+
+    cascade = ModelCascade((CHEAP_MODEL_ID, MODEL_ID))
+    analysis = cascade(CascadeBedrock(), 'User: garbled')
+    direct = analyze_conversation(CascadeBedrock(), 'User: garbled', model_id=MODEL_ID)
+
+    assert analysis['model_id'] == MODEL_ID
+    assert analysis['input_tokens'] == estimate_tokens('User: garbled') + direct['input_tokens']
+    assert analysis['output_tokens'] == direct['output_tokens']
+
+
+def test_retried_cascade_is_counted_once(tmp_path, monkeypatch):
+    monkeypatch.setattr('smart_review.scoring.backoff_delay', lambda attempt: 0)
+    records = [{'conversation_id': 'conv0', 'bot_name': 'SupportBot', 'datetime': None, 'text': 'User: unsure, throttled'}]
+    bedrock = CascadeBedrock()
+    cascade = ModelCascade((CHEAP_MODEL_ID, MODEL_ID))
+    job = ScoringJob('cascade', jobs_dir=str(tmp_path))
+
+    results = list(score_records(bedrock, records, job, requests_per_second=1000, cascade=cascade))
+
+    assert results[0][1]['model_id'] == MODEL_ID
+    assert bedrock.calls == [CHEAP_MODEL_ID, MODEL_ID, CHEAP_MODEL_ID, MODEL_ID]
+    frame = cascade.stats.to_frame()
+    assert frame['conversations'].tolist() == [1, 1]
+    assert frame.loc[0, 'low_confidence'] == 1
+    job.close()
+
+
+def test_cache_id_depends_on_the_confidence_prompt(monkeypatch):
+    cache_id = ModelCascade().cache_id
+    monkeypatch.setattr('smart_review.cascade.CONFIDENCE_SYSTEM_PROMPT', SYSTEM_PROMPT + ' Be strict.')
+    assert ModelCascade().cache_id != cache_id
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+from smart_review.clients import get_bedrock_client, get_s3_client
+
+
+def test_clients_share_a_tuned_connection_pool(monkeypatch):
+    monkeypatch.setenv('AWS_REGION', 'eu-west-1')
+    for client in (get_bedrock_client(max_pool_connections=32), get_s3_client(max_pool_connections=32)):
+        assert client.meta.config.max_pool_connections == 32
+        assert client.meta.config.tcp_keepalive
+        assert client.meta.region_name == 'eu-west-1'
+
+
+def test_heavy_sdks_are_imported_on_first_use():
+    code = (
+        "import sys, smart_review.pipeline, smart_review.sync, smart_review.incremental, smart_review.cli; "
+        "print(sorted(name for name in ('boto3', 'botocore', 'snowflake.connector') if name in sys.modules))"
+    )
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from smart_review.conversations import build_conversations
+
+
+def test_build_conversations_interleaves_turns_in_time_order():
+    start = datetime(2024, 1, 1, 12, 0)
+    df = pd.DataFrame({
+        'bot_name': ['SupportBot', 'SalesBot', 'SupportBot'],
+        'conversation_id': ['conv1', 'conv2', 'conv1'],
+        'mid': ['m2', 'm3', 'm1'],
+        'utterance': ['Second question', 'Hello', 'First question'],
+        'response': ['Second answer', 'Hi there', 'First answer'],
+        'datetime': [start + timedelta(minutes=5), start, start]
+    })
+    conversations = {conv['conversation_id']: conv for conv in build_conversations(df)}
+
+    assert set(conversations) == {'conv1', 'conv2'}
+    assert conversations['conv1']['text'] == (
+        "Bot: SupportBot\n"
+        "User: First question\nBot: First answer\n"
+        "User: Second question\nBot: Second answer"
+    )
+    assert conversations['conv1']['datetime'] == pd.Timestamp(start)
+    assert conversations['conv2']['bot_name'] == 'SalesBot'
+
+
+def test_build_conversations_handles_missing_text_and_empty_frames():
+    df = pd.DataFrame({
+        'bot_name': ['SupportBot'],
+        'conversation_id': ['conv1'],
+        'mid': ['m1'],
+        'utterance': ['Anyone there?'],
+        'response': [None],
+        'datetime': [datetime(2024, 1, 1)]
+    })
+    conversations = list(build_conversations(df))
+    assert conversations[0]['text'] == "Bot: SupportBot\nUser: Anyone there?\nBot: "
+    assert list(build_conversations(df.iloc[0:0])) == []
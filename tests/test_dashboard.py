@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from smart_review.dashboard import bucket_frequency, compute_dashboard
+
+
+def make_scores(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'conversation_id': [f'conv{i}' for i in range(rows)],
+        'bot_name': rng.choice(['SupportBot', 'SalesBot'], rows),
+        'datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(rows) * 60, unit='s'),
+        'summary': 'ok',
+        'satisfaction_score': rng.integers(1, 6, rows),
+        'accuracy_score': rng.integers(1, 6, rows),
+        'relevancy_score': rng.integers(1, 6, rows),
+        'containment_score': rng.integers(1, 6, rows)
+    })
+
+
+def test_trends_are_bucketed_to_the_point_budget():
+    df = make_scores(10_000)
+    dashboard = compute_dashboard(df, max_points=200)
+
+    trends = dashboard['trends']
+    assert len(trends) <= 200
+    assert trends['count'].sum() == len(df)
+    assert dashboard['trend_frequency'] == bucket_frequency(df['datetime'].min(), df['datetime'].max(), 200)
+    assert dashboard['value_counts']['accuracy_score'].sum() == len(df)
+    assert np.isclose(dashboard['means']['accuracy_score'], df['accuracy_score'].mean())
+
+
+def test_small_frames_keep_raw_points():
+    dashboard = compute_dashboard(make_scores(50), max_points=200)
+    assert len(dashboard['trends']) == 50
+    assert dashboard['trend_frequency'] is None
+
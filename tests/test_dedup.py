@@ -0,0 +1,71 @@
+import io
+import json
+
+import pandas as pd
+
+from benchmarks.fakes import messages_response
+from smart_review.dedup import Deduplicator
+from smart_review.jobs import ScoringJob
+from smart_review.pipeline import score_records
+
+FAQ = ("Bot: SupportBot\nUser: hi, how do I reset my password?\n"
+       "Bot: Go to Settings, choose Security and click Reset password. "
+       "We will email you a link that is valid for 24 hours.\nUser: thanks\nBot: You're welcome!")
+
+
+def conversation(conversation_id, text, bot_name='SupportBot'):
+    return {
+        'conversation_id': conversation_id,
+        'bot_name': bot_name,
+        'datetime': pd.Timestamp('2024-01-01'),
+        'text': text
+    }
+
+
+class CountingBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, modelId, body):
+        self.calls += 1
+        completion = json.dumps({'summary': 'ok', 'satisfaction_score': 5, 'accuracy_score': 4,
+                                 'relevancy_score': 4, 'containment_score': 3})
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+def test_near_duplicates_join_their_representative():
+    dedup = Deduplicator(threshold=0.7)
+    assert dedup.assign(conversation('a', FAQ)) == ('a', True)
+    assert dedup.assign(conversation('b', FAQ.replace('24 hours', '48 hours').upper())) == ('a', False)
+    assert dedup.assign(conversation('c', FAQ.replace("You're welcome!", "You're welcome, have a great day!"))) == ('a', False)
+    assert dedup.assign(conversation('d', FAQ, bot_name='SalesBot')) == ('d', True)
+    assert dedup.assign(conversation('e', "Bot: SupportBot\nUser: where is my order?\nBot: It ships tomorrow.")) == ('e', True)
+
+    assert dedup.stats.clusters == 3
+    assert dedup.stats.exact_duplicates == 1
+    assert dedup.stats.near_duplicates == 1
+    assert dedup.stats.calls_saved == 2
+
+
+def test_score_records_scores_one_representative_per_cluster(tmp_path):
+    records = [conversation(f'faq{i}', FAQ.replace('24', str(i))) for i in range(40)]
+    records += [conversation(f'other{i}', f"Bot: SupportBot\nUser: {word} question\nBot: {word} answer")
+                for i, word in enumerate(['billing', 'shipping', 'returns'])]
+    bedrock = CountingBedrock()
+    job = ScoringJob('dedup', str(tmp_path))
+    dedup = Deduplicator()
+
+    results = list(score_records(bedrock, records, job, requests_per_second=1000, dedup=dedup))
+    job.close()
+
+    assert bedrock.calls == 4
+    assert dedup.stats.calls_saved == 39
+    assert len(results) == len(records)
+    assert all(error is None for _, _, error in results)
+
+    scores = job.to_frame()
+    assert len(scores) == len(records)
+    faq = scores[scores['conversation_id'].str.startswith('faq')]
+    assert faq['cluster_id'].nunique() == 1
+    assert (faq['satisfaction_score'] == 5).all()
+    assert faq['input_tokens'].fillna(0).eq(0).sum() >= 39
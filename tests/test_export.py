@@ -0,0 +1,199 @@
+import gzip
+import io
+import json
+import threading
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from botocore.exceptions import ClientError
+
+from smart_review.export import export_partitioned, read_partition
+from smart_review.incremental import compact_export, export_incremental
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls used by the exporter"""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.completed_uploads = 0
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body.encode() if isinstance(Body, str) else bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = f'upload-{len(self.uploads)}'
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(parts)
+        self.objects[Key] = b''.join(parts[number] for number in numbers)
+        self.completed_uploads += 1
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete['Objects']:
+            self.objects.pop(entry['Key'], None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + 2]
+        response = {'Contents': [{'Key': key} for key in page], 'IsTruncated': start + 2 < len(keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + 2)
+        return response
+
+
+class FailingS3(FakeS3):
+    """FakeS3 that fails to write partitions after the first few"""
+
+    def __init__(self, fail_after):
+        super().__init__()
+        self.fail_after = fail_after
+        self.partitions_written = 0
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        if '/delta=' in Key:
+            if self.partitions_written >= self.fail_after:
+                raise ClientError({'Error': {'Code': 'InternalError'}}, 'PutObject')
+            self.partitions_written += 1
+        super().put_object(Bucket, Key, Body, ContentType)
+
+
+@pytest.fixture
+def scores():
+    rows = 3000
+    return pd.DataFrame({
+        'conversation_id': [f'conv{i}' for i in range(rows)],
+        'bot_name': ['SupportBot', 'SalesBot'] * (rows // 2),
+        'datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(range(rows), unit='min'),
+        'summary': ['Customer needed help with an order ' * 3] * rows,
+        'satisfaction_score': 4,
+        'accuracy_score': 5,
+        'relevancy_score': 3,
+        'containment_score': 2
+    })
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'ndjson.gz'])
+def test_export_partitioned_writes_partitions_and_manifest(scores, export_format):
+    s3 = FakeS3()
+    manifest = export_partitioned(s3, scores, 'bucket', 'exports/run1', export_format, part_size=1024)
+
+    stored = json.loads(s3.objects['exports/run1/_manifest.json'])
+    assert stored == manifest
+    assert manifest['rows'] == len(scores)
+    # Three calendar days for each of the two bots
+    assert len(manifest['partitions']) == 6
+    # Partitions larger than one part went through multipart uploads
+    assert s3.completed_uploads == sum(partition['bytes'] >= 1024 for partition in manifest['partitions']) > 0
+    assert not s3.uploads
+
+    total = 0
+    for partition in manifest['partitions']:
+        body = s3.objects[partition['key']]
+        assert len(body) == partition['bytes']
+        assert f"bot_name={partition['bot_name']}/date={partition['date']}/" in partition['key']
+        if export_format == 'parquet':
+            frame = pq.read_table(io.BytesIO(body)).to_pandas()
+        else:
+            frame = pd.read_json(io.BytesIO(gzip.decompress(body)), lines=True)
+        assert len(frame) == partition['rows']
+        total += len(frame)
+    assert total == len(scores)
+
+
+def read_current(s3, manifest):
+    """Current row of every conversation: the one in the highest delta"""
+    frames = [
+        read_partition(s3.objects[partition['key']], manifest['format']).assign(delta=delta['version'])
+        for delta in manifest['deltas'] for partition in delta['partitions']
+    ]
+    df = pd.concat(frames).sort_values('delta').drop_duplicates('conversation_id', keep='last')
+    return df.set_index('conversation_id').sort_index()
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'ndjson.gz'])
+def test_incremental_export_uploads_only_changes_and_compacts(scores, export_format, tmp_path):
+    s3 = FakeS3()
+    first = export_incremental(s3, scores.iloc[:2000], 'bucket', 'scores', export_format, state_dir=str(tmp_path / 'a'))
+    assert (first.version, first.uploaded) == (1, 2000)
+
+    # Exporting the same rows again, even from a host without the local state, uploads nothing
+    objects = dict(s3.objects)
+    again = export_incremental(s3, scores.iloc[:2000], 'bucket', 'scores', export_format, state_dir=str(tmp_path / 'b'))
+    assert (again.version, again.uploaded, again.unchanged) == (1, 0, 2000)
+    assert s3.objects == objects
+
+    # Rescored and newly scored conversations go into the next delta
+    updated = scores.copy()
+    updated.loc[:9, 'satisfaction_score'] = 1
+    second = export_incremental(s3, updated, 'bucket', 'scores', export_format, state_dir=str(tmp_path / 'a'))
+    assert (second.version, second.uploaded, second.unchanged) == (2, 1010, 1990)
+    assert second.manifest['rows'] == len(scores)
+
+    current = read_current(s3, second.manifest)
+    assert len(current) == len(scores)
+    assert (current.loc[[f'conv{i}' for i in range(10)], 'satisfaction_score'] == 1).all()
+
+    old_keys = [partition['key'] for delta in second.manifest['deltas'] for partition in delta['partitions']]
+    manifest = compact_export(s3, 'bucket', 'scores', state_dir=str(tmp_path / 'b'))
+    assert manifest['version'] == 3
+    assert [delta['rows'] for delta in manifest['deltas']] == [len(scores)]
+    assert not any(key in s3.objects for key in old_keys)
+    compacted = read_current(s3, manifest)
+    pd.testing.assert_frame_equal(compacted.drop(columns='delta'), current.drop(columns='delta'), check_dtype=False)
+
+    # The compacted export is still the baseline for the next one
+    assert export_incremental(s3, updated, 'bucket', 'scores', export_format, state_dir=str(tmp_path / 'a')).uploaded == 0
+
+
+def test_conversation_repeated_across_chunks_is_exported_once(scores, tmp_path):
+    s3 = FakeS3()
+    rescored = scores.iloc[1000:1500].assign(satisfaction_score=1)
+    chunks = [scores.iloc[:2000], rescored, scores.iloc[1500:]]
+    result = export_incremental(s3, chunks, 'bucket', 'scores', state_dir=str(tmp_path))
+
+    assert (result.uploaded, result.unchanged) == (3000, 1000)
+    content = pq.read_table(io.BytesIO(s3.objects[result.manifest['deltas'][0]['content']])).to_pandas()
+    assert len(content) == content['conversation_id'].nunique() == 3000
+    current = read_current(s3, result.manifest)
+    assert len(current) == 3000
+    assert (current.loc[rescored['conversation_id'].astype(str), 'satisfaction_score']
+            == scores.iloc[1000:1500]['satisfaction_score'].to_numpy()).all()
+
+
+def test_failed_incremental_export_leaves_no_partial_delta(scores, tmp_path):
+    s3 = FailingS3(fail_after=3)
+    with pytest.raises(ClientError):
+        export_incremental(s3, scores, 'bucket', 'scores', state_dir=str(tmp_path))
+    assert not [key for key in s3.objects if key.startswith('scores/delta=')]
+
+    # A crashed export's leftovers are cleared by the next one
+    s3.objects['scores/delta=000001/bot_name=SalesBot/date=2024-01-01/part-00000.parquet'] = b'stale'
+    s3.fail_after = float('inf')
+    result = export_incremental(s3, scores, 'bucket', 'scores', state_dir=str(tmp_path))
+    assert result.version == 1
+    keys = sorted(key for key in s3.objects if key.startswith('scores/delta='))
+    assert keys == sorted(partition['key'] for partition in result.manifest['deltas'][0]['partitions'])
+    assert s3.objects[keys[0]] != b'stale'
@@ -0,0 +1,54 @@
+import pandas as pd
+
+from smart_review.dashboard import compute_dashboard
+from smart_review.frames import compact_frame, content_hash, format_bytes, memory_bytes
+
+
+def make_scores(rows):
+    return pd.DataFrame({
+        'conversation_id': [f'conv{i % 50}' for i in range(rows)],
+        'bot_name': ['SupportBot', 'SalesBot'] * (rows // 2),
+        'datetime': [f'2024-01-01T00:{i % 60:02d}:00' for i in range(rows)],
+        'summary': ['Customer asked about billing'] * rows,
+        'satisfaction_score': [i % 5 + 1 for i in range(rows)],
+        'accuracy_score': [4] * rows,
+        'relevancy_score': [5] * rows,
+        'containment_score': [3] * rows,
+        'input_tokens': [120] * rows,
+        'output_tokens': [None] + [40] * (rows - 1),
+    })
+
+
+def test_compact_frame_uses_small_dtypes_and_keeps_values():
+    df = make_scores(1000)
+    compact = compact_frame(df)
+
+    assert isinstance(compact['bot_name'].dtype, pd.CategoricalDtype)
+    assert isinstance(compact['conversation_id'].dtype, pd.CategoricalDtype)
+    assert compact['summary'].dtype == 'string[pyarrow]'
+    assert pd.api.types.is_datetime64_any_dtype(compact['datetime'])
+    assert compact['satisfaction_score'].dtype == 'int8'
+    assert compact['input_tokens'].dtype == 'int32'
+    assert compact['output_tokens'].dtype == 'Int32'
+    assert compact['output_tokens'].isna().sum() == 1
+    assert memory_bytes(compact) < memory_bytes(df) / 2
+    assert compact['satisfaction_score'].tolist() == df['satisfaction_score'].tolist()
+
+    dashboard = compute_dashboard(compact, max_points=100)
+    assert dashboard['value_counts']['satisfaction_score'].sum() == 1000
+
+
+def test_content_hash_ignores_dtypes_but_not_values():
+    df = make_scores(10)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    assert content_hash(df) == content_hash(compact_frame(df))
+
+    changed = compact_frame(df)
+    changed.loc[0, 'accuracy_score'] = 1
+    assert content_hash(changed) != content_hash(compact_frame(df))
+
+
+def test_format_bytes():
+    assert format_bytes(512) == '512 B'
+    assert format_bytes(1536) == '1.5 KB'
+    assert format_bytes(3 * 1024 ** 3) == '3.0 GB'
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pandas as pd
+
+from smart_review.jobs import ScoringJob, job_id_for
+
+
+def score(conversation_id):
+    return {
+        'conversation_id': conversation_id,
+        'bot_name': 'SupportBot',
+        'datetime': datetime(2024, 1, 1, 12, 0),
+        'summary': 'ok',
+        'satisfaction_score': 4,
+        'accuracy_score': 4,
+        'relevancy_score': 4,
+        'containment_score': 4
+    }
+
+
+def test_job_resumes_from_checkpoint(tmp_path):
+    job = ScoringJob('job-test', jobs_dir=str(tmp_path))
+    job.record(score('conv1'))
+    job.close()
+    # Simulate a crash halfway through writing the next row
+    with open(job.path, 'a') as f:
+        f.write('{"conversation_id": "conv2", "summ')
+
+    resumed = ScoringJob('job-test', jobs_dir=str(tmp_path))
+    conversations = [{'conversation_id': 'conv1'}, {'conversation_id': 'conv2'}]
+    assert [c['conversation_id'] for c in resumed.pending(conversations)] == ['conv2']
+
+    resumed.record(score('conv2'))
+    df = resumed.to_frame()
+    assert sorted(df['conversation_id']) == ['conv1', 'conv2']
+    assert pd.api.types.is_datetime64_any_dtype(df['datetime'])
+
+    resumed.reset()
+    assert resumed.to_frame() is None
+
+
+def test_job_id_is_stable_for_the_same_transcripts():
+    df = pd.DataFrame({'conversation_id': ['conv2', 'conv1', 'conv1']})
+    assert job_id_for(df) == job_id_for(df.iloc[::-1])
+    assert job_id_for(df) != job_id_for(df.iloc[:1])
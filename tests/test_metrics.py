@@ -0,0 +1,59 @@
+import io
+import json
+
+from benchmarks.fakes import messages_response
+from smart_review.metrics import MetricsRegistry, REGISTRY
+from smart_review.scoring import score_conversations
+
+
+def test_histogram_quantiles_and_prometheus_text():
+    registry = MetricsRegistry()
+    for latency in [0.02] * 90 + [0.7] * 10:
+        with registry.context(bot='SupportBot'):
+            registry.call_seconds.observe(latency, service='bedrock', operation='invoke_model')
+    registry.inc('tokens', 120, model='claude', bot='Support"Bot', direction='input')
+
+    assert 0.01 <= registry.call_seconds.quantile(0.5, service='bedrock', operation='invoke_model') <= 0.025
+    assert 0.5 <= registry.call_seconds.quantile(0.95, service='bedrock', operation='invoke_model') <= 1.0
+
+    text = registry.render()
+    assert '# TYPE smart_review_call_duration_seconds histogram' in text
+    assert 'smart_review_call_duration_seconds_bucket{operation="invoke_model",service="bedrock",le="+Inf"} 100' in text
+    assert 'smart_review_tokens_total{bot="Support\\"Bot",direction="input",model="claude"} 120' in text
+
+
+class ScriptedBedrock:
+    def __init__(self, completions):
+        self.completions = list(completions)
+
+    def invoke_model(self, modelId, body):
+        payload = messages_response(body, self.completions.pop(0))
+        return {'body': io.BytesIO(payload), 'ResponseMetadata': {'HTTPHeaders': {
+            'x-amzn-bedrock-input-token-count': '50',
+            'x-amzn-bedrock-output-token-count': '10'
+        }}}
+
+
+def test_scoring_records_latency_tokens_and_parse_failures():
+    REGISTRY.reset()
+    good = json.dumps({'summary': 'ok', 'satisfaction_score': 4, 'accuracy_score': 4,
+                       'relevancy_score': 4, 'containment_score': 4})
+    bedrock = ScriptedBedrock([good, 'not json', good])
+    conversations = [
+        {'conversation_id': 'c1', 'bot_name': 'SupportBot', 'datetime': None, 'text': 'User: hi'},
+        {'conversation_id': 'c2', 'bot_name': 'SupportBot', 'datetime': None, 'text': 'User: hello'},
+    ]
+    list(score_conversations(bedrock, conversations, max_workers=1, requests_per_second=1000))
+
+    snapshot = REGISTRY.snapshot()
+    latency = snapshot['smart_review_call_duration_seconds']
+    # The unparseable reply costs one repair call instead of failing the conversation
+    assert sum(series['count'] for series in latency.values()) == 3
+    assert all(dict(key)['bot'] == 'SupportBot' for key in latency)
+    tokens = {}
+    for key, value in snapshot['smart_review_tokens_total'].items():
+        tokens[dict(key)['direction']] = tokens.get(dict(key)['direction'], 0) + value
+    assert tokens == {'input': 150, 'output': 30}
+    assert sum(snapshot['smart_review_parse_failures_total'].values()) == 1
+    assert [dict(key)['outcome'] for key in snapshot['smart_review_repairs_total']] == ['ok']
+    REGISTRY.reset()
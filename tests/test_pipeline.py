@@ -0,0 +1,86 @@
+import io
+import json
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.fakes import messages_response
+from smart_review import cli, pipeline
+from smart_review.rollups import RollupStore
+
+
+class FakeBedrock:
+    def invoke_model(self, modelId, body):
+        completion = json.dumps({'summary': 'ok', 'satisfaction_score': 4, 'accuracy_score': 4,
+                                 'relevancy_score': 4, 'containment_score': 4})
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body
+
+
+def fake_stream(bot_name, since, until, batch_size):
+    for i in range(25):
+        yield {
+            'conversation_id': f'conv{i}',
+            'bot_name': bot_name,
+            'datetime': pd.Timestamp('2024-01-01') + pd.Timedelta(hours=i),
+            'text': f'Bot: {bot_name}\nUser: question {i}\nBot: answer {i}'
+        }
+
+
+def test_cli_run_streams_scores_and_exports(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    s3 = FakeS3()
+    monkeypatch.setattr(pipeline, 'stream_conversations', fake_stream)
+    monkeypatch.setattr(pipeline, 'get_bedrock_client', FakeBedrock)
+    monkeypatch.setattr(pipeline, 'get_s3_client', lambda: s3)
+
+    exit_code = cli.main([
+        'run', '--bot', 'SupportBot', '--since', '2024-01-01', '--until', '2024-01-03',
+        '--bucket', 'bucket', '--prefix', 'nightly', '--rps', '1000'
+    ])
+
+    assert exit_code == 0
+    manifest = json.loads(s3.objects['nightly/_manifest.json'])
+    assert manifest['rows'] == 25
+    assert {partition['date'] for partition in manifest['partitions']} == {'2024-01-01', '2024-01-02'}
+
+    report = capsys.readouterr().out
+    for stage in ('fetch', 'score', 'export'):
+        assert stage in report
+    assert '25 items' in report
+
+    # A second run finds everything checkpointed and in the score cache
+    result = pipeline.run_pipeline('SupportBot', datetime(2024, 1, 1), datetime(2024, 1, 3))
+    assert result.stages['fetch'].items == 25
+    assert result.stages['score'].items == 0
+
+    # Scores were merged into the rollup store, and merging the checkpoint again changes nothing
+    assert cli.main(['rollup']) == 0
+    store = RollupStore(cli.DEFAULT_ROLLUP_PATH)
+    assert len(store) == 25
+    assert store.query()['count'].sum() == 25
+    store.close()
+
+
+def test_cli_run_defaults_to_a_stable_time_range(monkeypatch):
+    ranges = []
+
+    def fake_run_pipeline(bot_name, since, until, **kwargs):
+        ranges.append((since, until))
+        return pipeline.PipelineResult(pipeline.pipeline_job_id(bot_name, since, until), {})
+
+    monkeypatch.setattr(cli, 'run_pipeline', fake_run_pipeline)
+    assert cli.main(['run', '--bot', 'SupportBot']) == 0
+    assert cli.main(['run', '--bot', 'SupportBot']) == 0
+
+    since, until = ranges[0]
+    assert ranges[1] == ranges[0] or ranges[1][1] - until == pd.Timedelta(hours=1)
+    assert (until.minute, until.second, until.microsecond) == (0, 0, 0)
+    assert until - since == pd.Timedelta(days=1)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from smart_review.frames import compact_frame
+from smart_review.preview import filter_options, matching_rows, page_count, page_of
+
+
+def make_transcripts(rows):
+    rng = np.random.default_rng(0)
+    return compact_frame(pd.DataFrame({
+        'conversation_id': [f'conv{i}' for i in range(rows)],
+        'bot_name': rng.choice(['SupportBot', 'SalesBot', 'BillingBot'], rows),
+        'datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(rows), unit='min'),
+        'text': [f'User: question {i}' + (' refund please' if i % 7 == 0 else '') for i in range(rows)],
+        'satisfaction_score': rng.integers(1, 6, rows),
+    }))
+
+
+def test_search_and_filters_select_matching_rows():
+    df = make_transcripts(1000)
+    assert matching_rows(df) is None
+
+    rows = matching_rows(df, search='REFUND')
+    assert rows.tolist() == list(range(0, 1000, 7))
+
+    # Categorical columns are searched through their categories
+    sales = matching_rows(df, search='salesbot')
+    assert (df['bot_name'].iloc[sales] == 'SalesBot').all()
+    assert len(sales) == (df['bot_name'] == 'SalesBot').sum()
+
+    filters = (('bot_name', 'values', ('SupportBot',)), ('satisfaction_score', 'values', (4, 5)))
+    rows = matching_rows(df, search='refund', filters=filters)
+    expected = df[df['text'].str.contains('refund') & (df['bot_name'] == 'SupportBot')
+                  & df['satisfaction_score'].isin([4, 5])]
+    assert df.iloc[rows]['conversation_id'].tolist() == expected['conversation_id'].tolist()
+
+    morning = matching_rows(df, filters=(('datetime', 'range', (pd.Timestamp('2024-01-01 01:00'), pd.Timestamp('2024-01-01 01:59'))),))
+    assert len(morning) == 60
+
+
+def test_pages_and_filter_options():
+    df = make_transcripts(250)
+    assert page_count(250, 100) == 3
+    assert page_count(0, 100) == 1
+    assert page_of(df, None, 3, 100)['conversation_id'].tolist() == [f'conv{i}' for i in range(200, 250)]
+    rows = matching_rows(df, search='refund')
+    assert page_of(df, rows, 2, 10)['conversation_id'].tolist() == [f'conv{i * 7}' for i in range(10, 20)]
+
+    assert filter_options(df, 'bot_name') == ('values', ['BillingBot', 'SalesBot', 'SupportBot'])
+    assert filter_options(df, 'satisfaction_score') == ('values', [1, 2, 3, 4, 5])
+    assert filter_options(df, 'datetime')[0] == 'range'
+    assert filter_options(df, 'text') is None
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from smart_review.dashboard import compute_dashboard
+from smart_review.rollups import RollupStore, summarize_rollups
+from smart_review.scoring import SCORE_COLUMNS
+
+
+def make_scores(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'conversation_id': [f'conv{i}' for i in range(rows)],
+        'bot_name': rng.choice(['SupportBot', 'SalesBot'], rows),
+        'datetime': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60 * 24 * 90, rows), unit='min'),
+        **{column: rng.integers(1, 6, rows) for column in SCORE_COLUMNS}
+    })
+
+
+def test_rollups_match_the_dashboard_of_raw_rows(tmp_path):
+    df = make_scores(2000)
+    store = RollupStore(str(tmp_path / 'rollups.sqlite'))
+    for start in range(0, len(df), 500):
+        store.merge(df.iloc[start:start + 500])
+
+    expected = compute_dashboard(df, max_points=500)
+    dashboard = summarize_rollups(store.query(), max_points=500)
+
+    assert dashboard['total_conversations'] == 2000
+    assert dashboard['unique_bots'] == 2
+    for key in ('intervals', 'value_counts', 'correlation', 'bot_means', 'bot_half_widths'):
+        pd.testing.assert_frame_equal(dashboard[key], expected[key], check_dtype=False)
+    assert dashboard['trends']['count'].sum() == 2000
+    assert len(dashboard['trends']) <= 500
+
+    january = df[(df['datetime'] < '2024-02-01') & (df['bot_name'] == 'SalesBot')]
+    sales = summarize_rollups(store.query('2024-01-01', '2024-02-01', ['SalesBot']))
+    assert sales['total_conversations'] == len(january)
+    assert np.allclose(sales['means'], january[SCORE_COLUMNS].mean())
+    store.close()
+
+
+def test_merging_again_replaces_earlier_scores(tmp_path):
+    df = make_scores(300)
+    store = RollupStore(str(tmp_path / 'rollups.sqlite'))
+    store.merge(df)
+    rescored = df.iloc[:100].assign(satisfaction_score=5)
+    store.merge(rescored)
+    store.merge(rescored)
+
+    expected = pd.concat([rescored, df.iloc[100:]])
+    dashboard = summarize_rollups(store.query())
+    assert len(store) == dashboard['total_conversations'] == 300
+    assert np.allclose(dashboard['means'], expected[SCORE_COLUMNS].mean())
+    assert dashboard['value_counts'].loc[5, 'satisfaction_score'] == (expected['satisfaction_score'] == 5).sum()
+    store.close()
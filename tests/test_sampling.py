@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from smart_review.dashboard import score_intervals
+from smart_review.sampling import SampleEstimate, half_width, resume_sample, stratified_order
+from smart_review.scoring import SCORE_COLUMNS
+
+
+def make_conversations():
+    conversations = []
+    for i in range(1200):
+        bot = 'SupportBot' if i % 4 else 'SalesBot'
+        conversations.append({
+            'conversation_id': f'conv{i}',
+            'bot_name': bot,
+            'datetime': pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=i % 360),
+        })
+    return conversations
+
+
+def test_every_prefix_of_the_stratified_order_is_proportional():
+    conversations = make_conversations()
+    ordered = stratified_order(conversations, seed=1)
+
+    assert sorted(c['conversation_id'] for c in ordered) == sorted(c['conversation_id'] for c in conversations)
+    population = pd.DataFrame(conversations)
+    strata = population.groupby(['bot_name', population['datetime'].dt.hour]).size()
+    for size in (40, 120, 600):
+        prefix = pd.DataFrame(ordered[:size])
+        counts = prefix.groupby(['bot_name', prefix['datetime'].dt.hour]).size().reindex(strata.index, fill_value=0)
+        expected = strata * size / len(conversations)
+        assert (counts - expected).abs().max() <= 2
+
+
+def test_sample_estimate_stops_once_intervals_are_narrow():
+    rng = random.Random(0)
+    estimate = SampleEstimate(population=10_000, target_half_width=0.2, min_samples=30)
+    scored = 0
+    while not estimate.converged():
+        estimate.add({column: rng.randint(1, 5) for column in SCORE_COLUMNS})
+        scored += 1
+
+    assert 30 <= scored < 10_000
+    frame = estimate.to_frame()
+    assert (frame['half_width'] <= 0.2).all()
+    assert (frame['low'] < frame['mean']).all() and (frame['mean'] < frame['high']).all()
+
+
+def test_intervals_match_between_running_and_batch_computation():
+    rng = np.random.default_rng(0)
+    scores = pd.DataFrame({column: rng.integers(1, 6, 500) for column in SCORE_COLUMNS}).astype(float)
+    estimate = SampleEstimate(population=2000)
+    for row in scores.to_dict('records'):
+        estimate.add(row)
+
+    batch = score_intervals(scores, population=2000)
+    assert np.allclose(estimate.to_frame()['half_width'], batch['half_width'])
+    assert np.allclose(estimate.to_frame()['mean'], batch['mean'])
+    assert half_width(2000, 1.0, population=2000) == 0
+
+
+def test_resuming_a_converged_sample_leaves_nothing_to_score():
+    conversations = make_conversations()
+    rng = random.Random(0)
+    rows = [dict(conversation, **{column: rng.randint(1, 5) for column in SCORE_COLUMNS})
+            for conversation in stratified_order(conversations)[:300]]
+
+    order, estimate, remaining = resume_sample(conversations, rows[:20], target_half_width=0.5)
+    assert not estimate.converged()
+    assert len(order) == 1200 and remaining == 1180
+
+    order, estimate, remaining = resume_sample(conversations, rows, target_half_width=0.5)
+    assert estimate.converged()
+    assert order == [] and remaining == 0
@@ -0,0 +1,322 @@
+import io
+import json
+import re
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from benchmarks.fakes import messages_response, request_prompt
+from smart_review.scoring import (
+    TokenBucket,
+    call_with_retry,
+    is_throttling_error,
+    score_conversations,
+)
+
+
+def throttling_error():
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+
+class FakeBedrock:
+    """Bedrock stand-in that throttles the first call for each conversation"""
+
+    def __init__(self, throttle_first=True):
+        self.throttle_first = throttle_first
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        prompt = request_prompt(body)
+        with self.lock:
+            first = prompt not in self.seen
+            self.seen.add(prompt)
+        if self.throttle_first and first:
+            raise throttling_error()
+        completion = json.dumps({
+            'summary': 'ok',
+            'satisfaction_score': 4,
+            'accuracy_score': 5,
+            'relevancy_score': 3,
+            'containment_score': 2
+        })
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+@pytest.fixture
+def conversations():
+    return [
+        {'conversation_id': f'conv{i}', 'bot_name': 'SupportBot', 'datetime': None, 'text': f'User: hi {i}'}
+        for i in range(20)
+    ]
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(throttling_error())
+    assert not is_throttling_error(ValueError('bad json'))
+
+
+def test_token_bucket_backs_off_and_recovers():
+    bucket = TokenBucket(rate=10)
+    bucket.on_throttle()
+    assert bucket.rate == 5
+    bucket.on_success()
+    assert 5 < bucket.rate <= 10
+
+
+def test_call_with_retry_gives_up_after_max_retries():
+    calls = []
+
+    def always_throttled():
+        calls.append(1)
+        raise throttling_error()
+
+    with pytest.raises(ClientError):
+        call_with_retry(always_throttled, TokenBucket(rate=1000), max_retries=2, sleep=lambda _: None)
+    assert len(calls) == 3
+
+
+def test_score_conversations_retries_throttles(conversations, monkeypatch):
+    monkeypatch.setattr('smart_review.scoring.backoff_delay', lambda attempt: 0)
+    results = list(score_conversations(FakeBedrock(), conversations, max_workers=4, requests_per_second=1000))
+
+    assert len(results) == len(conversations)
+    assert all(error is None for _, _, error in results)
+    assert {conv['conversation_id'] for conv, _, _ in results} == {c['conversation_id'] for c in conversations}
+
+
+def test_score_conversations_reports_errors():
+    def broken(bedrock, text):
+        raise ValueError('not json')
+
+    results = list(score_conversations(None, [{'conversation_id': 'c1', 'text': 'x'}], analyze=broken))
+    assert len(results) == 1
+    assert isinstance(results[0][2], ValueError)
+
+
+def test_score_conversations_uses_cache(conversations, tmp_path):
+    from smart_review.cache import ScoreCache
+
+    cache = ScoreCache(str(tmp_path / 'cache.sqlite'))
+    bedrock = FakeBedrock(throttle_first=False)
+    first = list(score_conversations(bedrock, conversations, requests_per_second=1000, cache=cache))
+    assert all(error is None for _, _, error in first)
+    assert cache.stats() == {'hits': 0, 'misses': 20, 'entries': 20}
+
+    def unreachable(bedrock, text):
+        raise AssertionError('cache hit should skip Bedrock')
+
+    second = list(score_conversations(bedrock, conversations, cache=cache, analyze=unreachable))
+    assert len(second) == 20
+    assert cache.hits == 20
+
+    rescored = list(score_conversations(bedrock, conversations, requests_per_second=1000, cache=cache, refresh=True))
+    assert all(error is None for _, _, error in rescored)
+    assert cache.hits == 20
+
+    # A fully cached stream is yielded as it is read, not buffered whole
+    for pack_token_budget in (None, 4000):
+        list(score_conversations(bedrock, conversations, requests_per_second=1000, cache=cache,
+                                 pack_token_budget=pack_token_budget))
+        read = []
+        stream = (read.append(conversation) or conversation for conversation in conversations)
+        results = score_conversations(bedrock, stream, cache=cache, analyze=unreachable,
+                                      pack_token_budget=pack_token_budget)
+        next(results)
+        assert len(read) == 1
+        results.close()
+
+
+def test_cache_keeps_scoring_modes_apart(tmp_path):
+    from smart_review.cache import ScoreCache
+    from smart_review.scoring import scoring_mode
+
+    text = 'User: where is my order?\nBot: It ships tomorrow.'
+    assert scoring_mode(text) == 'single'
+    assert scoring_mode(text, pack_token_budget=4000) == 'packed'
+    assert scoring_mode(text * 200, input_token_budget=500) == 'map-reduce:500'
+
+    cache = ScoreCache(str(tmp_path / 'cache.sqlite'))
+    conversations = [{'conversation_id': 'c1', 'bot_name': 'SupportBot', 'datetime': None, 'text': text * 200}]
+    scored = lambda **budgets: list(score_conversations(
+        FakeBedrock(throttle_first=False), conversations, requests_per_second=1000, cache=cache, **budgets
+    ))
+    scored()
+    scored()
+    assert cache.hits == 1
+    # Split at another budget, the conversation is scored again rather than served the plain analysis
+    scored(input_token_budget=500)
+    scored(pack_token_budget=100_000)
+    assert cache.hits == 1
+    assert len(cache) == 3
+
+
+def test_score_cache_eviction(tmp_path):
+    from smart_review.cache import ScoreCache
+
+    cache = ScoreCache(str(tmp_path / 'cache.sqlite'), max_entries=3)
+    for i in range(5):
+        cache.put(cache.key(f'conversation {i}'), {'summary': str(i)})
+    cache.evict()
+    assert len(cache) == 3
+    assert cache.get(cache.key('conversation 4')) == {'summary': '4'}
+    assert cache.get(cache.key('conversation 0')) is None
+    assert cache.key('text') != cache.key('text', model_id='other-model')
+
+
+def test_pack_conversations_respects_budget():
+    from smart_review.scoring import pack_conversations
+
+    items = [{'text': 'x' * 400}] * 5 + [{'text': 'y' * 4000}] + [{'text': 'z' * 40}]
+    batches = list(pack_conversations(items, token_budget=250))
+    # 100 tokens each: two fit per 250-token batch; the 1000-token one is sent alone
+    assert [len(batch) for batch in batches] == [2, 2, 1, 2]
+    assert batches[2] == [{'text': 'y' * 4000}]
+    assert batches[3] == [{'text': 'x' * 400}, {'text': 'z' * 40}]
+
+
+class PackingBedrock:
+    """Bedrock stand-in whose packed replies drop one ID and garble another"""
+
+    def __init__(self):
+        self.packed_calls = 0
+        self.single_calls = 0
+
+    def invoke_model(self, modelId, body):
+        prompt = request_prompt(body)
+        analysis = {'summary': 'ok', 'satisfaction_score': 4, 'accuracy_score': 4,
+                    'relevancy_score': 4, 'containment_score': 4}
+        ids = re.findall(r'^Conversation (conv\d+):$', prompt, flags=re.MULTILINE)
+        if ids:
+            self.packed_calls += 1
+            items = [dict(analysis, conversation_id=conversation_id) for conversation_id in ids[1:]]
+            items[-1]['satisfaction_score'] = 'high'
+            completion = json.dumps(items)
+        else:
+            self.single_calls += 1
+            completion = json.dumps(analysis)
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+def test_packed_scoring_retries_missing_ids_individually(conversations):
+    bedrock = PackingBedrock()
+    results = list(score_conversations(bedrock, conversations, requests_per_second=1000, pack_token_budget=40))
+
+    assert sorted(conv['conversation_id'] for conv, _, _ in results) == sorted(c['conversation_id'] for c in conversations)
+    assert all(error is None for _, _, error in results)
+    assert bedrock.packed_calls > 0
+    assert bedrock.single_calls == 2 * bedrock.packed_calls
+
+
+class RecordingBedrock:
+    """Bedrock stand-in that records prompts and reports token usage headers"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke_model(self, modelId, body):
+        self.prompts.append(json.loads(body))
+        completion = json.dumps({'summary': 'ok', 'satisfaction_score': 3, 'accuracy_score': 3,
+                                 'relevancy_score': 3, 'containment_score': 3})
+        return {
+            'body': io.BytesIO(messages_response(body, completion)),
+            'ResponseMetadata': {'HTTPHeaders': {
+                'x-amzn-bedrock-input-token-count': '100',
+                'x-amzn-bedrock-output-token-count': '20'
+            }}
+        }
+
+
+def test_long_conversations_are_scored_map_reduce():
+    from smart_review.scoring import ANALYSIS_MAX_TOKENS, analyze_conversation
+
+    bedrock = RecordingBedrock()
+    conversation = '\n'.join(f'User: question number {i}\nBot: answer number {i}' for i in range(50))
+    analysis = analyze_conversation(bedrock, conversation, input_token_budget=100)
+
+    texts = [p['messages'][0]['content'][0]['text'] for p in bedrock.prompts]
+    segment_calls = [text for text in texts if 'Conversation part' in text]
+    reduce_calls = [text for text in texts if 'analyzed in' in text]
+    assert len(segment_calls) > 1
+    assert len(reduce_calls) == 1
+    assert all(p['max_tokens'] == ANALYSIS_MAX_TOKENS for p in bedrock.prompts)
+    assert analysis['input_tokens'] == 100 * len(bedrock.prompts)
+    assert analysis['output_tokens'] == 20 * len(bedrock.prompts)
+
+
+def test_split_by_tokens_stays_within_budget():
+    from smart_review.tokens import estimate_tokens, split_by_tokens
+
+    text = '\n'.join(['short line'] * 30 + ['x' * 1000])
+    segments = split_by_tokens(text, 50)
+    assert all(estimate_tokens(segment) <= 50 for segment in segments)
+    assert ''.join(segments).replace('\n', '') == text.replace('\n', '')
+
+
+def test_long_system_prompt_is_marked_for_caching_on_caching_models():
+    from smart_review.scoring import invoke_claude
+
+    caching_model = 'us.anthropic.claude-3-7-sonnet-20250219-v1:0'
+    haiku = 'anthropic.claude-3-5-haiku-20241022-v1:0'
+    long_system = 'Score the conversation. ' * 300
+    bedrock = RecordingBedrock()
+    for model_id, system in ((caching_model, long_system), (caching_model, 'Score it.'),
+                             ('anthropic.claude-3-sonnet-20240229-v1:0', long_system), (haiku, long_system)):
+        invoke_claude(bedrock, 'Conversation:\nUser: hi', model_id=model_id, system=system)
+
+    marked = ['cache_control' in request['system'][0] for request in bedrock.prompts]
+    # Too short, a model without caching, and below Haiku's higher minimum
+    assert marked == [True, False, False, False]
+    assert bedrock.prompts[0]['system'][0]['cache_control'] == {'type': 'ephemeral'}
+
+
+class ProseBedrock:
+    """Bedrock stand-in that wraps the analysis in prose, then garbles it for some conversations.
+
+    The repair model answers {} for a reply that has no accuracy score, as
+    it is told to.
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def invoke_model(self, modelId, body):
+        request = json.loads(body)
+        self.requests.append((modelId, request))
+        analysis = json.dumps({'summary': 'ok', 'satisfaction_score': 4, 'accuracy_score': 4,
+                               'relevancy_score': 4, 'containment_score': 4})
+        prompt = request_prompt(body)
+        if 'garbled' in prompt:
+            completion = 'Satisfaction is 4/5 but I cannot give JSON.'
+        elif 'incomplete' in prompt:
+            completion = 'Satisfaction 4, relevancy 4, containment 4, no accuracy score.'
+        elif 'no accuracy score' in prompt:
+            completion = '}'
+        else:
+            completion = f"{analysis}\n\nLet me know if you need anything else."
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+def test_messages_request_prefills_json_and_repairs_unparseable_replies():
+    from smart_review.scoring import REPAIR_MODEL_ID, SYSTEM_PROMPT, analyze_conversation, build_request
+
+    request = build_request('Conversation:\nUser: hi', prefill='{')
+    assert request['system'] == [{'type': 'text', 'text': SYSTEM_PROMPT}]
+    assert request['messages'][-1] == {'role': 'assistant', 'content': [{'type': 'text', 'text': '{'}]}
+
+    bedrock = ProseBedrock()
+    assert analyze_conversation(bedrock, 'User: hi')['satisfaction_score'] == 4
+    assert len(bedrock.requests) == 1
+
+    analysis = analyze_conversation(bedrock, 'User: garbled')
+    assert analysis['satisfaction_score'] == 4
+    repair_model, repair_request = bedrock.requests[-1]
+    assert repair_model == REPAIR_MODEL_ID
+    # The repair call carries the broken reply, not the conversation
+    assert 'cannot give JSON' in repair_request['messages'][0]['content'][0]['text']
+    assert 'User: garbled' not in repair_request['messages'][0]['content'][0]['text']
+
+    # A reply missing a score is not repaired with a made-up one
+    with pytest.raises(ValueError):
+        analyze_conversation(bedrock, 'User: incomplete')
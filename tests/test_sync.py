@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from benchmarks.fakes import FakeSnowflakeConnection
+from benchmarks.synthetic import make_transcripts
+from smart_review.sync import TranscriptCache, subtract_ranges, sync_transcripts, time_slices
+from smart_review.transcripts import ConnectionPool
+
+
+def ts(value):
+    return pd.Timestamp(value)
+
+
+def test_subtract_ranges_and_day_aligned_slices():
+    covered = [(ts('2024-01-03'), ts('2024-01-05'))]
+    missing = subtract_ranges(ts('2024-01-01 12:00'), ts('2024-01-06'), covered)
+    assert missing == [(ts('2024-01-01 12:00'), ts('2024-01-03')), (ts('2024-01-05'), ts('2024-01-06'))]
+
+    slices = time_slices(missing)
+    assert slices == [
+        (ts('2024-01-01 12:00'), ts('2024-01-02')),
+        (ts('2024-01-02'), ts('2024-01-03')),
+        (ts('2024-01-05'), ts('2024-01-06')),
+    ]
+    assert time_slices([(ts('2024-01-01'), ts('2024-01-01 10:00'))], max_slice=timedelta(hours=4))[-1] == (
+        ts('2024-01-01 08:00'), ts('2024-01-01 10:00')
+    )
+
+
+def test_sync_only_fetches_missing_ranges(tmp_path):
+    transcripts = make_transcripts(3000, turns_per_conversation=3, bots=['SupportBot', 'SalesBot'], days=10)
+    connections = []
+
+    def connect():
+        connections.append(FakeSnowflakeConnection(transcripts, batch_rows=500))
+        return connections[-1]
+
+    cache = TranscriptCache(str(tmp_path))
+    pool = ConnectionPool(size=2, connect=connect)
+    start = transcripts['datetime'].min().normalize()
+    now = start + timedelta(days=30)
+
+    df, stats = sync_transcripts('SupportBot', start, start + timedelta(days=6), cache=cache, pool=pool, now=now)
+    expected = transcripts[(transcripts['bot_name'] == 'SupportBot') & (transcripts['datetime'] < start + timedelta(days=6))]
+    assert len(df) == len(expected) == stats.rows_fetched
+    assert stats.slices == 6
+    assert len(connections) <= 2
+    assert cache.watermark('SupportBot') == start + timedelta(days=6)
+
+    queries = sum(len(conn.queries) for conn in connections)
+    df, stats = sync_transcripts('SupportBot', start + timedelta(days=2), start + timedelta(days=8), cache=cache, pool=pool, now=now)
+    assert stats.slices == 2
+    assert sum(len(conn.queries) for conn in connections) == queries + 2
+    expected = transcripts[
+        (transcripts['bot_name'] == 'SupportBot')
+        & (transcripts['datetime'] >= start + timedelta(days=2))
+        & (transcripts['datetime'] < start + timedelta(days=8))
+    ]
+    assert sorted(df['mid'].astype(str)) == sorted(expected['mid'].astype(str))
+    assert stats.rows_cached == len(expected) - stats.rows_fetched
+    pool.close()
+    assert all(conn.closed for conn in connections)
+
+
+def test_unsettled_tail_is_refetched_without_duplicates(tmp_path):
+    transcripts = make_transcripts(500, turns_per_conversation=5, bots=['SupportBot'], days=2)
+    pool = ConnectionPool(size=1, connect=lambda: FakeSnowflakeConnection(transcripts))
+    cache = TranscriptCache(str(tmp_path))
+    start = transcripts['datetime'].min().normalize()
+    end = start + timedelta(days=2)
+    now = start + timedelta(days=1, hours=12)
+
+    sync_transcripts('SupportBot', start, end, cache=cache, pool=pool, now=now)
+    assert cache.watermark('SupportBot') == now - timedelta(hours=1)
+
+    df, stats = sync_transcripts('SupportBot', start, end, cache=cache, pool=pool, now=now)
+    assert stats.missing_ranges == [(now - timedelta(hours=1), end)]
+    assert len(df) == len(transcripts)
+    assert df['mid'].is_unique
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from smart_review.transcripts import complete_conversations, iter_transcript_batches
+
+
+class FakeCursor:
+    def __init__(self, frames):
+        self.frames = frames
+        self.executed = None
+        self.closed = False
+
+    def execute(self, query, params):
+        self.executed = (query, params)
+
+    def fetch_pandas_batches(self):
+        return iter(self.frames)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, frames):
+        self.cursor_obj = FakeCursor(frames)
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+def transcript_rows(conversation_ids):
+    return pd.DataFrame({
+        'BOT_NAME': ['SupportBot'] * len(conversation_ids),
+        'CONVERSATION_ID': conversation_ids,
+        'MID': [f'm{i}' for i in range(len(conversation_ids))],
+        'UTTERANCE': ['hi'] * len(conversation_ids),
+        'RESPONSE': ['hello'] * len(conversation_ids),
+        'DATETIME': pd.date_range('2024-01-01', periods=len(conversation_ids), freq='min')
+    })
+
+
+def test_iter_transcript_batches_binds_parameters_and_bounds_batches():
+    conn = FakeConnection([transcript_rows(['c1'] * 5), transcript_rows(['c2'] * 2)])
+    batches = list(iter_transcript_batches(conn, "O'Brien Bot", '2024-01-01', '2024-01-31', batch_size=2))
+
+    query, params = conn.cursor_obj.executed
+    assert "O'Brien" not in query
+    assert params['bot_name'] == "O'Brien Bot"
+    assert [len(batch) for batch in batches] == [2, 2, 1, 2]
+    assert list(batches[0].columns) == ['bot_name', 'conversation_id', 'mid', 'utterance', 'response', 'datetime']
+    assert conn.cursor_obj.closed
+
+
+def test_complete_conversations_never_splits_a_conversation():
+    rows = transcript_rows(['c1', 'c1', 'c2', 'c2', 'c2', 'c3']).rename(columns=str.lower)
+    batches = [rows.iloc[0:3], rows.iloc[3:4], rows.iloc[4:6]]
+    frames = list(complete_conversations(batches))
+
+    assert sum(len(frame) for frame in frames) == len(rows)
+    seen = []
+    for frame in frames:
+        ids = set(frame['conversation_id'])
+        assert not ids & set(seen)
+        seen.extend(ids)
@@ -0,0 +1,79 @@
+import io
+
+import pandas as pd
+import pytest
+
+from smart_review.uploads import iter_json_array, load_transcripts
+
+
+@pytest.fixture
+def transcripts():
+    return pd.DataFrame({
+        'bot_name': ['SupportBot', 'SupportBot', 'SalesBot'],
+        'conversation_id': ['conv1', 'conv1', 'conv2'],
+        'mid': ['m1', 'm2', 'm3'],
+        'utterance': ['How can I help you?', 'I need help with my order', 'Hello'],
+        'response': ['I can help you with that.', 'Could you provide your order number?', 'Welcome!'],
+        'datetime': pd.to_datetime(['2024-01-01 10:00', '2024-01-01 10:05', '2024-01-01 11:00'])
+    })
+
+
+def assert_typed(df, expected):
+    assert len(df) == len(expected)
+    assert isinstance(df['bot_name'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['conversation_id'].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_datetime64_any_dtype(df['datetime'])
+    assert df['conversation_id'].astype(str).tolist() == expected['conversation_id'].tolist()
+
+
+@pytest.mark.parametrize('file_name', ['transcripts.csv', 'transcripts.jsonl', 'transcripts.json'])
+def test_load_text_formats_in_chunks(transcripts, file_name):
+    if file_name.endswith('.csv'):
+        data = transcripts.to_csv(index=False)
+    else:
+        data = transcripts.to_json(orient='records', lines=True, date_format='iso')
+    df = load_transcripts(io.BytesIO(data.encode()), file_name, chunk_size=2)
+    assert_typed(df, transcripts)
+
+
+def test_load_csv_with_non_iso_datetimes(transcripts):
+    data = transcripts.assign(datetime=transcripts['datetime'].dt.strftime('%m/%d/%Y %H:%M')).to_csv(index=False)
+    df = load_transcripts(io.BytesIO(data.encode()), 'transcripts.csv', chunk_size=2)
+    assert_typed(df, transcripts)
+    assert df['datetime'].tolist() == transcripts['datetime'].tolist()
+
+
+def test_load_json_array(transcripts):
+    data = transcripts.to_json(orient='records', date_format='iso')
+    assert_typed(load_transcripts(io.BytesIO(data.encode()), 'transcripts.json', chunk_size=2), transcripts)
+
+
+def test_json_array_is_decoded_across_blocks(transcripts):
+    data = ' [\n' + ',\n'.join(transcripts.assign(utterance='café ✓').to_json(orient='records', lines=True,
+                                                                            date_format='iso').splitlines()) + '\n]'
+    file = io.BytesIO(data.encode())
+    records = iter_json_array(file, block_size=7)
+    assert next(records)['utterance'] == 'café ✓'
+    # Only the blocks holding the first object have been read
+    assert file.tell() < len(data) / 2
+    assert len(list(records)) == 2
+
+    with pytest.raises(ValueError, match='malformed or truncated'):
+        list(iter_json_array(io.BytesIO(data[:-20].encode()), block_size=7))
+
+
+@pytest.mark.parametrize('file_name', ['transcripts.parquet', 'transcripts.feather'])
+def test_load_arrow_formats(transcripts, file_name):
+    buffer = io.BytesIO()
+    if file_name.endswith('.parquet'):
+        transcripts.to_parquet(buffer)
+    else:
+        transcripts.to_feather(buffer)
+    buffer.seek(0)
+    assert_typed(load_transcripts(buffer, file_name, chunk_size=2), transcripts)
+
+
+def test_missing_columns_fail_on_first_chunk(transcripts):
+    data = transcripts.drop(columns=['response']).to_csv(index=False)
+    with pytest.raises(ValueError, match='missing: response'):
+        load_transcripts(io.BytesIO(data.encode()), 'transcripts.csv', chunk_size=1)
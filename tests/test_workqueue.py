@@ -0,0 +1,97 @@
+import io
+import json
+import threading
+import time
+
+import pandas as pd
+
+from benchmarks.fakes import messages_response
+from smart_review.workqueue import WorkQueue, run_worker
+
+
+class FakeBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, modelId, body):
+        self.calls += 1
+        completion = json.dumps({'summary': 'ok', 'satisfaction_score': 4, 'accuracy_score': 3,
+                                 'relevancy_score': 5, 'containment_score': 2})
+        return {'body': io.BytesIO(messages_response(body, completion))}
+
+
+def conversations(count, start=0):
+    return [
+        {
+            'conversation_id': f'conv{i}',
+            'bot_name': 'SupportBot',
+            'datetime': pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=i),
+            'text': f'Bot: SupportBot\nUser: question {i}\nBot: answer {i}'
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def test_submit_is_idempotent_and_expired_leases_are_reclaimed(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=0.2, max_attempts=2)
+    assert queue.submit('job', conversations(25), batch_size=10) == 25
+    assert queue.submit('job', conversations(30), batch_size=10) == 5
+    assert queue.progress('job')['batches'] == 4
+
+    lease = queue.claim('worker-a')
+    assert (lease.batch_no, len(lease.conversations)) == (0, 10)
+    assert queue.claim('worker-b').batch_no == 1
+
+    # worker-a dies; once its lease expires the batch goes to worker-c
+    time.sleep(0.3)
+    reclaimed = queue.claim('worker-c')
+    assert reclaimed.batch_no == 0 and reclaimed.attempts == 2
+    assert not queue.renew(lease)
+    assert queue.renew(reclaimed)
+
+    queue.complete(reclaimed, [{'conversation_id': 'conv0', 'datetime': '2024-01-01T00:00:00'}], failed_ids=['conv1'])
+    progress = queue.progress('job')
+    assert progress['done'] == 1 and progress['scored'] == 1 and progress['failures'] == 1
+
+    # Failed conversations are queued again by the next submission
+    assert queue.submit('job', conversations(30), batch_size=10) == 1
+
+    # Out of attempts: a batch whose lease keeps expiring is failed
+    time.sleep(0.3)
+    again = queue.claim('worker-d')
+    assert again.batch_no == 1
+    time.sleep(0.3)
+    assert queue.claim('worker-e').batch_no == 2
+    assert queue.progress('job')['failed'] == 1
+    assert queue.retry_failed('job') == 1
+    queue.close()
+
+
+def test_workers_split_a_job_and_score_every_conversation_once(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    submitter = WorkQueue(path)
+    submitter.submit('job', conversations(200), settings={'input_token_budget': 8000}, batch_size=15)
+
+    bedrock = FakeBedrock()
+    results = []
+
+    def work():
+        queue = WorkQueue(path)
+        results.append(run_worker(queue, bedrock, requests_per_second=1000, exit_when_empty=True))
+        queue.close()
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(stats.conversations for stats in results) == 200
+    assert sum(stats.batches for stats in results) == 14
+    assert bedrock.calls == 200
+    progress = submitter.progress('job')
+    assert progress['scored'] == 200 and progress['done'] == 14 and progress['pending'] == 0
+    scores = submitter.to_frame('job')
+    assert scores['conversation_id'].is_unique and len(scores) == 200
+    assert pd.api.types.is_datetime64_any_dtype(scores['datetime'])
+    submitter.close()